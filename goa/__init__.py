@@ -9,7 +9,34 @@ Created on  2017-04-25 12:38:15
 @copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
 @license: GPL v2.0
 '''
+import sys
+import importlib
+from types import ModuleType
 
-from store import *
+__version__ = '0.4.2'
 
-__version__ = '0.4.2'
\ No newline at end of file
+
+class LazyPackage(ModuleType):
+    '''
+    The goa package.  The names of goa.store (Store, the column lists, ...) and
+    goa.cache.LookupCache are imported on first access, so that importing goa or one of
+    the light modules, e.g. for the goa command's --help, does not import SQLAlchemy.
+    '''
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        module = importlib.import_module('goa.cache' if name == 'LookupCache' else 'goa.store')
+        # Importing goa.store sets the store attribute itself
+        if name in self.__dict__:
+            return self.__dict__[name]
+        value = getattr(module, name)
+        setattr(self, name, value)
+        return value
+
+
+package = LazyPackage(__name__, __doc__)
+package.__dict__.update(dict([(name, value) for name, value in globals().items() if name.startswith('__')]))
+# Keep this module alive, Python 2 clears the globals of unreferenced modules
+package._module = sys.modules[__name__]
+sys.modules[__name__] = package
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.asyncstore  Concurrent, non-blocking lookups against a Store
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+import logging
+import threading
+from Queue import Queue, Full
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from goa.store import IN_CHUNK_SIZE
+
+logger = logging.getLogger()
+
+# Number of lookup threads when the Store engine pool size is not known
+DEFAULT_WORKERS = 5
+
+# Number of fetched annotation batches iterAnnotations buffers ahead of the caller
+ANNOTATION_BATCHES_AHEAD = 2
+
+
+class AsyncStore(object):
+    '''
+    Runs Store lookups on a fixed pool of threads so that many callers can issue them at
+    once without blocking and without each opening its own engine.  Every lookup checks
+    a connection out of the Store engine pool for its duration, so the number of threads
+    should match the pool size.
+
+    Methods return multiprocessing AsyncResult objects; call get() to wait for the
+    result or pass a callback.
+    '''
+
+    def __init__(self, store, workers=None):
+        if workers is None:
+            try:
+                workers = store.engine.pool.size()
+            except Exception:
+                workers = DEFAULT_WORKERS
+        self.store = store
+        self.workers = workers
+        self.pool = ThreadPool(workers)
+
+    def close(self):
+        '''
+        Wait for outstanding lookups and stop the threads
+        '''
+        self.pool.close()
+        self.pool.join()
+
+    def searchByIds(self, ids, source=None, callback=None, propagate=False):
+        '''
+        Search for the GO annotations of ids in the background.  Returns an AsyncResult
+        of the list of (id, goa_symbol, go_terms) tuples Store.searchByIds generates.
+        '''
+        ids = list(ids)
+        return self.pool.apply_async(self.searchList, (ids, source, propagate), callback=callback)
+
+    def searchList(self, ids, source=None, propagate=False):
+        return list(self.store.searchByIds(ids, source, propagate=propagate))
+
+    def iterSearchByIds(self, ids, source=None, chunksize=IN_CHUNK_SIZE, propagate=False):
+        '''
+        Search an iterable of ids with chunks of chunksize ids running concurrently on the
+        threads.  Generates the (id, goa_symbol, go_terms) tuples of each chunk in order.
+        At most 2 * workers chunks are in flight, so memory is bounded for long id lists.
+        '''
+        pending = deque()
+        chunk = []
+        for id in ids:
+            chunk.append(id)
+            if len(chunk) >= chunksize:
+                pending.append(self.pool.apply_async(self.searchList, (chunk, source, propagate)))
+                chunk = []
+                if len(pending) >= 2 * self.workers:
+                    for result in pending.popleft().get():
+                        yield result
+        if len(chunk) > 0:
+            pending.append(self.pool.apply_async(self.searchList, (chunk, source, propagate)))
+        while len(pending) > 0:
+            for result in pending.popleft().get():
+                yield result
+
+    def iterAnnotations(self, taxon=None, aspect=None, evidence_code=None, assigned_by=None, batchsize=10000):
+        '''
+        Generate the goa rows of Store.iterAnnotations, fetched on one of the threads in
+        batches of batchsize rows.  The next batches are fetched while the caller works on
+        the current one, at most ANNOTATION_BATCHES_AHEAD ahead.  Errors of the fetch are
+        raised in the caller.  If the caller stops early, the fetch stops too.
+        '''
+        batches = Queue(ANNOTATION_BATCHES_AHEAD)
+        stopped = threading.Event()
+        filters = {'taxon': taxon, 'aspect': aspect, 'evidence_code': evidence_code, 'assigned_by': assigned_by}
+        result = self.pool.apply_async(self.fetchAnnotations, (batches, stopped, filters, batchsize))
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                for row in batch:
+                    yield row
+            result.get()
+        finally:
+            stopped.set()
+
+    def fetchAnnotations(self, batches, stopped, filters, batchsize):
+        '''
+        Put the rows of Store.iterAnnotations on the batches Queue in lists of batchsize,
+        followed by None, until stopped is set
+        '''
+        try:
+            batch = []
+            for row in self.store.iterAnnotations(batchsize=batchsize, **filters):
+                batch.append(row)
+                if len(batch) >= batchsize:
+                    if not self.putBatch(batches, stopped, batch):
+                        return
+                    batch = []
+            if len(batch) > 0:
+                self.putBatch(batches, stopped, batch)
+        finally:
+            self.putBatch(batches, stopped, None)
+
+    def putBatch(self, batches, stopped, batch):
+        '''
+        Put batch on the batches Queue, waiting for room unless stopped is set.  Returns
+        False if stopped was set.
+        '''
+        while not stopped.is_set():
+            try:
+                batches.put(batch, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.bench  Benchmarks for the goalchemy loaders and queries
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.bench.gafbench  Compare GAF parse throughput of the old per row conversion and GafParser
+
+Lines are generated and parsed in memory, so only parsing is measured.  Run with
+
+    python -m goa.bench.gafbench --rows 500000 --dates 3000
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import time
+from argparse import ArgumentParser
+from datetime import datetime
+
+from goa.gaf import GafParser, GOA_TSV_COLUMNS
+from goa.bench.loadbench import SAMPLE_ROW
+
+
+def gafLines(rowcount, datecount):
+    '''
+    Return a list of rowcount GAF lines with datecount distinct dates
+    '''
+    row = list(SAMPLE_ROW)
+    lines = ['!gaf-version: 2.1']
+    for i in range(rowcount):
+        row[1] = 'B%09d' % i
+        row[13] = '2017%02d%02d' % (i % datecount % 12 + 1, i % datecount // 12 % 28 + 1)
+        lines.append('\t'.join(row))
+    return lines
+
+
+def rowValues(lines):
+    '''
+    The parse path before GafParser: strip, split and build a datetime for every row
+    '''
+    columns = GOA_TSV_COLUMNS
+    for line in lines:
+        line = line.strip()
+        if line == '' or line.startswith('!'):
+            continue
+        row = line.split('\t')
+        d = datetime(int(row[13][0:4]), int(row[13][4:6]), int(row[13][6:8]))
+        yield dict(zip(columns, row[:13] + [d, row[14]]))
+
+
+def timeParse(generate, lines):
+    '''
+    Consume the generator generate(lines) and return (count, elapsed seconds)
+    '''
+    start = time.time()
+    count = 0
+    for value in generate(lines):
+        count += 1
+    return (count, time.time() - start)
+
+
+def main():
+    parser = ArgumentParser(description='Compare GAF parse throughput')
+    parser.add_argument('--rows', type=int, default=200000, help='Number of GAF rows to parse')
+    parser.add_argument('--dates', type=int, default=336, help='Number of distinct dates in the rows (at most 336)')
+    args = parser.parse_args()
+
+    lines = gafLines(args.rows, args.dates)
+    paths = (
+        ('rows', rowValues),
+        ('values', lambda lines: GafParser().values(lines)),
+        ('tuples', lambda lines: GafParser().tuples(lines)),
+        ('records', lambda lines: GafParser().records(lines)),
+    )
+    for label, generate in paths:
+        count, elapsed = timeParse(generate, lines)
+        print('%-8s %10d rows %8.2f s %12.0f rows/sec' % (label, count, elapsed, count / elapsed))
+
+
+if __name__ == '__main__':
+    main()
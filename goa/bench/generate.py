@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.bench.generate  Seeded synthetic GAF 2.1 and UniProt id mapping files
+
+Proteins are written in accession order, as in the UniProt files, with a Zipfian number
+of annotations each.  GO terms, evidence codes and taxa are drawn from Zipfian
+distributions, so a few terms and species account for most rows like in the real data.
+The same seed and sizes always give the same files.  Run with
+
+    python -m goa.bench.generate --rows 1000000 --gaf bench.gaf.gz --idmapping bench.idmapping.tab.gz
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import gzip
+import random
+from argparse import ArgumentParser
+from bisect import bisect_left
+
+GO_TERM_COUNT = 20000
+MAX_ANNOTATIONS = 200
+
+# Zipf exponents of the distributions
+TERM_EXPONENT = 1.1
+ANNOTATION_EXPONENT = 1.6
+TAXON_EXPONENT = 1.3
+
+TAXA = ['9606', '10090', '10116', '559292', '7227', '6239', '3702', '7955', '83333', '284812']
+EVIDENCE_CODES = ['IEA', 'IBA', 'IDA', 'IPI', 'IMP', 'ISS', 'TAS', 'NAS', 'IGI', 'IEP', 'ND', 'IC']
+ASSIGNED_BY = {'IEA': 'InterPro', 'IBA': 'GO_Central'}
+ASPECTS = ['F', 'P', 'C']
+DATES = ['2017%02d%02d' % (month, day) for month in range(1, 13) for day in (1, 8, 15, 22)]
+
+
+class ZipfSampler(object):
+    '''
+    Draws 0 .. n - 1 with probability proportional to 1 / (i + 1) ** exponent
+    '''
+
+    def __init__(self, n, exponent, rng):
+        self.rng = rng
+        self.cumulative = []
+        total = 0.0
+        for i in range(n):
+            total += 1.0 / (i + 1) ** exponent
+            self.cumulative.append(total)
+        self.total = total
+
+    def sample(self):
+        return bisect_left(self.cumulative, self.rng.random() * self.total)
+
+
+def proteinAccession(i):
+    '''
+    UniProtKB-like accession of protein i
+    '''
+    return 'Q%09d' % i
+
+
+def goId(i):
+    return 'GO:%07d' % i
+
+
+def goTermValues(terms=GO_TERM_COUNT):
+    '''
+    go_term column value dicts for the GO ids the generators use
+    '''
+    return [{'go_id': goId(i), 'term': 'synthetic term %d' % i} for i in range(terms)]
+
+
+def openOutput(filename):
+    '''
+    Open filename for writing, gzip compressed if it ends with .gz
+    '''
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'wb')
+    return open(filename, 'w')
+
+
+def gafRows(rowcount, seed=1, terms=GO_TERM_COUNT):
+    '''
+    Generate rowcount GAF 2.1 rows as lists of 17 columns, grouped by protein
+    '''
+    rng = random.Random(seed)
+    termsampler = ZipfSampler(terms, TERM_EXPONENT, rng)
+    annotationsampler = ZipfSampler(MAX_ANNOTATIONS, ANNOTATION_EXPONENT, rng)
+    taxonsampler = ZipfSampler(len(TAXA), TAXON_EXPONENT, rng)
+    evidencesampler = ZipfSampler(len(EVIDENCE_CODES), 1.5, rng)
+
+    written = 0
+    protein = 0
+    while written < rowcount:
+        accession = proteinAccession(protein)
+        symbol = 'GENE%d' % protein
+        taxon = 'taxon:%s' % TAXA[taxonsampler.sample()]
+        seen = set()
+        for i in range(min(annotationsampler.sample() + 1, rowcount - written)):
+            term = termsampler.sample()
+            evidence = EVIDENCE_CODES[evidencesampler.sample()]
+            # goa is unique on (db, db_object_id, go_id, db_reference)
+            if term in seen:
+                continue
+            seen.add(term)
+            yield [
+                'UniProtKB', accession, symbol, '', goId(term), 'GO_REF:%07d' % (term % 50), evidence,
+                '', ASPECTS[term % 3], 'Synthetic protein %d' % protein, '%s_SYNTH|%s' % (accession, symbol),
+                'protein', taxon, DATES[rng.randrange(len(DATES))], ASSIGNED_BY.get(evidence, 'UniProt'), '', '',
+            ]
+            written += 1
+        protein += 1
+
+
+def writeGafFile(filename, rowcount, seed=1, terms=GO_TERM_COUNT):
+    '''
+    Write a GAF 2.1 file of rowcount rows.  Returns the number of proteins written.
+    '''
+    row = None
+    with openOutput(filename) as f:
+        f.write('!gaf-version: 2.1\n!generated by goa.bench.generate seed %d\n' % seed)
+        for row in gafRows(rowcount, seed, terms):
+            f.write('\t'.join(row) + '\n')
+    # Proteins are numbered in file order
+    return int(row[1][1:]) + 1 if row is not None else 0
+
+
+def writeIdMappingFile(filename, proteincount):
+    '''
+    Write an idmapping_selected.tab file with a line for each of the first proteincount
+    proteins.  Every protein gets a UniProtKB-ID, GeneID, RefSeq, UniRef100 and UniRef90
+    id; UniRef90 clusters hold 4 proteins.
+    '''
+    with openOutput(filename) as f:
+        for i in range(proteincount):
+            accession = proteinAccession(i)
+            fields = [''] * 22
+            fields[0] = accession
+            fields[1] = '%s_SYNTH' % accession
+            fields[2] = str(100000 + i)
+            fields[3] = 'NP_%09d.1' % i
+            fields[7] = 'UniRef100_%s' % accession
+            fields[8] = 'UniRef90_%s' % proteinAccession(i - i % 4)
+            f.write('\t'.join(fields) + '\n')
+
+
+def searchIds(proteincount, count, seed=1, source='UniProtKB'):
+    '''
+    Return count ids of source to search for, drawn from the first proteincount proteins
+    with a Zipfian bias, so that some ids repeat as in real id lists
+    '''
+    rng = random.Random(seed)
+    sampler = ZipfSampler(proteincount, 0.8, rng)
+    ids = []
+    for i in range(count):
+        p = sampler.sample()
+        if source == 'UniRef90':
+            ids.append('UniRef90_%s' % proteinAccession(p - p % 4))
+        elif source == 'UniRef100':
+            ids.append('UniRef100_%s' % proteinAccession(p))
+        else:
+            ids.append(proteinAccession(p))
+    return ids
+
+
+def main():
+    parser = ArgumentParser(description='Write seeded synthetic GAF 2.1 and id mapping files')
+    parser.add_argument('--rows', type=int, default=100000, help='Number of GAF rows')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    parser.add_argument('--terms', type=int, default=GO_TERM_COUNT, help='Number of GO terms')
+    parser.add_argument('--gaf', required=True, help='Output GAF file, gzip compressed if it ends with .gz')
+    parser.add_argument('--idmapping', help='Output idmapping_selected.tab file for the proteins of the GAF file')
+    args = parser.parse_args()
+
+    proteincount = writeGafFile(args.gaf, args.rows, args.seed, args.terms)
+    print('%d rows, %d proteins written to %s' % (args.rows, proteincount, args.gaf))
+    if args.idmapping:
+        writeIdMappingFile(args.idmapping, proteincount)
+        print('%d id mapping lines written to %s' % (proteincount, args.idmapping))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.bench.indexbench  Query plans and latencies of searchByIds with and without the secondary indexes
+
+Uses a synthetic SQLite database.  Run with
+
+    python -m goa.bench.indexbench --proteins 50000 --ids 1000
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import os
+import random
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+from datetime import date
+
+from goa import Store
+
+GO_TERM_COUNT = 2000
+
+
+def buildDatabase(store, proteins, annotations, seed=1):
+    '''
+    Fill store with proteins x annotations goa rows, go_terms and a UniProtKB and UniRef90 alias per protein
+    '''
+    rng = random.Random(seed)
+    store.connection.execute(store.tables['go_term'].insert(), [
+        {'go_id': 'GO:%07d' % i, 'term': 'term %d' % i} for i in range(GO_TERM_COUNT)
+    ])
+
+    goa = []
+    alias = []
+    for p in range(proteins):
+        accession = 'P%08d' % p
+        alias.append({'authority': 'UniProtKB', 'accession': accession, 'alias': accession, 'source': 'UniProtKB'})
+        alias.append({'authority': 'UniProtKB', 'accession': accession, 'alias': 'UniRef90_' + accession, 'source': 'UniRef90'})
+        for goid in rng.sample(range(GO_TERM_COUNT), annotations):
+            goa.append({
+                'db': 'UniProtKB', 'db_object_id': accession, 'db_object_symbol': 'sym%d' % p, 'qualifier': '',
+                'go_id': 'GO:%07d' % goid, 'db_reference': 'GO_REF:0000002', 'evidence_code': 'IEA',
+                'with_or_from': '', 'aspect': 'F', 'db_object_name': '', 'db_object_synonym': '',
+                'db_object_type': 'protein', 'taxon': 'taxon:1', 'date': date(2017, 4, 8), 'assigned_by': 'InterPro',
+            })
+        if len(goa) >= 10000:
+            store.connection.execute(store.tables['goa'].insert(), goa)
+            goa = []
+    if len(goa) > 0:
+        store.connection.execute(store.tables['goa'].insert(), goa)
+    store.connection.execute(store.tables['alias'].insert(), alias)
+
+
+def queryPlan(store, ids):
+    '''
+    Return the SQLite query plan of the searchByIds join for ids
+    '''
+    sql = '''
+        explain query plan
+        select distinct a.alias, g.db_object_symbol, gt.term
+        from alias a
+            inner join goa g on (g.db = a.authority and g.db_object_id = a.accession)
+            inner join go_term gt on g.go_id = gt.go_id
+        where a.alias in (%s) and a.source = 'UniRef90'
+    ''' % ', '.join(["'%s'" % id for id in ids])
+    return [row[-1] for row in store.connection.execute(sql)]
+
+
+def timeSearch(store, ids, repeats):
+    '''
+    Return the best of repeats searchByIds times in seconds
+    '''
+    best = None
+    for i in range(repeats):
+        start = time.time()
+        list(store.searchByIds(ids, source='UniRef90'))
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = ArgumentParser(description='Compare searchByIds query plans and latency with and without secondary indexes')
+    parser.add_argument('--proteins', type=int, default=20000, help='Number of synthetic proteins')
+    parser.add_argument('--annotations', type=int, default=10, help='GO annotations per protein')
+    parser.add_argument('--ids', type=int, default=1000, help='Number of ids searched')
+    parser.add_argument('--repeats', type=int, default=3, help='Timing repeats, the best is reported')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        store = Store('sqlite:///%s' % os.path.join(tmpdir, 'bench.db'))
+        store.create()
+        buildDatabase(store, args.proteins, args.annotations)
+        ids = ['UniRef90_P%08d' % p for p in random.Random(2).sample(range(args.proteins), args.ids)]
+
+        for label in ('without indexes', 'with indexes'):
+            if label == 'without indexes':
+                store.dropIndexes()
+            else:
+                store.createIndexes()
+            store.connection.execute('analyze')
+            print('%s:' % label)
+            for step in queryPlan(store, ids[:3]):
+                print('    %s' % step)
+            print('    %d ids searched in %.4f s' % (len(ids), timeSearch(store, ids, args.repeats)))
+        store.engine.dispose()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.bench.loadbench  Compare GOA load throughput of the row by row and batched insert paths
+
+Uses a temporary SQLite database as a stand-in for the real server.  Run with
+
+    python -m goa.bench.loadbench --rows 100000 --commit-count 1000
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import os
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from goa import Store
+from goa.loader import loadGoaFile
+
+SAMPLE_ROW = [
+    'UniProtKB', 'A0A000', 'moeA5', '', 'GO:0003824', 'GO_REF:0000002', 'IEA',
+    'InterPro:IPR015421|InterPro:IPR015422', 'F', 'MoeA5', 'A0A000_9ACTN|moeA5',
+    'protein', 'taxon:35758', '20170408', 'InterPro', '', '',
+]
+
+
+def writeGafFile(filename, rowcount):
+    '''
+    Write a GAF 2.1 file with rowcount distinct annotation rows
+    '''
+    row = list(SAMPLE_ROW)
+    with open(filename, 'w') as f:
+        f.write('!gaf-version: 2.1\n')
+        for i in range(rowcount):
+            row[1] = 'B%09d' % i
+            f.write('\t'.join(row) + '\n')
+
+
+def timeLoad(gaffile, dbfile, commitcount, batch):
+    '''
+    Load gaffile into a fresh SQLite database and return the elapsed seconds
+    '''
+    if os.path.exists(dbfile):
+        os.remove(dbfile)
+    store = Store('sqlite:///%s' % dbfile)
+    store.create()
+    start = time.time()
+    loadGoaFile(store, gaffile, commitcount, batch=batch)
+    elapsed = time.time() - start
+    store.engine.dispose()
+    return elapsed
+
+
+def main():
+    parser = ArgumentParser(description='Compare row by row and batched GOA load throughput on SQLite')
+    parser.add_argument('--rows', type=int, default=20000, help='Number of GAF rows to load')
+    parser.add_argument('--commit-count', type=int, default=1000, help='Rows per batch / commit')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        gaffile = os.path.join(tmpdir, 'bench.gaf')
+        dbfile = os.path.join(tmpdir, 'bench.db')
+        writeGafFile(gaffile, args.rows)
+
+        for label, batch in (('row', False), ('batch', True)):
+            elapsed = timeLoad(gaffile, dbfile, args.commit_count, batch)
+            print('%-6s %10d rows %8.2f s %12.0f rows/sec' % (label, args.rows, elapsed, args.rows / elapsed))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.bench.startupbench  Start up time of the goa command and import time of the goa modules
+
+Every measurement runs in a fresh interpreter, so module caching does not hide import
+costs.  Exits with status 1 if a light command imports SQLAlchemy or is slower than
+--max-seconds, so it can guard against startup regressions.  Run with
+
+    python -m goa.bench.startupbench --repeats 20 --max-seconds 0.2
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import os
+import sys
+import time
+import subprocess
+from argparse import ArgumentParser
+
+# (label, python arguments) of the commands that must not import SQLAlchemy
+LIGHT_COMMANDS = [
+    ('goa --version', ['-m', 'goa.cli', '--version']),
+    ('goa --help', ['-m', 'goa.cli', '--help']),
+    ('import goa', ['-c', 'import goa']),
+    ('import goa.cli', ['-c', 'import goa.cli']),
+]
+
+# Commands that need SQLAlchemy, for comparison
+HEAVY_COMMANDS = [
+    ('import goa.store', ['-c', 'import goa.store']),
+    ('Store()', ['-c', 'from goa import Store; Store("sqlite://")']),
+]
+
+HEAVY_MODULE_CHECK = "import sys; sys.exit(1 if [m for m in sys.modules if m.startswith('sqlalchemy')] else 0)"
+
+
+def timeCommand(arguments, repeats):
+    '''
+    Best of repeats wall clock seconds of running python with arguments
+    '''
+    best = None
+    with open(os.devnull, 'w') as devnull:
+        for i in range(repeats):
+            start = time.time()
+            subprocess.call([sys.executable] + arguments, stdout=devnull, stderr=devnull)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def importsSqlAlchemy(arguments):
+    '''
+    True if running the code of a -c command or importing the -m module imports SQLAlchemy
+    '''
+    if arguments[0] == '-c':
+        code = arguments[1]
+    else:
+        code = 'import %s' % arguments[1]
+    return subprocess.call([sys.executable, '-c', '%s; %s' % (code, HEAVY_MODULE_CHECK)]) != 0
+
+
+def main():
+    parser = ArgumentParser(description='Measure goa start up and import times')
+    parser.add_argument('--repeats', type=int, default=10, help='Runs per command, the best is reported')
+    parser.add_argument('--max-seconds', type=float, help='Fail if a light command takes longer than this')
+    args = parser.parse_args()
+
+    baseline = timeCommand(['-c', 'pass'], args.repeats)
+    print('%-20s %8.3f s' % ('python', baseline))
+
+    failed = False
+    for label, arguments in LIGHT_COMMANDS:
+        seconds = timeCommand(arguments, args.repeats)
+        heavy = importsSqlAlchemy(arguments)
+        print('%-20s %8.3f s%s' % (label, seconds, '  imports SQLAlchemy' if heavy else ''))
+        if heavy or (args.max_seconds is not None and seconds > args.max_seconds):
+            failed = True
+
+    for label, arguments in HEAVY_COMMANDS:
+        print('%-20s %8.3f s' % (label, timeCommand(arguments, args.repeats)))
+
+    if failed:
+        print('Start up regression')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
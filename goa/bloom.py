@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.bloom  Bloom filter over alias ids for dropping definite lookup misses in memory
+
+The filter of a Store holds a key for every (alias, source) pair of the alias table and
+one for every alias alone, for searches without a source.  A negative answer is
+certain, a positive one is wrong with about the error rate the filter was sized for.
+On databases whose collation ignores case and trailing spaces (MySQL), the keys are
+folded the same way, so that ids the database would match are never dropped.
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+import os
+import math
+import struct
+import hashlib
+
+# Default false positive rate of the alias filter
+DEFAULT_ERROR_RATE = 0.01
+
+# Magic and header of the filter file: magic, bit count, hash count
+BLOOM_MAGIC = 'GOABLM01'
+BLOOM_HEADER = struct.Struct('<8sQI')
+
+
+def aliasKey(alias, source=None, fold=False):
+    '''
+    Filter key of an alias of source, or of the alias alone if source is None.  If fold
+    is True, case and trailing spaces are ignored, as MySQL's default collations do.
+    '''
+    if fold:
+        return '%s\t%s' % ((source or '').upper().rstrip(), alias.upper().rstrip())
+    return '%s\t%s' % (source or '', alias)
+
+
+class BloomFilter(object):
+    '''
+    Bloom filter of bitcount bits and hashcount hash functions, derived from one md5 of
+    the key by double hashing
+    '''
+
+    def __init__(self, bitcount, hashcount, bits=None):
+        self.bitcount = bitcount
+        self.hashcount = hashcount
+        self.bits = bits if bits is not None else bytearray((bitcount + 7) // 8)
+
+    @classmethod
+    def forCapacity(cls, count, errorrate=DEFAULT_ERROR_RATE):
+        '''
+        A filter sized for count keys at a false positive rate of errorrate
+        '''
+        count = max(count, 1)
+        bitcount = int(math.ceil(-count * math.log(errorrate) / math.log(2) ** 2))
+        hashcount = max(1, int(round(float(bitcount) / count * math.log(2))))
+        return cls(bitcount, hashcount)
+
+    def positions(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        h1, h2 = struct.unpack('<QQ', hashlib.md5(key).digest())
+        bitcount = self.bitcount
+        return [(h1 + i * h2) % bitcount for i in range(self.hashcount)]
+
+    def add(self, key):
+        bits = self.bits
+        for position in self.positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        bits = self.bits
+        for position in self.positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def save(self, filename):
+        '''
+        Write the filter to filename, through a temporary file that is renamed into place
+        '''
+        tmpfilename = '%s.tmp' % filename
+        with open(tmpfilename, 'wb') as f:
+            f.write(BLOOM_HEADER.pack(BLOOM_MAGIC, self.bitcount, self.hashcount))
+            f.write(self.bits)
+        os.rename(tmpfilename, filename)
+
+    @classmethod
+    def load(cls, filename):
+        '''
+        Read a filter written by save
+        '''
+        with open(filename, 'rb') as f:
+            magic, bitcount, hashcount = BLOOM_HEADER.unpack(f.read(BLOOM_HEADER.size))
+            if magic != BLOOM_MAGIC:
+                raise Exception('%s is not an alias filter file' % filename)
+            bits = bytearray(f.read())
+        if len(bits) != (bitcount + 7) // 8:
+            raise Exception('Alias filter file %s is truncated' % filename)
+        return cls(bitcount, hashcount, bits)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.cache  In-process cache for id lookups
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+import time
+import threading
+from collections import OrderedDict
+
+
+class LookupCache(object):
+    '''
+    Bounded LRU cache of (source, id, propagate) -> list of (goa_symbol, go_terms) results
+    used by Store.searchByIds.  Ids without annotations are cached as empty lists.
+
+    Entries are evicted least recently used first once there are more than maxentries
+    or, if maxbytes is set, once the approximate size of the cached strings is larger
+    than maxbytes.  If ttl is set, entries older than ttl seconds are treated as misses.
+
+    generation is the Store data generation the entries were read at.  The Store clears
+    the cache when the data generation in the database changes.
+
+    The cache can be shared by threads.
+    '''
+
+    def __init__(self, maxentries=100000, maxbytes=None, ttl=None):
+        self.maxentries = maxentries
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def entrySize(key, value):
+        '''
+        Approximate size of an entry as the length of its strings
+        '''
+        size = sum([len(k) for k in key if isinstance(k, basestring)])
+        for result in value:
+            size += sum([len(r) for r in result if r is not None])
+        return size
+
+    def get(self, key):
+        '''
+        Return the cached value for key, or None on a miss
+        '''
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None or (self.ttl is not None and time.time() - entry[1] > self.ttl):
+                if entry is not None:
+                    self.bytes -= entry[2]
+                self.misses += 1
+                return None
+
+            # Reinsert to mark as most recently used
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        '''
+        Cache value for key, evicting least recently used entries as needed
+        '''
+        size = self.entrySize(key, value)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self.entries[key] = (value, time.time(), size)
+            self.bytes += size
+
+            while len(self.entries) > self.maxentries or (self.maxbytes is not None and self.bytes > self.maxbytes and len(self.entries) > 1):
+                oldkey, oldentry = self.entries.popitem(last=False)
+                self.bytes -= oldentry[2]
+                self.evictions += 1
+
+    def clear(self, generation=None):
+        '''
+        Drop all entries, e.g. when the data generation changes
+        '''
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            self.generation = generation
+            self.invalidations += 1
+
+    def stats(self):
+        '''
+        Return a dict of cache statistics
+        '''
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups > 0 else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'generation': self.generation,
+        }
@@ -13,8 +13,12 @@ Created on  2017-04-25 13:06:50
 
 import os, sys, traceback
 import logging
-from goa import Store
 from goa import __version__ as version
+from goa.export import exportAnnotations, EXPORT_FORMATS
+from goa.loader import loadGoaFile, bulkLoadGoaFile, parallelLoadGoaFile, incrementalLoadGoaFile, loadAliasFile, DEFAULT_ALIAS_SOURCES
+from goa.loader import loadOboFile, loadGoaPartitions, shadowLoadGoaFile
+from goa.gaf import DEFAULT_MAX_REJECTS
+from goa.metrics import LoadStats, ProgressLine
 
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
 
@@ -23,45 +27,6 @@ logger = logging.getLogger()
 logger.setLevel(logging.getLevelName(os.environ.get('GOALCHEMY_LOGLEVEL', 'ERROR')))
 
 
-def loadGoaFile(store, filename, commitcount):
-    """
-    Loads a GAF 2.1 goa file from Uniprot
-    """
-    if not os.path.exists(filename):
-        raise Exception('File %s does not exist.' % filename)
-
-    savedcount = 0
-    errors = []
-    with open(filename, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line == '' or line.startswith('!'):
-                continue
-            row = line.split('\t')
-
-            try:
-                store.storeGoaRow(row)
-                savedcount += 1
-            except Exception as e:
-                errors.append(str(e))
-                logger.debug('Error loading row: %s\n%s\n%s' % (str(e), line, traceback.format_exc()))
-
-            if savedcount > 0 and savedcount % commitcount == 0:
-                store.commit()
-                logger.info('Saved %d records' % savedcount)
-
-    store.commit()
-    logger.info('%d records saved' % savedcount)
-    if len(errors) > 0:
-        logger.error('Errors occurred during loading:\n%s' % '\n'.join(errors))
-
-
-def loadUniprotBlastIds(store, filename, commitcount):
-    """
-    Load Uniprot Blast IDs as aliases
-    """
-    
-
 def initArgs():
     '''
     Setup arguments with parameterdef, check envs, parse commandline, return args
@@ -120,6 +85,55 @@ def initArgs():
             'help'      : 'Number of rows between database commits.',
             'default'   : '100',
         },
+        {
+            'name'      : 'GOALCHEMY_COMPACT',
+            'switches'  : ['--compact'],
+            'required'  : False,
+            'help'      : 'Use the dictionary encoded compact schema, with goa as a view.  Must match the setting the database was created with.',
+            'action'    : 'store_true',
+        },
+        {
+            'name'      : 'GOALCHEMY_PARTITION',
+            'switches'  : ['--partition'],
+            'required'  : False,
+            'help'      : 'Partition the goa table by taxon or hash of db_object_id.  Must match the setting the database was created with.',
+            'choices'   : ['taxon', 'hash'],
+        },
+        {
+            'name'      : 'GOALCHEMY_PARTITIONS',
+            'switches'  : ['--partitions'],
+            'required'  : False,
+            'help'      : 'Comma separated taxa with their own partition (e.g. 9606,10090) with --partition taxon, '
+                          'or the number of partitions with --partition hash.',
+        },
+        {
+            'name'      : 'GOALCHEMY_ROW_INSERTS',
+            'switches'  : ['--row-inserts'],
+            'required'  : False,
+            'help'      : 'Insert GOA rows one at a time instead of one executemany per commit-count batch.',
+            'action'    : 'store_true',
+        },
+        {
+            'name'      : 'GOALCHEMY_PROGRESS',
+            'switches'  : ['--progress'],
+            'required'  : False,
+            'help'      : 'Show a progress line with rows/sec and ETA on stderr during loads.',
+            'action'    : 'store_true',
+        },
+        {
+            'name'      : 'GOALCHEMY_METRICS_FILE',
+            'switches'  : ['--metrics-file'],
+            'required'  : False,
+            'help'      : 'Write stage timings, counters and latency histograms of the run to this file at the end, '
+                          'as a Prometheus textfile if it ends with .prom, else as JSON.',
+        },
+        {
+            'name'      : 'GOALCHEMY_ALIAS_FILTER_DIR',
+            'switches'  : ['--alias-filter-dir'],
+            'required'  : False,
+            'help'      : 'Directory of the Bloom filter over the aliases (e.g. ~/.goalchemy).  Alias loads rebuild it and '
+                          'id list searches use it to skip ids that are not aliases.',
+        },
     ]
 
     # Check for environment variable values
@@ -148,16 +162,166 @@ def initArgs():
         # Gotta put it back on for later
         parameterdef['name'] = name
 
-    subparsers = parser.add_subparsers(help='Subcommands')
+    parser.set_defaults(FILE=None)
+    subparsers = parser.add_subparsers(help='Subcommands', dest='command')
     loadgoa = subparsers.add_parser('load-goa')
-    loadgoa.add_argument('FILE', help='Input data file')
+    loadgoa.add_argument('FILE', help='Input GAF file.  May be gzip or bgzip compressed (.gz, .bgz), or - for stdin')
+    loadgoa.add_argument(
+        '--bulk',
+        action='store_true',
+        help='Transform the file to TSV and load it with the native bulk loader of the database '
+             '(load data local infile, copy).  The uix_1 constraint is rebuilt after the load.',
+    )
+    loadgoa.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of processes used to parse the file.  bgzip files are also decompressed in parallel.  [default: 1]',
+    )
+    loadgoa.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Compare the file with the goa table and only insert new and update changed annotations.',
+    )
+    loadgoa.add_argument(
+        '--delete',
+        action='store_true',
+        help='With --incremental, also delete annotations that are not in the file.  '
+             'The file must be grouped by db_object_id.',
+    )
+    loadgoa.add_argument(
+        '--resume',
+        action='store_true',
+        help='Resume an interrupted load of FILE from its last checkpoint.  Only for the default batched load.',
+    )
+    loadgoa.add_argument(
+        '--shadow',
+        action='store_true',
+        help='Bulk load into the shadow tables of a new release (goa__<release>, alias__<release>) and swap them '
+             'in when they are complete, so the live tables stay available during the load.',
+    )
+    loadgoa.add_argument('--release', help='With --shadow, name of the release.  [default: r<YYYYMMDDHHMMSS>]')
+    loadgoa.add_argument('--keep', type=int, default=2, help='With --shadow, number of previous releases kept for rollback.  [default: 2]')
+    loadgoa.add_argument('--alias-file', help='With --shadow, id mapping file loaded into the release alias table.  [default: copy the live aliases]')
+    loadgoa.add_argument(
+        '--by-partition',
+        action='store_true',
+        help='Route the rows to the goa partitions (see --partition) and load the partitions concurrently with --workers threads.',
+    )
+    loadgoa.add_argument(
+        '--replace-partitions',
+        action='store_true',
+        help='With --by-partition, truncate the taxon partitions in FILE before loading them, e.g. to reload a species.',
+    )
+    loadgoa.add_argument('--reject-file', help='Write invalid GAF lines to this file.  For the default batched, --bulk and --by-partition loads.')
+    loadgoa.add_argument(
+        '--max-rejects',
+        type=int,
+        default=DEFAULT_MAX_REJECTS,
+        help='Maximum number of lines written to --reject-file.  [default: %d]' % DEFAULT_MAX_REJECTS,
+    )
+
+    exportsnapshot = subparsers.add_parser('export-snapshot')
+    exportsnapshot.add_argument('FILE', help='Output SQLite snapshot file')
+
+    export = subparsers.add_parser('export')
+    export.add_argument('FILE', help='Output file, or - for stdout (gaf and tsv only)')
+    export.add_argument(
+        '--format',
+        choices=EXPORT_FORMATS,
+        default='gaf',
+        help='Output format.  parquet needs pyarrow.  [default: gaf]',
+    )
+    export.add_argument('--taxon', action='append', help='Only export this taxon (e.g. 9606).  May be repeated.')
+    export.add_argument('--aspect', action='append', help='Only export this aspect (P, F or C).  May be repeated.')
+    export.add_argument('--evidence-code', action='append', help='Only export this evidence code.  May be repeated.')
+    export.add_argument('--assigned-by', action='append', help='Only export annotations assigned by this database.  May be repeated.')
+
+    enrich = subparsers.add_parser('enrich', help='GO term enrichment of an id list.  Needs numpy and scipy.')
+    enrich.add_argument('FILE', help='File of ids, one per line, or - for stdin')
+    enrich.add_argument('--taxon', required=True, help='Taxon of the ids (e.g. 9606)')
+    enrich.add_argument('--source', help='Alias source of the ids (e.g. RefSeq).  By default ids are goa db_object_ids.')
+    enrich.add_argument('--background', help='File of background ids, one per line.  [default: all annotated genes of the taxon]')
+    enrich.add_argument('--propagate', action='store_true', help='Propagate annotations to ancestor terms.  Needs a loaded ontology (load-obo).')
+    enrich.add_argument('--max-fdr', type=float, default=1.0, help='Only report terms with at most this FDR.  [default: 1.0]')
+    enrich.add_argument(
+        '--cache-dir',
+        help='Directory for the cached gene x GO term matrices.  [default: $GOALCHEMY_CACHE_DIR or ~/.goalchemy]',
+    )
+
+    loadobo = subparsers.add_parser('load-obo', help='Load the GO ontology into go_term, go_term_edge and go_term_ancestor')
+    loadobo.add_argument('FILE', help='GO OBO file, e.g. go-basic.obo.  May be gzip compressed (.gz), or - for stdin')
+
+    subparsers.add_parser('list-releases', help='List the goa releases loaded with load-goa --shadow')
+    subparsers.add_parser('rollback-release', help='Swap the most recent previous release back in')
+
+    subparsers.add_parser('build-alias-filter', help='Build the alias Bloom filter in --alias-filter-dir, e.g. after upgrading')
+
+    subparsers.add_parser('create-indexes', help='Create the secondary goa and alias indexes, e.g. after a bulk load')
+    subparsers.add_parser('drop-indexes', help='Drop the secondary goa and alias indexes, e.g. before a bulk load')
 
     loadalias = subparsers.add_parser('load-alias')
-    loadalias.add_argument('FILE', help='Input data file')
+    loadalias.add_argument(
+        'FILE',
+        help='UniProt idmapping_selected.tab or idmapping.dat file.  May be gzip or bgzip compressed (.gz, .bgz), or - for stdin',
+    )
+    loadalias.add_argument(
+        '--sources',
+        default=','.join(DEFAULT_ALIAS_SOURCES),
+        help='Comma separated alias sources to load (e.g. UniProtKB,UniRef90,UniProtKB-ID,RefSeq).  [default: %s]' % ','.join(DEFAULT_ALIAS_SOURCES),
+    )
+    loadalias.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of processes used to parse the file.  bgzip files are also decompressed in parallel.  [default: 1]',
+    )
     args = parser.parse_args()
+    if args.command == 'load-goa':
+        checkLoadGoaArgs(loadgoa, args)
     return args
 
 
+def checkLoadGoaArgs(parser, args):
+    '''
+    Exit with a usage error for load-goa options that the selected load would ignore
+    '''
+    modes = [switch for switch, selected in [
+        ('--shadow', args.shadow),
+        ('--by-partition', args.by_partition),
+        ('--incremental', args.incremental),
+        ('--bulk', args.bulk),
+    ] if selected]
+    if len(modes) > 1:
+        parser.error('%s cannot be combined' % ' and '.join(modes))
+    mode = modes[0] if len(modes) > 0 else None
+
+    if args.workers > 1 and mode not in (None, '--by-partition'):
+        parser.error('--workers does not apply to %s' % mode)
+    if args.delete and mode != '--incremental':
+        parser.error('--delete needs --incremental')
+    if args.resume and (mode is not None or args.workers > 1):
+        parser.error('--resume only applies to the default batched load')
+    if args.replace_partitions and mode != '--by-partition':
+        parser.error('--replace-partitions needs --by-partition')
+    if (args.release is not None or args.alias_file is not None) and mode != '--shadow':
+        parser.error('--release and --alias-file need --shadow')
+    if args.reject_file is not None and (mode not in (None, '--bulk', '--by-partition') or (args.workers > 1 and mode is None)):
+        parser.error('--reject-file only applies to the default batched, --bulk and --by-partition loads')
+
+
+def readIds(filename):
+    '''
+    Read ids, one per line, from filename or stdin if filename is -
+    '''
+    f = sys.stdin if filename == '-' else open(filename, 'r')
+    try:
+        return [line.strip() for line in f if line.strip() != '']
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
 def main():
     args = initArgs()
 
@@ -172,7 +336,17 @@ def main():
     filename    = args.FILE
     commitcount = int(args.GOALCHEMY_COMMIT_COUNT)
 
+    partitions = args.GOALCHEMY_PARTITIONS
+    if partitions is not None:
+        partitions = int(partitions) if args.GOALCHEMY_PARTITION == 'hash' else partitions.split(',')
+
+    stats = LoadStats()
+    if args.GOALCHEMY_PROGRESS:
+        stats.addCallback(ProgressLine())
+
     try:
+        # SQLAlchemy and the database driver are only imported once a command needs them
+        from goa.store import Store
 
         store = Store('%s://%s:%s@%s/%s' % (
             driver, 
@@ -180,12 +354,73 @@ def main():
             password, 
             host, 
             database,
-        ))
+        ), compact=bool(args.GOALCHEMY_COMPACT), partition=args.GOALCHEMY_PARTITION, partitions=partitions, stats=stats, aliasfilterdir=args.GOALCHEMY_ALIAS_FILTER_DIR)
+
         if args.GOALCHEMY_CREATE:
             store.create()
             logger.info('Created database tables.')
-        else:
-            loadGoaFile(store, filename, commitcount)
+        elif args.command == 'build-alias-filter':
+            logger.info('Built alias filter of %d aliases.' % store.buildAliasFilter())
+        elif args.command == 'create-indexes':
+            store.createIndexes()
+            logger.info('Created indexes.')
+        elif args.command == 'drop-indexes':
+            store.dropIndexes()
+            logger.info('Dropped indexes.')
+        elif args.command == 'export':
+            exportAnnotations(
+                store,
+                filename,
+                args.format,
+                taxon=args.taxon,
+                aspect=args.aspect,
+                evidence_code=args.evidence_code,
+                assigned_by=args.assigned_by,
+            )
+        elif args.command == 'enrich':
+            from goa.enrich import enrichIds, GOALCHEMY_CACHE_DIR
+            ids = readIds(filename)
+            background = readIds(args.background) if args.background else None
+            results = enrichIds(store, ids, args.taxon, source=args.source, background=background, cachedir=args.cache_dir or GOALCHEMY_CACHE_DIR, propagate=args.propagate)
+            print '\t'.join(['go_id', 'term', 'study_count', 'study_size', 'background_count', 'background_size', 'pvalue', 'fdr'])
+            for result in results:
+                if result[-1] <= args.max_fdr:
+                    print '\t'.join([str(v) for v in result[:6]] + ['%.3g' % v for v in result[6:]])
+        elif args.command == 'export-snapshot':
+            from goa.snapshot import exportSnapshot
+            exportSnapshot(store, filename)
+        elif args.command == 'list-releases':
+            for release in store.getReleases():
+                print '%s\t%s\t%s\t%s' % (release['release'], release['status'], release['created'], release['swapped'] or '')
+        elif args.command == 'rollback-release':
+            logger.info('Rolled back to release %s' % store.rollbackRelease())
+        elif args.command == 'load-goa' and args.shadow:
+            shadowLoadGoaFile(store, filename, release=args.release, keep=args.keep, aliasfilename=args.alias_file, commitcount=commitcount)
+        elif args.command == 'load-goa' and args.by_partition:
+            loadGoaPartitions(
+                store, filename, workers=args.workers, replace=args.replace_partitions,
+                rejectfile=args.reject_file, maxrejects=args.max_rejects,
+            )
+        elif args.command == 'load-goa' and args.incremental:
+            incrementalLoadGoaFile(store, filename, commitcount, delete=args.delete)
+        elif args.command == 'load-goa' and args.bulk:
+            bulkLoadGoaFile(store, filename, rejectfile=args.reject_file, maxrejects=args.max_rejects)
+        elif args.command == 'load-goa' and args.workers > 1:
+            parallelLoadGoaFile(store, filename, commitcount, args.workers)
+        elif args.command == 'load-goa':
+            batch = not args.GOALCHEMY_ROW_INSERTS
+            checkpoint = batch and filename != '-'
+            loadGoaFile(
+                store, filename, commitcount, batch=batch, checkpoint=checkpoint, resume=args.resume,
+                rejectfile=args.reject_file, maxrejects=args.max_rejects,
+            )
+        elif args.command == 'load-obo':
+            loadOboFile(store, filename)
+        elif args.command == 'load-alias':
+            loadAliasFile(store, filename, commitcount, sources=args.sources.split(','), workers=args.workers)
+
+        if args.GOALCHEMY_METRICS_FILE:
+            stats.write(args.GOALCHEMY_METRICS_FILE)
 
     except Exception as e:
         print '%s:\n%s' % (str(e), traceback.format_exc())
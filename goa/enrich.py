@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.enrich  Vectorized GO term enrichment over the goa table
+
+A sparse gene x GO term incidence matrix is built from goa once per taxon and data
+generation and cached on disk.  Hypergeometric p-values and Benjamini-Hochberg FDR
+for all terms of a query are then computed with NumPy / SciPy in one pass.
+
+Needs numpy and scipy.
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+import os
+import logging
+
+from sqlalchemy import select
+
+from goa.store import IN_CHUNK_SIZE, GOALCHEMY_CACHE_DIR
+
+logger = logging.getLogger()
+
+
+def importNumpy():
+    '''
+    Import numpy and scipy, with a useful message if they are missing
+    '''
+    try:
+        import numpy
+        import scipy.sparse
+        import scipy.stats
+    except ImportError:
+        raise Exception('GO enrichment needs numpy and scipy.  Install goalchemy[enrich] or numpy and scipy.')
+    return numpy, scipy
+
+
+class AnnotationMatrix(object):
+    '''
+    Sparse boolean matrix of genes (goa db_object_id) x GO terms (go_id) for one taxon
+    '''
+
+    def __init__(self, genes, terms, matrix):
+        numpy, scipy = importNumpy()
+        self.genes = list(genes)
+        self.terms = list(terms)
+        self.matrix = matrix.tocsr()
+        self.geneindex = dict([(gene, i) for i, gene in enumerate(self.genes)])
+
+    @classmethod
+    def build(cls, store, taxon, propagate=False):
+        '''
+        Build the matrix for taxon from the goa table.  If propagate is True, genes are also
+        annotated with all ancestors of their terms from go_term_ancestor.
+        '''
+        numpy, scipy = importNumpy()
+        ancestors = store.getAncestors() if propagate else {}
+        geneindex = {}
+        termindex = {}
+        pairs = set()
+        for row in store.iterAnnotations(taxon=taxon):
+            # row is in GOA_TSV_COLUMNS order, NOT qualified annotations are left out
+            if 'NOT' in (row[3] or ''):
+                continue
+            gene = geneindex.setdefault(row[1], len(geneindex))
+            for term in ancestors.get(row[4], [row[4]]):
+                pairs.add((gene, termindex.setdefault(term, len(termindex))))
+
+        rows = [pair[0] for pair in pairs]
+        columns = [pair[1] for pair in pairs]
+        matrix = scipy.sparse.coo_matrix(
+            (numpy.ones(len(pairs), dtype=numpy.bool_), (rows, columns)),
+            shape=(len(geneindex), len(termindex)),
+        )
+        genes = sorted(geneindex, key=geneindex.get)
+        terms = sorted(termindex, key=termindex.get)
+        logger.info('Built %d gene x %d term matrix for taxon %s' % (len(genes), len(terms), taxon))
+        return cls(genes, terms, matrix)
+
+    @classmethod
+    def cached(cls, store, taxon, cachedir=GOALCHEMY_CACHE_DIR, propagate=False):
+        '''
+        Load the matrix for taxon and the current data generation of store from cachedir,
+        building and saving it first if it is not there.  The file name includes the
+        database key of store, so databases can share cachedir.
+        '''
+        filename = os.path.join(cachedir, 'goa_matrix_%s_%s%s_%d.npz' % (
+            store.databaseKey,
+            str(taxon).replace('taxon:', ''),
+            '_propagated' if propagate else '',
+            store.getDataGeneration(),
+        ))
+        if os.path.exists(filename):
+            return cls.load(filename)
+        matrix = cls.build(store, taxon, propagate)
+        if not os.path.exists(cachedir):
+            os.makedirs(cachedir)
+        matrix.save(filename)
+        return matrix
+
+    def save(self, filename):
+        '''
+        Save the matrix to an .npz file, written to a temporary name and renamed into place
+        '''
+        numpy, scipy = importNumpy()
+        tmpfilename = '%s.tmp.npz' % filename[:-4]
+        numpy.savez_compressed(
+            tmpfilename,
+            genes=numpy.array(self.genes, dtype=object),
+            terms=numpy.array(self.terms, dtype=object),
+            indices=self.matrix.indices,
+            indptr=self.matrix.indptr,
+        )
+        os.rename(tmpfilename, filename)
+
+    @classmethod
+    def load(cls, filename):
+        '''
+        Load a matrix saved with save
+        '''
+        numpy, scipy = importNumpy()
+        data = numpy.load(filename, allow_pickle=True)
+        genes = data['genes'].tolist()
+        terms = data['terms'].tolist()
+        matrix = scipy.sparse.csr_matrix(
+            (numpy.ones(len(data['indices']), dtype=numpy.bool_), data['indices'], data['indptr']),
+            shape=(len(genes), len(terms)),
+        )
+        return cls(genes, terms, matrix)
+
+    def geneMask(self, genes):
+        '''
+        Return a boolean vector over self.genes that is True for the given genes
+        '''
+        numpy, scipy = importNumpy()
+        mask = numpy.zeros(len(self.genes), dtype=numpy.bool_)
+        indices = [self.geneindex[gene] for gene in genes if gene in self.geneindex]
+        mask[indices] = True
+        return mask
+
+    def enrich(self, study, background=None):
+        '''
+        Test every GO term for over-representation in the study genes against the background
+        genes (default: all annotated genes of the matrix) with the hypergeometric test.
+
+        Returns a list of (go_id, study_count, study_size, background_count, background_size,
+        pvalue, fdr) tuples for terms annotated to at least one study gene, by pvalue.
+        '''
+        numpy, scipy = importNumpy()
+        if background is None:
+            backgroundmask = numpy.ones(len(self.genes), dtype=numpy.bool_)
+        else:
+            backgroundmask = self.geneMask(background)
+        studymask = self.geneMask(study) & backgroundmask
+
+        n = int(studymask.sum())
+        N = int(backgroundmask.sum())
+        if n == 0:
+            return []
+
+        # Term counts in the study and background as sparse vector x matrix products
+        m = self.matrix.astype(numpy.int32)
+        k = numpy.asarray(m.T.dot(studymask.astype(numpy.int32))).ravel()
+        K = numpy.asarray(m.T.dot(backgroundmask.astype(numpy.int32))).ravel()
+
+        tested = numpy.nonzero(k > 0)[0]
+        pvalues = scipy.stats.hypergeom.sf(k[tested] - 1, N, K[tested], n)
+        fdr = benjaminiHochberg(pvalues)
+
+        order = numpy.argsort(pvalues, kind='mergesort')
+        return [
+            (self.terms[tested[i]], int(k[tested[i]]), n, int(K[tested[i]]), N, float(pvalues[i]), float(fdr[i]))
+            for i in order
+        ]
+
+
+def benjaminiHochberg(pvalues):
+    '''
+    Benjamini-Hochberg adjusted p-values of a vector of p-values
+    '''
+    numpy, scipy = importNumpy()
+    pvalues = numpy.asarray(pvalues, dtype=numpy.float64)
+    count = len(pvalues)
+    if count == 0:
+        return pvalues
+    order = numpy.argsort(pvalues)
+    ranked = pvalues[order] * count / numpy.arange(1, count + 1)
+    # Enforce monotonicity from the largest p-value down
+    ranked = numpy.minimum.accumulate(ranked[::-1])[::-1]
+    fdr = numpy.empty(count)
+    fdr[order] = numpy.minimum(ranked, 1.0)
+    return fdr
+
+
+def resolveAliases(store, ids, source):
+    '''
+    Map alias ids of source to goa db_object_ids through the alias table
+    '''
+    alias = store.tables['alias']
+    ids = list(ids)
+    accessions = set()
+    with store.connect() as connection:
+        for i in range(0, len(ids), IN_CHUNK_SIZE):
+            s = select([alias.c.accession]).where(alias.c.source == source).where(alias.c.alias.in_(ids[i:i + IN_CHUNK_SIZE]))
+            accessions.update([row[0] for row in connection.execute(s)])
+    return accessions
+
+
+def enrichIds(store, ids, taxon, source=None, background=None, cachedir=GOALCHEMY_CACHE_DIR, propagate=False):
+    '''
+    Run an enrichment of ids, goa db_object_ids or aliases of source, against the cached
+    matrix of taxon, with annotations propagated to ancestor terms if propagate is True.
+    Returns the AnnotationMatrix.enrich tuples with the GO term name added after the go_id.
+    '''
+    if source is not None:
+        ids = resolveAliases(store, ids, source)
+        if background is not None:
+            background = resolveAliases(store, background, source)
+
+    matrix = AnnotationMatrix.cached(store, taxon, cachedir, propagate)
+    results = matrix.enrich(ids, background)
+
+    go_term = store.tables['go_term']
+    with store.connect() as connection:
+        terms = dict([(row[0], row[1]) for row in connection.execute(select([go_term.c.go_id, go_term.c.term]))])
+    return [(result[0], terms.get(result[0], '')) + result[1:] for result in results]
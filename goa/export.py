@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.export  Streaming export of goa annotations as GAF 2.1, TSV or Parquet
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+import sys
+import logging
+
+from goa.gaf import GOA_TSV_COLUMNS
+
+logger = logging.getLogger()
+
+EXPORT_FORMATS = ['gaf', 'tsv', 'parquet']
+
+# Rows per Parquet record batch
+PARQUET_BATCH_SIZE = 100000
+
+
+def formatValue(value):
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def writeGaf(rows, f):
+    '''
+    Write GOA_TSV_COLUMNS tuples as GAF 2.1 lines.  Returns the number of rows written.
+    '''
+    f.write('!gaf-version: 2.1\n')
+    rowcount = 0
+    for row in rows:
+        fields = [formatValue(value) for value in row]
+        # Dates are stored as dates, GAF has YYYYMMDD
+        if row[13] is not None:
+            fields[13] = row[13].strftime('%Y%m%d')
+        # annotation_extension and gene_product_form_id are not stored
+        f.write('\t'.join(fields + ['', '']) + '\n')
+        rowcount += 1
+    return rowcount
+
+
+def writeTsv(rows, f):
+    '''
+    Write GOA_TSV_COLUMNS tuples as TSV with a header line.  Returns the number of rows written.
+    '''
+    f.write('\t'.join(GOA_TSV_COLUMNS) + '\n')
+    rowcount = 0
+    for row in rows:
+        f.write('\t'.join([formatValue(value) for value in row]) + '\n')
+        rowcount += 1
+    return rowcount
+
+
+def writeParquet(rows, filename, batchsize=PARQUET_BATCH_SIZE):
+    '''
+    Write GOA_TSV_COLUMNS tuples to a Parquet file in record batches of batchsize rows.
+    Needs pyarrow.  Returns the number of rows written.
+    '''
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception('Parquet export needs pyarrow.  Install goalchemy[parquet] or pyarrow.')
+
+    fields = [pyarrow.field(column, pyarrow.date32() if column == 'date' else pyarrow.string()) for column in GOA_TSV_COLUMNS]
+    schema = pyarrow.schema(fields)
+    writer = pyarrow.parquet.ParquetWriter(filename, schema)
+    rowcount = 0
+    try:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batchsize:
+                writer.write_table(parquetTable(batch, schema))
+                rowcount += len(batch)
+                batch = []
+        if len(batch) > 0:
+            writer.write_table(parquetTable(batch, schema))
+            rowcount += len(batch)
+    finally:
+        writer.close()
+    return rowcount
+
+
+def parquetTable(batch, schema):
+    import pyarrow
+    columns = zip(*batch)
+    return pyarrow.Table.from_arrays(
+        [pyarrow.array(list(values), type=field.type) for values, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+def exportAnnotations(store, filename, format='gaf', **filters):
+    '''
+    Export the goa rows matching filters (see Store.iterAnnotations) to filename in format.
+    filename may be '-' for stdout except for Parquet.  Returns the number of rows written.
+    '''
+    if format not in EXPORT_FORMATS:
+        raise Exception('Unknown export format %s.  Use one of %s' % (format, ', '.join(EXPORT_FORMATS)))
+
+    rows = store.iterAnnotations(**filters)
+    if format == 'parquet':
+        if filename == '-':
+            raise Exception('Parquet export needs an output file')
+        rowcount = writeParquet(rows, filename)
+    else:
+        write = writeGaf if format == 'gaf' else writeTsv
+        if filename == '-':
+            rowcount = write(rows, sys.stdout)
+        else:
+            with open(filename, 'w') as f:
+                rowcount = write(rows, f)
+
+    logger.info('%d records exported' % rowcount)
+    return rowcount
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.gaf  Parser for GO Annotation File (GAF) 2.0, 2.1 and 2.2 lines
+
+Rows are checked for their column count and the required GOA columns, and dates are
+converted through a cache so a date object is only built once per distinct date.
+Rejected lines go to an optional reject file, capped at maxrejects lines, and only the
+first maxerrors error messages are kept in memory.
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+import re
+from collections import namedtuple
+from datetime import date
+
+# GAF 2.x columns
+GAF_COLUMNS = [
+    'db',
+    'db_object_id',
+    'db_object_symbol',
+    'qualifier',
+    'go_id',
+    'db_reference',
+    'evidence_code',
+    'with_or_from',
+    'aspect',
+    'db_object_name',
+    'db_object_synonym',
+    'db_object_type',
+    'taxon',
+    'date',
+    'assigned_by',
+    'annotation_extension',
+    'gene_product_form_id',
+]
+
+GafRecord = namedtuple('GafRecord', GAF_COLUMNS)
+
+# Column order of the goa table and the normalized goa TSV used for bulk loads: the first 15 GAF columns.
+# Defined here rather than in goa.store so that the loaders can use them without importing SQLAlchemy.
+GOA_TSV_COLUMNS = GAF_COLUMNS[:15]
+
+# Columns of the goa uix_1 unique constraint that identify an annotation
+GOA_KEY_COLUMNS = ['db', 'db_object_id', 'go_id', 'db_reference']
+
+GAF_VERSIONS = ['2.0', '2.1', '2.2']
+GAF_VERSION_PATTERN = re.compile(r'^!\s*gaf-version:\s*(\S+)')
+
+ASPECTS = frozenset(['P', 'F', 'C'])
+
+# Number of distinct date strings whose date objects are cached
+DATE_CACHE_SIZE = 100000
+
+# Default caps on rejected lines written and error messages kept
+DEFAULT_MAX_REJECTS = 10000
+DEFAULT_MAX_ERRORS = 100
+
+DATE_CACHE = {}
+
+
+def parseDate(value):
+    '''
+    Convert a YYYYMMDD string into a date.  Annotation files only have a few thousand
+    distinct dates, so the date objects are cached.
+    '''
+    d = DATE_CACHE.get(value)
+    if d is None:
+        if len(value) != 8 or not value.isdigit():
+            raise Exception('Invalid date %s' % value)
+        try:
+            d = date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+        except ValueError:
+            raise Exception('Invalid date %s' % value)
+        if len(DATE_CACHE) < DATE_CACHE_SIZE:
+            DATE_CACHE[value] = d
+    return d
+
+
+class GafParser(object):
+    '''
+    Parses GAF lines into tuples of the 15 goa columns, goa column value dicts or
+    GafRecords.  Header lines set version from the !gaf-version line; GAF 2.2 rows must
+    have a qualifier.
+
+    Invalid lines are counted in rejectcount and written to rejectfile, if one is given,
+    until maxrejects lines have been written.  The first maxerrors error messages are
+    kept in errors.
+    '''
+
+    def __init__(self, rejectfile=None, maxrejects=DEFAULT_MAX_REJECTS, maxerrors=DEFAULT_MAX_ERRORS):
+        self.rejectfile = rejectfile
+        self.maxrejects = maxrejects
+        self.maxerrors = maxerrors
+        self.version = None
+        self.linecount = 0
+        self.rejectcount = 0
+        self.errors = []
+        self.rejects = None
+
+    def close(self):
+        '''
+        Close the reject file
+        '''
+        if self.rejects is not None:
+            self.rejects.close()
+            self.rejects = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def header(self, line):
+        '''
+        Handle a ! header line, picking up the GAF version
+        '''
+        m = GAF_VERSION_PATTERN.match(line)
+        if m is not None:
+            if m.group(1) not in GAF_VERSIONS:
+                raise Exception('Unsupported GAF version %s' % m.group(1))
+            self.version = m.group(1)
+
+    def parseFields(self, fields):
+        '''
+        Check the columns of a split GAF row and return the tuple of the 15 goa column
+        values, with the date converted
+        '''
+        if not 15 <= len(fields) <= 17:
+            raise Exception('Row has %d columns, GAF has 15 to 17' % len(fields))
+        if fields[0] == '' or fields[1] == '':
+            raise Exception('Row has no db or db_object_id')
+        if not fields[4].startswith('GO:'):
+            raise Exception('Invalid GO id %s' % fields[4])
+        if fields[8] not in ASPECTS:
+            raise Exception('Invalid aspect %s' % fields[8])
+        if self.version == '2.2' and fields[3] == '':
+            raise Exception('GAF 2.2 rows need a qualifier')
+        return (
+            fields[0], fields[1], fields[2], fields[3], fields[4], fields[5], fields[6], fields[7],
+            fields[8], fields[9], fields[10], fields[11], fields[12], parseDate(fields[13]), fields[14],
+        )
+
+    def parseLine(self, line):
+        '''
+        Parse one line.  Returns the tuple of goa column values, or None for blank, header
+        and rejected lines.
+        '''
+        self.linecount += 1
+        line = line.rstrip('\r\n')
+        if line == '':
+            return None
+        if line[0] == '!':
+            self.header(line)
+            return None
+        try:
+            return self.parseFields(line.split('\t'))
+        except Exception as e:
+            self.reject(line, e)
+            return None
+
+    def reject(self, line, error):
+        '''
+        Count a rejected line, write it to the reject file and keep its error message,
+        within the caps
+        '''
+        self.rejectcount += 1
+        if len(self.errors) < self.maxerrors:
+            self.errors.append('Line %d: %s' % (self.linecount, str(error)))
+        if self.rejectfile is not None and self.rejectcount <= self.maxrejects:
+            if self.rejects is None:
+                self.rejects = open(self.rejectfile, 'w')
+            self.rejects.write(line + '\n')
+
+    def tuples(self, lines):
+        '''
+        Generate tuples of the 15 goa column values, e.g. for bulk loads
+        '''
+        parseLine = self.parseLine
+        for line in lines:
+            values = parseLine(line)
+            if values is not None:
+                yield values
+
+    def values(self, lines):
+        '''
+        Generate goa column value dicts as Store.storeGoaValues takes them
+        '''
+        for values in self.tuples(lines):
+            yield dict(zip(GOA_TSV_COLUMNS, values))
+
+    def records(self, lines):
+        '''
+        Generate GafRecords with all 17 GAF columns, the optional last two as '' if missing
+        '''
+        for line in lines:
+            values = self.parseLine(line)
+            if values is not None:
+                fields = line.rstrip('\r\n').split('\t')
+                yield GafRecord._make(values + tuple(fields[15:17]) + ('',) * (17 - max(len(fields), 15)))
@@ -0,0 +1,1078 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.loader  Functions for loading data files into the Store
+
+Created on  2017-04-25 13:06:50
+
+@author: Aaron Kitzmiller <aaron_kitzmiller@harvard.edu>
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import os
+import sys
+import gzip
+import zlib
+import struct
+import traceback
+import shutil
+import tempfile
+import time
+import logging
+from collections import deque
+from functools import partial
+from datetime import datetime
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+from goa.gaf import GafParser, GOA_TSV_COLUMNS, GOA_KEY_COLUMNS, DEFAULT_MAX_REJECTS, DEFAULT_MAX_ERRORS
+from goa.metrics import LoadStats
+
+logger = logging.getLogger()
+
+# Size of the byte ranges handed to parser processes by parallelLoadGoaFile
+CHUNK_BYTES = 4 * 1024 * 1024
+
+# Size of the blocks read by readLines
+BLOCK_BYTES = 1024 * 1024
+
+# Columns of UniProt idmapping_selected.tab by alias source.  UniProtKB is the accession itself.
+SELECTED_COLUMNS = {
+    'UniProtKB': 0,
+    'UniProtKB-ID': 1,
+    'GeneID': 2,
+    'RefSeq': 3,
+    'GI': 4,
+    'PDB': 5,
+    'UniRef100': 7,
+    'UniRef90': 8,
+    'UniRef50': 9,
+    'UniParc': 10,
+    'PIR': 11,
+    'MIM': 13,
+    'UniGene': 14,
+    'EMBL': 16,
+    'EMBL-CDS': 17,
+    'Ensembl': 18,
+    'Ensembl_TRS': 19,
+    'Ensembl_PRO': 20,
+}
+
+# Alias sources loaded by default, the same ones initBioSqlAliases creates
+DEFAULT_ALIAS_SOURCES = ['UniProtKB', 'UniRef90', 'UniRef100']
+
+
+def isCompressed(filename):
+    """
+    True if filename should be read through gzip
+    """
+    return filename.endswith('.gz') or filename.endswith('.bgz')
+
+
+def openGafFile(filename):
+    """
+    Open a GAF file for binary reading.  '-' is stdin and .gz / .bgz files
+    (including multi-member bgzip files) are decompressed as they are read.
+    """
+    if filename == '-':
+        return sys.stdin
+    if not os.path.exists(filename):
+        raise Exception('File %s does not exist.' % filename)
+    if isCompressed(filename):
+        return gzip.open(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def readBlocks(f, blocksize=BLOCK_BYTES):
+    """
+    Generate blocks of roughly blocksize bytes from f
+    """
+    while True:
+        block = f.read(blocksize)
+        if not block:
+            break
+        yield block
+
+
+def readLines(f, blocksize=BLOCK_BYTES):
+    """
+    Generate the lines of f, without line endings, reading blocksize bytes at a time
+    instead of making a read call per line
+    """
+    tail = ''
+    for block in readBlocks(f, blocksize):
+        lines = block.split('\n')
+        lines[0] = tail + lines[0]
+        tail = lines.pop()
+        for line in lines:
+            yield line
+    if tail:
+        yield tail
+
+
+def fileFingerprint(filename):
+    """
+    Return the load_checkpoint values identifying filename: absolute path, size and mtime
+    """
+    stat = os.stat(filename)
+    return {
+        'filename': os.path.abspath(filename),
+        'file_size': stat.st_size,
+        'file_mtime': int(stat.st_mtime),
+    }
+
+
+def readPosition(f, offset):
+    """
+    Position of a load in the file f for progress reporting: the compressed position
+    of gzip files, else offset
+    """
+    fileobj = getattr(f, 'fileobj', None)
+    if fileobj is not None:
+        return fileobj.tell()
+    return offset
+
+
+def loadStats(store, filename, stats=None):
+    """
+    Return stats, or else store.stats, or else a new LoadStats, with the size of filename,
+    if given, as its totalbytes
+    """
+    if stats is None:
+        stats = store.stats if store.stats is not None else LoadStats()
+    if stats.totalbytes is None and filename not in (None, '-') and os.path.exists(filename):
+        stats.totalbytes = os.path.getsize(filename)
+    return stats
+
+
+def keepErrors(errors, newerrors, maxerrors=DEFAULT_MAX_ERRORS):
+    """
+    Add newerrors to the list errors as long as it has fewer than maxerrors.  Returns the
+    number of newerrors, so that callers can count all errors without keeping them.
+    """
+    errors.extend(newerrors[:max(0, maxerrors - len(errors))])
+    return len(newerrors)
+
+
+def logLoadErrors(errors, errorcount):
+    """
+    Log the errors kept by keepErrors
+    """
+    if errorcount > len(errors):
+        logger.error('%d errors occurred during loading, the first %d:\n%s' % (errorcount, len(errors), '\n'.join(errors)))
+    elif errorcount > 0:
+        logger.error('Errors occurred during loading:\n%s' % '\n'.join(errors))
+
+
+def logRejects(parser, rejectfile=None):
+    """
+    Log the lines rejected by parser and the first of their errors
+    """
+    if parser.rejectcount > 0:
+        logger.error('%d invalid lines rejected%s:\n%s' % (
+            parser.rejectcount,
+            ' (written to %s)' % rejectfile if rejectfile is not None else '',
+            '\n'.join(parser.errors),
+        ))
+
+
+def loadGoaFile(store, filename, commitcount, batch=True, checkpoint=False, resume=False, rejectfile=None, maxrejects=DEFAULT_MAX_REJECTS,
+                stats=None):
+    """
+    Loads a GAF 2.x goa file from Uniprot.  filename may be gzip / bgzip compressed or '-' for stdin.
+
+    Lines are parsed and validated with a GafParser.  Invalid lines are written to
+    rejectfile, if given, up to maxrejects lines.
+
+    By default rows are buffered and written with Store.storeGoaValues, one
+    executemany per commitcount rows.  If batch is False, each row is
+    inserted with Store.storeGoaRow.
+
+    If checkpoint is True, the byte offset and saved count are written to the
+    load_checkpoint table in the transaction of each batch.  If resume is True,
+    loading starts from the last checkpoint of the file.
+
+    Stage times and counters go to stats (see loadStats), which is also updated with
+    the file position after every batch for progress reporting.
+    """
+    stats = loadStats(store, filename, stats)
+    fingerprint = None
+    if checkpoint or resume:
+        if not batch or filename == '-':
+            raise Exception('Checkpoints need batched inserts from a file')
+        fingerprint = fileFingerprint(filename)
+        store.createCheckpointTable()
+
+    savedcount = 0
+    offset = 0
+    errors = []
+    errorcount = 0
+    values = []
+    parser = GafParser(rejectfile, maxrejects)
+    with openGafFile(filename) as f, parser:
+        if resume:
+            previous = store.getCheckpoint(fingerprint['filename'])
+            if previous is None:
+                raise Exception('There is no checkpoint to resume for %s' % filename)
+            if previous['file_size'] != fingerprint['file_size'] or previous['file_mtime'] != fingerprint['file_mtime']:
+                raise Exception('%s has changed since it was checkpointed' % filename)
+            offset = previous['byte_offset']
+            savedcount = previous['saved_count']
+            f.seek(offset)
+            stats.startbytes = readPosition(f, offset)
+            logger.info('Resuming at byte %d with %d records saved' % (offset, savedcount))
+
+        batchstart = time.time()
+        for line in readLines(f):
+            offset += len(line) + 1
+            row = parser.parseLine(line)
+            if row is None:
+                continue
+
+            if batch:
+                values.append(dict(zip(GOA_TSV_COLUMNS, row)))
+                if len(values) >= commitcount:
+                    stats.observe('read_parse', time.time() - batchstart)
+                    if fingerprint is not None:
+                        fingerprint['byte_offset'] = offset
+                        fingerprint['saved_count'] = savedcount
+                    with stats.timer('store_batch'):
+                        saved, rowerrors = store.storeGoaValues(values, fingerprint)
+                    savedcount += saved
+                    errorcount += keepErrors(errors, rowerrors)
+                    stats.count('rows_saved', saved)
+                    stats.count('errors', len(rowerrors))
+                    stats.progress(readPosition(f, offset))
+                    values = []
+                    logger.info('Saved %d records' % savedcount)
+                    batchstart = time.time()
+                continue
+
+            try:
+                with stats.timer('store_row'):
+                    store.storeGoaRow(line.rstrip('\r\n').split('\t'))
+                savedcount += 1
+                stats.count('rows_saved')
+            except Exception as e:
+                errorcount += keepErrors(errors, [str(e)])
+                stats.count('errors')
+                logger.debug('Error loading row: %s\n%s\n%s' % (str(e), line, traceback.format_exc()))
+
+            if savedcount > 0 and savedcount % commitcount == 0:
+                with stats.timer('commit'):
+                    store.commit()
+                stats.progress(readPosition(f, offset))
+                logger.info('Saved %d records' % savedcount)
+
+        if len(values) > 0:
+            stats.observe('read_parse', time.time() - batchstart)
+            if fingerprint is not None:
+                fingerprint['byte_offset'] = offset
+                fingerprint['saved_count'] = savedcount
+            with stats.timer('store_batch'):
+                saved, rowerrors = store.storeGoaValues(values, fingerprint)
+            savedcount += saved
+            errorcount += keepErrors(errors, rowerrors)
+            stats.count('rows_saved', saved)
+            stats.count('errors', len(rowerrors))
+        stats.set('lines_read', parser.linecount)
+        stats.set('lines_rejected', parser.rejectcount)
+        stats.progress(readPosition(f, offset))
+
+    store.commit()
+    store.bumpDataGeneration(aliases=False)
+    if fingerprint is not None:
+        store.deleteCheckpoint(fingerprint['filename'])
+    stats.finish()
+    logger.info(stats.summary())
+    logRejects(parser, rejectfile)
+    logLoadErrors(errors, errorcount)
+
+
+def fileChunks(filename, chunkbytes=CHUNK_BYTES):
+    """
+    Split a file into (start, end) byte ranges of roughly chunkbytes that end on line boundaries
+    """
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunkbytes, size))
+            f.readline()
+            end = f.tell()
+            yield (start, end)
+            start = end
+
+
+def bgzfBlocks(filename):
+    """
+    Generate the (offset, size) of each member of a bgzip file by reading the BSIZE
+    field of the gzip headers.  Raises an Exception if filename is not bgzip.
+    """
+    with open(filename, 'rb') as f:
+        offset = 0
+        while True:
+            header = f.read(12)
+            if len(header) == 0:
+                break
+            if len(header) < 12 or header[0:4] != b'\x1f\x8b\x08\x04':
+                raise Exception('%s is not a bgzip file' % filename)
+            xlen = struct.unpack('<H', header[10:12])[0]
+            extra = f.read(xlen)
+            bsize = None
+            pos = 0
+            while pos + 4 <= len(extra):
+                slen = struct.unpack('<H', extra[pos + 2:pos + 4])[0]
+                if extra[pos:pos + 2] == b'BC' and slen == 2:
+                    bsize = struct.unpack('<H', extra[pos + 4:pos + 6])[0]
+                pos += 4 + slen
+            if bsize is None:
+                raise Exception('%s is not a bgzip file' % filename)
+            yield (offset, bsize + 1)
+            offset += bsize + 1
+            f.seek(offset)
+
+
+def isBgzf(filename):
+    """
+    True if filename is a bgzip file that can be decompressed block parallel
+    """
+    try:
+        next(bgzfBlocks(filename))
+        return True
+    except Exception:
+        return False
+
+
+def bgzfChunks(filename, chunkbytes=CHUNK_BYTES):
+    """
+    Group the members of a bgzip file into (start, end) byte ranges of roughly chunkbytes
+    """
+    start = None
+    for offset, size in bgzfBlocks(filename):
+        if start is None:
+            start = offset
+        end = offset + size
+        if end - start >= chunkbytes:
+            yield (start, end)
+            start = None
+    if start is not None:
+        yield (start, end)
+
+
+def parseGoaLines(lines):
+    """
+    Parse GAF 2.x lines into goa column value dicts.  Returns a tuple of (values, errors,
+    errorcount), with at most DEFAULT_MAX_ERRORS errors kept but all of them counted
+    """
+    parser = GafParser()
+    values = list(parser.values(lines))
+    return (values, parser.errors, parser.rejectcount)
+
+
+def parseData(data, parselines=parseGoaLines):
+    """
+    Parse the complete lines in a block of data with parselines.  The partial lines at
+    either end are returned for the caller to join with the neighbouring blocks.  Runs in
+    a worker process.
+
+    Returns a tuple of (head, parsed, tail) where parsed is the result of parselines, head
+    is the data before the first newline and tail the data after the last one.  If data
+    has no newline, head is all of it and parsed and tail are None.
+    """
+    first = data.find('\n')
+    if first == -1:
+        return (data, None, None)
+    last = data.rfind('\n')
+    return (data[:first], parselines(data[first + 1:last].split('\n')), data[last + 1:])
+
+
+def parseChunk(chunk):
+    """
+    Parse the (filename, start, end, parselines) byte range of a plain file with parseData
+    """
+    filename, start, end, parselines = chunk
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return parseData(data, parselines)
+
+
+def parseBgzfChunk(chunk):
+    """
+    Decompress the bgzip members in the (filename, start, end, parselines) byte range and
+    parse them with parseData
+    """
+    filename, start, end, parselines = chunk
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        raw = f.read(end - start)
+
+    blocks = []
+    while raw:
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        blocks.append(d.decompress(raw))
+        raw = d.unused_data
+    return parseData(''.join(blocks), parselines)
+
+
+def parseStreamBlock(block):
+    """
+    Parse a (data, parselines) block read from a stream with parseData
+    """
+    data, parselines = block
+    return parseData(data, parselines)
+
+
+def parseTasks(filename, parselines, chunkbytes=CHUNK_BYTES):
+    """
+    Generate the (function, argument, position) parse tasks for parallelParse, where
+    position is the input position at the end of the task as readPosition reports it.
+    Plain files and bgzip files are split into byte ranges read by the workers, other
+    gzip files and stdin are read here in blocks of chunkbytes.
+    """
+    if filename == '-' or (isCompressed(filename) and not isBgzf(filename)):
+        with openGafFile(filename) as f:
+            offset = 0
+            for data in readBlocks(f, chunkbytes):
+                offset += len(data)
+                yield (parseStreamBlock, (data, parselines), readPosition(f, offset))
+    elif isCompressed(filename):
+        for start, end in bgzfChunks(filename, chunkbytes):
+            yield (parseBgzfChunk, (filename, start, end, parselines), end)
+    else:
+        for start, end in fileChunks(filename, chunkbytes):
+            yield (parseChunk, (filename, start, end, parselines), end)
+
+
+def parallelParse(filename, parselines, workers, chunkbytes=CHUNK_BYTES, stats=None):
+    """
+    Parse chunks of a file with parselines in a pool of worker processes.  bgzip members are
+    decompressed by the workers as well.  Generates the results of parselines, e.g. (values,
+    errors) tuples, in file order.  If stats is given, the input position of every chunk
+    is reported with stats.progress as its results are generated.
+    At most 2 * workers chunks are in flight at a time so that a slow consumer holds back
+    the parsers instead of filling memory.  parselines must be picklable, e.g. a module
+    level function or a functools.partial of one.
+    """
+    if filename != '-' and not os.path.exists(filename):
+        raise Exception('File %s does not exist.' % filename)
+
+    carry = ''
+    pending = deque()
+    tasks = parseTasks(filename, parselines, chunkbytes)
+    pool = Pool(workers)
+    try:
+        while True:
+            while len(pending) < 2 * workers:
+                try:
+                    function, argument, position = next(tasks)
+                except StopIteration:
+                    break
+                pending.append((pool.apply_async(function, (argument,)), position))
+            if len(pending) == 0:
+                break
+
+            result, position = pending.popleft()
+            head, parsed, tail = result.get()
+            if stats is not None:
+                stats.progress(position)
+
+            # Join the line split across the previous and current chunk
+            carry += head
+            if tail is not None:
+                yield parselines([carry])
+                carry = tail
+
+            if parsed is not None:
+                yield parsed
+
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    yield parselines([carry])
+
+
+def parallelLoadGoaFile(store, filename, commitcount, workers, chunkbytes=CHUNK_BYTES, stats=None):
+    """
+    Loads a GAF 2.1 goa file from Uniprot, parsing chunks of the file in a pool of worker
+    processes with parallelParse.  Parsed chunks are written in file order by this process,
+    one executemany per commitcount rows.  Stage times and counters go to stats (see loadStats),
+    which also gets the file position of every parsed chunk for progress reporting.
+    """
+    stats = loadStats(store, filename, stats)
+    savedcount = 0
+    errors = []
+    errorcount = 0
+    values = []
+    waitstart = time.time()
+    for chunkvalues, chunkerrors, chunkerrorcount in parallelParse(filename, parseGoaLines, workers, chunkbytes, stats):
+        stats.observe('parse_wait', time.time() - waitstart)
+        stats.count('rows_parsed', len(chunkvalues))
+        stats.count('errors', chunkerrorcount)
+        keepErrors(errors, chunkerrors)
+        errorcount += chunkerrorcount
+        values.extend(chunkvalues)
+        start = 0
+        while len(values) - start >= commitcount:
+            with stats.timer('store_batch'):
+                saved, rowerrors = store.storeGoaValues(values[start:start + commitcount])
+            savedcount += saved
+            errorcount += keepErrors(errors, rowerrors)
+            stats.count('rows_saved', saved)
+            stats.count('errors', len(rowerrors))
+            stats.progress()
+            start += commitcount
+            logger.info('Saved %d records' % savedcount)
+        # Only the rows short of a batch are carried over to the next chunk
+        values = values[start:]
+        waitstart = time.time()
+
+    if len(values) > 0:
+        with stats.timer('store_batch'):
+            saved, rowerrors = store.storeGoaValues(values)
+        savedcount += saved
+        errorcount += keepErrors(errors, rowerrors)
+        stats.count('rows_saved', saved)
+        stats.count('errors', len(rowerrors))
+
+    store.commit()
+    store.bumpDataGeneration(aliases=False)
+    stats.finish()
+    logger.info(stats.summary())
+    logLoadErrors(errors, errorcount)
+
+
+def goaCompareValues(values):
+    """
+    Return the goa column values of a row in a form that can be compared between
+    parsed GAF rows and rows read from the database
+    """
+    result = []
+    for column in GOA_TSV_COLUMNS:
+        value = values[column]
+        if value is None:
+            value = ''
+        elif isinstance(value, datetime):
+            value = value.date()
+        result.append(value)
+    return tuple(result)
+
+
+def storeGoaDelta(store, values, counts, errors, seen=None):
+    """
+    Compare a batch of parsed goa values with the rows in the database for the same
+    db_object_ids and upsert only the new and changed ones.  counts is a dict of
+    change type to count and errors a list of error strings, both updated in place
+    (errors with keepErrors).  Returns the number of errors of the batch.
+
+    If seen is a set, annotations of these db_object_ids that are not in the batch are
+    deleted and the (db, db_object_id) pairs are added to seen.  This requires that all
+    annotations of a db_object_id are in the same batch.
+    """
+    objects = {}
+    for value in values:
+        objects.setdefault(value['db'], set()).add(value['db_object_id'])
+
+    # Check before writing, so a file that is not grouped fails without partial changes
+    if seen is not None:
+        for db, db_object_ids in objects.items():
+            for db_object_id in db_object_ids:
+                if (db, db_object_id) in seen:
+                    raise Exception('Annotations of %s %s are not contiguous in the file.  Deletes need a file grouped by db_object_id.' % (db, db_object_id))
+
+    existing = {}
+    for db, db_object_ids in objects.items():
+        existing.update(store.fetchGoaRows(db, db_object_ids))
+
+    changes = []
+    batchkeys = set()
+    batcherrors = []
+    for value in values:
+        key = tuple([value[column] for column in GOA_KEY_COLUMNS])
+        if key in batchkeys:
+            batcherrors.append('Duplicate annotation %s' % ' '.join(key))
+            continue
+        batchkeys.add(key)
+
+        old = existing.pop(key, None)
+        if old is None:
+            counts['inserted'] += 1
+            changes.append(value)
+        elif goaCompareValues(old) != goaCompareValues(value):
+            counts['updated'] += 1
+            changes.append(value)
+        else:
+            counts['unchanged'] += 1
+
+    saved, rowerrors = store.upsertGoaValues(changes)
+
+    if seen is not None:
+        for db, db_object_ids in objects.items():
+            seen.update([(db, db_object_id) for db_object_id in db_object_ids])
+        counts['deleted'] += store.deleteGoaKeys(existing.keys())
+    return keepErrors(errors, batcherrors + rowerrors)
+
+
+def incrementalLoadGoaFile(store, filename, commitcount, delete=False, stats=None):
+    """
+    Loads a GAF 2.1 goa file from Uniprot as a delta against the current goa table.
+    New annotations are inserted, changed ones updated and unchanged ones skipped.
+    If delete is True, annotations that are no longer in the file are deleted.  That
+    keeps the set of (db, db_object_id) pairs in memory and requires the file to be
+    grouped by db_object_id, as the UniProt files are.  Lines are validated with one
+    GafParser for the file, as in loadGoaFile.  Stage times and counters go to stats
+    (see loadStats).
+
+    Returns a dict of change type to count.
+    """
+    stats = loadStats(store, filename, stats)
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    errors = []
+    errorcount = 0
+    seen = set() if delete else None
+    values = []
+    offset = 0
+    parser = GafParser()
+    with openGafFile(filename) as f, parser:
+        for line in readLines(f):
+            offset += len(line) + 1
+            row = parser.parseLine(line)
+            if row is None:
+                continue
+            value = dict(zip(GOA_TSV_COLUMNS, row))
+
+            # Only split batches between db_object_ids
+            if len(values) >= commitcount and (
+                    values[-1]['db'], values[-1]['db_object_id']) != (value['db'], value['db_object_id']):
+                with stats.timer('compare_batch'):
+                    errorcount += storeGoaDelta(store, values, counts, errors, seen)
+                stats.set('rows_saved', counts['inserted'] + counts['updated'])
+                stats.progress(readPosition(f, offset))
+                values = []
+                logger.info('Compared %d records' % (counts['inserted'] + counts['updated'] + counts['unchanged']))
+            values.append(value)
+
+    if len(values) > 0:
+        with stats.timer('compare_batch'):
+            errorcount += storeGoaDelta(store, values, counts, errors, seen)
+
+    if delete:
+        vanished = [obj for obj in store.iterGoaObjects() if obj not in seen]
+        for i in range(0, len(vanished), commitcount):
+            with stats.timer('delete_batch'):
+                counts['deleted'] += store.deleteGoaObjects(vanished[i:i + commitcount])
+
+    store.commit()
+    store.bumpDataGeneration(aliases=False)
+    for change, count in counts.items():
+        stats.set('rows_%s' % change, count)
+    stats.set('rows_saved', counts['inserted'] + counts['updated'])
+    stats.set('lines_read', parser.linecount)
+    stats.set('lines_rejected', parser.rejectcount)
+    stats.set('errors', parser.rejectcount + errorcount)
+    stats.finish()
+    logger.info('%d inserted, %d updated, %d unchanged, %d deleted' % (
+        counts['inserted'], counts['updated'], counts['unchanged'], counts['deleted']))
+    logger.info(stats.summary())
+    logRejects(parser)
+    logLoadErrors(errors, errorcount)
+    return counts
+
+
+def goaTsvLine(row):
+    """
+    Convert a tuple of goa column values from GafParser.tuples into a line of the
+    normalized goa TSV used for bulk loads.  The date is written as YYYY-MM-DD and
+    backslashes are escaped.
+    """
+    values = row[0:13] + (row[13].isoformat(), row[14])
+    return '\t'.join([value.replace('\\', '\\\\') for value in values]) + '\n'
+
+
+def writeGoaTsv(infile, outfile, parser=None):
+    """
+    Stream GAF 2.x lines from infile to outfile as normalized goa TSV.  Lines are
+    parsed and validated with parser, by default a new GafParser, which also counts
+    and writes the rejected lines.  Returns a tuple of (rowcount, errors)
+    """
+    if parser is None:
+        parser = GafParser()
+    rowcount = 0
+    for row in parser.tuples(infile):
+        outfile.write(goaTsvLine(row))
+        rowcount += 1
+
+    return (rowcount, parser.errors)
+
+
+def bulkLoadGoaFile(store, filename, stats=None, invalidate=True, rejectfile=None, maxrejects=DEFAULT_MAX_REJECTS):
+    """
+    Loads a GAF 2.x goa file from Uniprot with the native bulk loader of the database.
+    The file is transformed into a temporary TSV that is loaded by Store.loadGoaTsv.
+    Invalid lines are written to rejectfile, if given, up to maxrejects lines, as in
+    loadGoaFile.  The transform and load stages are timed in stats (see loadStats).
+    invalidate is False for loads into the tables of a release, see loadAliasFile.
+    """
+    stats = loadStats(store, filename, stats)
+    parser = GafParser(rejectfile, maxrejects)
+    tsv = tempfile.NamedTemporaryFile(mode='w', suffix='.tsv', delete=False)
+    try:
+        with openGafFile(filename) as f, parser:
+            with stats.timer('transform'):
+                rowcount, errors = writeGoaTsv(readLines(f), tsv, parser)
+            stats.progress(readPosition(f, stats.totalbytes))
+        tsv.close()
+        stats.count('rows_parsed', rowcount)
+        stats.set('lines_read', parser.linecount)
+        stats.set('lines_rejected', parser.rejectcount)
+        stats.count('errors', parser.rejectcount)
+        logger.info('Transformed %d records' % rowcount)
+
+        with stats.timer('bulk_load'):
+            savedcount = store.loadGoaTsv(tsv.name)
+    finally:
+        tsv.close()
+        os.remove(tsv.name)
+
+    if invalidate:
+        store.bumpDataGeneration(aliases=False)
+
+    stats.count('rows_saved', savedcount)
+    stats.finish()
+    logger.info(stats.summary())
+    logRejects(parser, rejectfile)
+
+
+def partitionGoaTsv(store, infile, tmpdir, parser=None):
+    """
+    Stream GAF 2.x lines from infile into one normalized goa TSV file per store partition
+    in tmpdir.  Lines are parsed and validated with parser, as in writeGoaTsv.
+    Returns a tuple of ({partition: (tsvfilename, rowcount)}, errors)
+    """
+    if parser is None:
+        parser = GafParser()
+    files = {}
+    counts = {}
+    try:
+        for row in parser.tuples(infile):
+            name = store.goaPartitionName(row[12], row[1])
+            if name not in files:
+                files[name] = open(os.path.join(tmpdir, 'goa_%s.tsv' % name), 'w')
+                counts[name] = 0
+            files[name].write(goaTsvLine(row))
+            counts[name] += 1
+    finally:
+        for f in files.values():
+            f.close()
+
+    return (dict([(partition, (files[partition].name, counts[partition])) for partition in files]), parser.errors)
+
+
+def loadGoaPartitions(store, filename, workers=1, replace=False, rejectfile=None, maxrejects=DEFAULT_MAX_REJECTS):
+    """
+    Loads a GAF 2.x goa file into a partitioned Store.  Rows are routed into one TSV file
+    per partition, then the partitions are loaded concurrently on workers threads, each
+    partition in its own transaction.  If replace is True, the taxon partitions present in
+    the file are truncated first, in the transaction of their load, so a species file can be
+    reloaded without touching the rest of the table.  Invalid lines are written to
+    rejectfile, if given, up to maxrejects lines, as in loadGoaFile.
+
+    Returns a dict of partition -> rows loaded.
+    """
+    if store.partition is None:
+        raise Exception('The Store is not partitioned')
+
+    parser = GafParser(rejectfile, maxrejects)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        with openGafFile(filename) as f, parser:
+            partitions, errors = partitionGoaTsv(store, readLines(f), tmpdir, parser)
+        logger.info('Routed %d records to %d partitions' % (sum([p[1] for p in partitions.values()]), len(partitions)))
+        if replace and 'pother' in partitions:
+            raise Exception('Rows of unpartitioned taxa share the pother partition, which cannot be replaced')
+
+        def loadPartition(name):
+            truncate = name if replace else None
+            rowcount = store.loadGoaTsvExecutemany(partitions[name][0], tablename=store.goaPartitionTableName(name), truncate=truncate)
+            logger.info('Loaded %d records into partition %s' % (rowcount, name))
+            return (name, rowcount)
+
+        pool = ThreadPool(workers)
+        try:
+            savedcounts = dict(pool.map(loadPartition, sorted(partitions)))
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(tmpdir)
+
+    store.bumpDataGeneration(aliases=False)
+
+    logger.info('%d records saved' % sum(savedcounts.values()))
+    logRejects(parser, rejectfile)
+    return savedcounts
+
+
+def shadowLoadGoaFile(store, filename, release=None, keep=2, aliasfilename=None, commitcount=10000):
+    """
+    Loads a GAF 2.1 goa file into the shadow tables of a new release, goa__<release> and
+    alias__<release>, and swaps them in with Store.swapRelease once they are loaded and
+    indexed.  goa is bulk loaded.  The aliases are loaded from aliasfilename if it is
+    given and copied from the live alias table otherwise.  keep previous releases are
+    kept for rollback.  If the load fails, the tables of the release are dropped.
+
+    Live readers see no change until the swap: the data generation, and with it the
+    lookup caches and the alias filter, only change in Store.swapRelease.
+
+    Returns the name of the release, by default r<YYYYMMDDHHMMSS>.
+    """
+    if release is None:
+        release = datetime.now().strftime('r%Y%m%d%H%M%S')
+
+    store.createRelease(release)
+    try:
+        store.useRelease(release)
+        try:
+            bulkLoadGoaFile(store, filename, invalidate=False)
+            if aliasfilename is not None:
+                loadAliasFile(store, aliasfilename, commitcount, invalidate=False)
+            else:
+                logger.info('Copied %d aliases' % store.copyLiveTable('alias', release))
+            store.createIndexes(['goa', 'alias'])
+        finally:
+            store.useRelease(None)
+    except Exception:
+        error = sys.exc_info()
+        logger.error('Load of release %s failed, dropping its tables' % release)
+        try:
+            store.dropRelease(release)
+        except Exception as e:
+            logger.error('Could not drop release %s: %s' % (release, str(e)))
+        raise error[0], error[1], error[2]
+
+    store.swapRelease(release, keep)
+    return release
+
+
+def parseAliasLines(lines, sources=DEFAULT_ALIAS_SOURCES):
+    """
+    Parse UniProt id mapping lines into alias column value dicts for the given sources.
+    Both idmapping.dat (accession, type, id) and idmapping_selected.tab lines are
+    understood.  Returns a tuple of (values, errors)
+    """
+    values = []
+    errors = []
+    for line in lines:
+        line = line.rstrip('\r')
+        if line == '':
+            continue
+        fields = line.split('\t')
+        accession = fields[0]
+        if len(fields) == 3:
+            # idmapping.dat has no UniProtKB line, so add the accession with its UniProtKB-ID
+            if fields[1] in sources:
+                values.append({'authority': 'UniProtKB', 'accession': accession, 'alias': fields[2], 'source': fields[1]})
+            if fields[1] == 'UniProtKB-ID' and 'UniProtKB' in sources:
+                values.append({'authority': 'UniProtKB', 'accession': accession, 'alias': accession, 'source': 'UniProtKB'})
+        elif len(fields) > 20:
+            for source in sources:
+                for alias in fields[SELECTED_COLUMNS[source]].split('; '):
+                    if alias != '':
+                        values.append({'authority': 'UniProtKB', 'accession': accession, 'alias': alias, 'source': source})
+        else:
+            errors.append('Id mapping line has %d columns: %s' % (len(fields), line))
+
+    return (values, errors)
+
+
+def loadAliasFile(store, filename, commitcount, sources=DEFAULT_ALIAS_SOURCES, workers=1, chunkbytes=CHUNK_BYTES, stats=None,
+                  invalidate=True):
+    """
+    Loads a UniProt idmapping_selected.tab or idmapping.dat file, optionally gzip / bgzip
+    compressed or '-' for stdin, into the alias table.  Only aliases of the given sources
+    are loaded.  Aliases are upserted on the uix_1 (alias, source) key one executemany per
+    commitcount aliases, so existing aliases are updated instead of failing.  If workers
+    is more than 1, the file is parsed with parallelParse.  Stage times and counters go
+    to stats (see loadStats).
+
+    invalidate is False for loads into the tables of a release, which readers do not see
+    until Store.swapRelease.  The data generation and the alias filter are then left alone.
+    """
+    stats = loadStats(store, None, stats)
+    for source in sources:
+        if source not in SELECTED_COLUMNS:
+            raise Exception('Unknown alias source %s.  Known sources are %s' % (source, ', '.join(sorted(SELECTED_COLUMNS))))
+
+    parselines = partial(parseAliasLines, sources=list(sources))
+    if workers > 1:
+        chunks = parallelParse(filename, parselines, workers, chunkbytes)
+    else:
+        chunks = readAliasChunks(filename, parselines, commitcount)
+
+    savedcount = 0
+    errors = []
+    errorcount = 0
+    batch = {}
+    for chunkvalues, chunkerrors in chunks:
+        errorcount += keepErrors(errors, chunkerrors)
+        stats.count('rows_parsed', len(chunkvalues))
+        stats.count('errors', len(chunkerrors))
+        for value in chunkvalues:
+            # Later lines win, the same as the upsert
+            batch[(value['alias'], value['source'])] = value
+            if len(batch) >= commitcount:
+                with stats.timer('store_batch'):
+                    saved, rowerrors = store.upsertAliasValues(batch.values())
+                savedcount += saved
+                errorcount += keepErrors(errors, rowerrors)
+                stats.count('rows_saved', saved)
+                stats.count('errors', len(rowerrors))
+                stats.progress()
+                batch = {}
+                logger.info('Saved %d aliases' % savedcount)
+
+    if len(batch) > 0:
+        with stats.timer('store_batch'):
+            saved, rowerrors = store.upsertAliasValues(batch.values())
+        savedcount += saved
+        errorcount += keepErrors(errors, rowerrors)
+        stats.count('rows_saved', saved)
+        stats.count('errors', len(rowerrors))
+
+    store.commit()
+    if invalidate:
+        store.bumpDataGeneration()
+        store.aliasesChanged()
+    stats.finish()
+    logger.info('%d aliases saved' % savedcount)
+    logger.info(stats.summary())
+    logLoadErrors(errors, errorcount)
+
+
+def readAliasChunks(filename, parselines, linecount):
+    """
+    Generate (values, errors) for every linecount lines of filename, parsed in this process
+    """
+    with openGafFile(filename) as f:
+        lines = []
+        for line in readLines(f):
+            lines.append(line)
+            if len(lines) >= linecount:
+                yield parselines(lines)
+                lines = []
+        yield parselines(lines)
+
+
+# Relationships followed for ancestor propagation
+PROPAGATE_RELATIONSHIPS = ['is_a', 'part_of']
+
+
+def parseOboLines(lines):
+    """
+    Parse the [Term] stanzas of an OBO file such as go-basic.obo.  Returns a tuple of
+    (terms, edges, altids): terms is a list of (go_id, name), edges a list of
+    (go_id, parent_id, relationship) from is_a and relationship lines, and altids a dict
+    of alt_id -> go_id.
+    """
+    terms = []
+    edges = []
+    altids = {}
+
+    term = None
+    for line in lines:
+        line = line.strip()
+        if line.startswith('['):
+            if term is not None:
+                terms.append((term['id'], term.get('name')))
+            term = {'edges': []} if line == '[Term]' else None
+            continue
+        if term is None or ':' not in line:
+            continue
+
+        key, value = line.split(':', 1)
+        value = value.strip()
+        if key == 'id':
+            term['id'] = value
+        elif key == 'name':
+            term['name'] = value
+        elif key == 'alt_id':
+            altids[value] = term['id']
+        elif key == 'is_a':
+            edges.append((term['id'], value.split()[0], 'is_a'))
+        elif key == 'relationship':
+            fields = value.split()
+            edges.append((term['id'], fields[1], fields[0]))
+    if term is not None:
+        terms.append((term['id'], term.get('name')))
+
+    return (terms, edges, altids)
+
+
+def ancestorClosure(edges, relationships=PROPAGATE_RELATIONSHIPS):
+    """
+    Compute the transitive closure of the edges with one of the given relationships.
+    Returns a dict of go_id -> set of ancestor go_ids, including the go_id itself, for every
+    go_id in the edges.
+    """
+    parents = {}
+    for go_id, parent_id, relationship in edges:
+        parents.setdefault(go_id, set())
+        parents.setdefault(parent_id, set())
+        if relationship in relationships:
+            parents[go_id].add(parent_id)
+
+    closure = {}
+    for start in parents:
+        if start in closure:
+            continue
+        # Iterative depth first search so deep ontologies do not hit the recursion limit
+        stack = [(start, iter(parents[start]))]
+        onstack = set([start])
+        while stack:
+            go_id, pending = stack[-1]
+            parent = next(pending, None)
+            if parent is None:
+                ancestors = set([go_id])
+                for p in parents[go_id]:
+                    ancestors.update(closure[p])
+                closure[go_id] = ancestors
+                onstack.discard(go_id)
+                stack.pop()
+            elif parent in onstack:
+                raise Exception('Ontology has a cycle through %s' % parent)
+            elif parent not in closure:
+                stack.append((parent, iter(parents[parent])))
+                onstack.add(parent)
+    return closure
+
+
+def loadOboFile(store, filename, relationships=PROPAGATE_RELATIONSHIPS):
+    """
+    Loads a GO OBO file such as go-basic.obo, optionally gzip compressed or '-' for stdin,
+    replacing the go_term, go_term_edge and go_term_ancestor tables.  The ancestor
+    closure over the given relationships is computed in memory.  alt_ids get go_term and
+    go_term_ancestor rows of their own so annotations to secondary ids also propagate.
+
+    Returns the number of terms saved.
+    """
+    with openGafFile(filename) as f:
+        terms, edges, altids = parseOboLines(readLines(f))
+
+    closure = ancestorClosure(edges, relationships)
+    names = dict(terms)
+    for go_id, name in terms:
+        closure.setdefault(go_id, set([go_id]))
+    for altid, go_id in altids.items():
+        if altid not in names:
+            terms.append((altid, names.get(go_id)))
+            closure[altid] = closure.get(go_id, set([go_id])) | set([altid])
+
+    ancestors = [(go_id, ancestor_id) for go_id in sorted(closure) for ancestor_id in sorted(closure[go_id])]
+    store.replaceOntology(terms, edges, ancestors)
+    store.bumpDataGeneration(aliases=False)
+    logger.info('%d terms, %d edges and %d ancestor rows saved' % (len(terms), len(edges), len(ancestors)))
+    return len(terms)
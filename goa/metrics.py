@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.metrics  Stage timers, counters and latency histograms for loads and Store queries
+
+A LoadStats object is handed to the loaders and set as Store.stats.  The loaders count
+bytes read and rows parsed and time their stages; Store times its batch inserts, commits
+and lookup queries.  Callbacks added with addCallback are called with the LoadStats on
+every progress update, e.g. ProgressLine for a live progress line with ETA.  At the end
+of a run the stats can be written as JSON or as a Prometheus textfile.
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+import os
+import sys
+import json
+import time
+import threading
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 1.0
+
+
+class StageTimer(object):
+    '''
+    Context manager that adds its elapsed time to a LoadStats stage
+    '''
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.stats.observe(self.name, time.time() - self.start)
+
+
+class LoadStats(object):
+    '''
+    Counters, stage timers and latency histograms of a run.  Timers keep the total
+    seconds and number of observations of a stage and a histogram over LATENCY_BUCKETS.
+    Methods are thread safe, so one LoadStats can be shared by loader threads and
+    AsyncStore lookups.
+
+    totalbytes is the size of the input, used with the read_bytes counter for the
+    progress percentage and ETA.  startbytes is the input position the run started at,
+    e.g. when a load is resumed.
+    '''
+
+    def __init__(self, totalbytes=None, startbytes=0):
+        self.start = time.time()
+        self.end = None
+        self.totalbytes = totalbytes
+        self.startbytes = startbytes
+        self.counters = {}
+        self.timers = {}
+        self.histograms = {}
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def addCallback(self, callback):
+        '''
+        Call callback(stats) on every progress update and at finish
+        '''
+        self.callbacks.append(callback)
+
+    def count(self, name, n=1):
+        '''
+        Add n to the counter name
+        '''
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, name, value):
+        '''
+        Set the counter name to value, e.g. for read_bytes from a file offset
+        '''
+        with self.lock:
+            self.counters[name] = value
+
+    def observe(self, name, seconds):
+        '''
+        Add an observation of seconds to the stage timer name
+        '''
+        with self.lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = [0.0, 0]
+                self.histograms[name] = [0] * (len(LATENCY_BUCKETS) + 1)
+            timer[0] += seconds
+            timer[1] += 1
+            histogram = self.histograms[name]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[-1] += 1
+
+    def timer(self, name):
+        '''
+        Return a context manager that times a stage, e.g.
+
+            with stats.timer('insert'):
+                ...
+        '''
+        return StageTimer(self, name)
+
+    def elapsed(self):
+        '''
+        Seconds since the stats were created, up to finish
+        '''
+        return (self.end or time.time()) - self.start
+
+    def rate(self, name):
+        '''
+        Counter name per second of elapsed time
+        '''
+        elapsed = self.elapsed()
+        return self.counters.get(name, 0) / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        '''
+        Estimated seconds to the end of the input from read_bytes and totalbytes, or None
+        '''
+        done = self.counters.get('read_bytes', 0) - self.startbytes
+        if not self.totalbytes or done <= 0:
+            return None
+        return self.elapsed() * (self.totalbytes - self.startbytes - done) / float(done)
+
+    def progress(self, readbytes=None):
+        '''
+        Record the input position, if given, and call the callbacks
+        '''
+        if readbytes is not None:
+            self.set('read_bytes', readbytes)
+        for callback in self.callbacks:
+            callback(self)
+
+    def finish(self):
+        '''
+        Stop the clock and call the callbacks a last time
+        '''
+        self.end = time.time()
+        self.progress()
+
+    def summary(self):
+        '''
+        One line summary of rows, rate and stage times for the log
+        '''
+        rows = self.counters.get('rows_saved', 0)
+        stages = ', '.join(['%s %.2f s' % (name, self.timers[name][0]) for name in sorted(self.timers)])
+        return '%d rows saved in %.2f s (%.0f rows/sec)%s%s' % (
+            rows, self.elapsed(), self.rate('rows_saved'), '; ' if stages else '', stages,
+        )
+
+    def asDict(self):
+        '''
+        All counters, rates, timers and histograms as a dict for JSON
+        '''
+        with self.lock:
+            timers = dict([
+                (name, {
+                    'seconds': seconds,
+                    'count': count,
+                    'mean': seconds / count if count > 0 else 0.0,
+                    'histogram': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], self.histograms[name])),
+                })
+                for name, (seconds, count) in self.timers.items()
+            ])
+            counters = dict(self.counters)
+        return {
+            'elapsed': self.elapsed(),
+            'counters': counters,
+            'rates': dict([(name, self.rate(name)) for name in counters]),
+            'timers': timers,
+        }
+
+    def writeJson(self, filename):
+        '''
+        Write asDict to filename as JSON
+        '''
+        writeAtomic(filename, json.dumps(self.asDict(), indent=2, sort_keys=True) + '\n')
+
+    def writePrometheus(self, filename, prefix='goalchemy'):
+        '''
+        Write the stats to filename in the Prometheus text format, e.g. for the
+        node_exporter textfile collector.  Counters become <prefix>_<name>_total and
+        timers <prefix>_<name>_seconds histograms.
+        '''
+        lines = [
+            '# TYPE %s_elapsed_seconds gauge' % prefix,
+            '%s_elapsed_seconds %f' % (prefix, self.elapsed()),
+        ]
+        with self.lock:
+            for name in sorted(self.counters):
+                lines.append('# TYPE %s_%s_total counter' % (prefix, name))
+                lines.append('%s_%s_total %d' % (prefix, name, self.counters[name]))
+            for name in sorted(self.timers):
+                metric = '%s_%s_seconds' % (prefix, name)
+                lines.append('# TYPE %s histogram' % metric)
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, self.histograms[name]):
+                    cumulative += count
+                    lines.append('%s_bucket{le="%s"} %d' % (metric, bound, cumulative))
+                lines.append('%s_bucket{le="+Inf"} %d' % (metric, self.timers[name][1]))
+                lines.append('%s_sum %f' % (metric, self.timers[name][0]))
+                lines.append('%s_count %d' % (metric, self.timers[name][1]))
+        writeAtomic(filename, '\n'.join(lines) + '\n')
+
+    def write(self, filename):
+        '''
+        Write the stats as a Prometheus textfile if filename ends with .prom, else as JSON
+        '''
+        if filename.endswith('.prom'):
+            self.writePrometheus(filename)
+        else:
+            self.writeJson(filename)
+
+
+def writeAtomic(filename, data):
+    '''
+    Write data to a temporary file next to filename and rename it into place, so that
+    collectors never read a partial file
+    '''
+    tmpfilename = '%s.tmp' % filename
+    with open(tmpfilename, 'w') as f:
+        f.write(data)
+    os.rename(tmpfilename, filename)
+
+
+def formatSeconds(seconds):
+    '''
+    Format seconds as H:MM:SS
+    '''
+    seconds = int(seconds)
+    return '%d:%02d:%02d' % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+class ProgressLine(object):
+    '''
+    LoadStats callback that rewrites a progress line with percentage, rows, rows/sec and
+    ETA on stream at most every interval seconds
+    '''
+
+    def __init__(self, stream=sys.stderr, interval=PROGRESS_INTERVAL):
+        self.stream = stream
+        self.interval = interval
+        self.last = 0
+
+    def __call__(self, stats):
+        now = time.time()
+        if stats.end is None and now - self.last < self.interval:
+            return
+        self.last = now
+
+        parts = []
+        eta = stats.eta()
+        if stats.totalbytes:
+            parts.append('%5.1f%%' % (100.0 * stats.counters.get('read_bytes', 0) / stats.totalbytes))
+        parts.append('%d rows' % stats.counters.get('rows_saved', 0))
+        parts.append('%.0f rows/sec' % stats.rate('rows_saved'))
+        if stats.counters.get('errors', 0) > 0:
+            parts.append('%d errors' % stats.counters['errors'])
+        if stats.end is not None:
+            parts.append('done in %s' % formatSeconds(stats.elapsed()))
+        elif eta is not None:
+            parts.append('ETA %s' % formatSeconds(eta))
+        self.stream.write('\r%s ' % '  '.join(parts))
+        if stats.end is not None:
+            self.stream.write('\n')
+        self.stream.flush()
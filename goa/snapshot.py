@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+'''
+goa.snapshot  Read-only SQLite snapshots for lookups without a database server
+
+A snapshot holds the alias / goa join denormalized as (alias, source, symbol) -> go_ids,
+the go_term dictionary and go_term_ancestor, indexed for id lookups.
+
+@copyright: 2016 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+import os
+import sqlite3
+import logging
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import select, and_
+
+logger = logging.getLogger()
+
+# Number of ids per lookup query and rows per insert batch
+SNAPSHOT_CHUNK_SIZE = 500
+
+SNAPSHOT_SCHEMA = [
+    '''
+    create table annotation (
+        alias   text not null,
+        source  text not null,
+        symbol  text,
+        go_ids  text not null
+    )
+    ''',
+    '''
+    create index ix_annotation on annotation (alias, source, symbol)
+    ''',
+    '''
+    create table go_term (
+        go_id   text primary key,
+        term    text
+    ) without rowid
+    ''',
+    '''
+    create table go_term_ancestor (
+        go_id       text not null,
+        ancestor_id text not null,
+        primary key (go_id, ancestor_id)
+    ) without rowid
+    ''',
+    '''
+    create table snapshot_info (
+        key     text primary key,
+        value   text
+    )
+    ''',
+]
+
+
+def exportSnapshot(store, filename, chunksize=10000):
+    '''
+    Write a snapshot of store to the SQLite file filename.  The snapshot is built in a
+    temporary file next to filename and renamed into place when it is complete.
+
+    Returns the number of annotation rows written.
+    '''
+    tmpfilename = '%s.tmp' % filename
+    if os.path.exists(tmpfilename):
+        os.remove(tmpfilename)
+
+    alias = store.tables['alias']
+    goa = store.tables['goa']
+    go_term = store.tables['go_term']
+
+    db = sqlite3.connect(tmpfilename)
+    try:
+        db.execute('pragma journal_mode = off')
+        db.execute('pragma synchronous = off')
+        for sql in SNAPSHOT_SCHEMA:
+            db.execute(sql)
+
+        with store.connect() as connection:
+            s = select([go_term.c.go_id, go_term.c.term])
+            db.executemany('insert into go_term values (?, ?)', connection.execution_options(stream_results=True).execute(s))
+
+            ga = store.tables['go_term_ancestor']
+            if store.engine.has_table(ga.name):
+                s = select([ga.c.go_id, ga.c.ancestor_id])
+                db.executemany('insert into go_term_ancestor values (?, ?)', connection.execution_options(stream_results=True).execute(s))
+
+            j = alias.join(goa, and_(goa.c.db == alias.c.authority, goa.c.db_object_id == alias.c.accession))
+            s = select([alias.c.alias, alias.c.source, goa.c.db_object_symbol, goa.c.go_id]).select_from(j)
+            s = s.order_by(alias.c.alias, alias.c.source, goa.c.db_object_symbol, goa.c.go_id)
+            rows = connection.execution_options(stream_results=True).execute(s)
+
+            rowcount = 0
+            batch = []
+            for key, annotations in groupby(rows, lambda row: (row[0], row[1], row[2])):
+                goids = sorted(set([row[3] for row in annotations]))
+                batch.append(key + (';'.join(goids),))
+                if len(batch) >= chunksize:
+                    db.executemany('insert into annotation values (?, ?, ?, ?)', batch)
+                    rowcount += len(batch)
+                    batch = []
+                    logger.info('Exported %d annotation rows' % rowcount)
+            db.executemany('insert into annotation values (?, ?, ?, ?)', batch)
+            rowcount += len(batch)
+
+        db.executemany('insert into snapshot_info values (?, ?)', [
+            ('created', datetime.now().isoformat()),
+            ('data_generation', str(store.getDataGeneration())),
+            ('annotation_rows', str(rowcount)),
+        ])
+        db.commit()
+        db.execute('analyze')
+        db.commit()
+    finally:
+        db.close()
+
+    os.rename(tmpfilename, filename)
+    logger.info('%d annotation rows exported to %s' % (rowcount, filename))
+    return rowcount
+
+
+class Snapshot(object):
+    '''
+    Read-only lookups against a snapshot file written by exportSnapshot
+    '''
+
+    def __init__(self, filename):
+        if not os.path.exists(filename):
+            raise Exception('Snapshot %s does not exist.' % filename)
+        self.filename = filename
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.execute('pragma query_only = 1')
+        self.terms = dict(self.db.execute('select go_id, term from go_term'))
+        self.info = dict(self.db.execute('select key, value from snapshot_info'))
+
+    def close(self):
+        self.db.close()
+
+    def searchByIds(self, ids, source=None, chunksize=SNAPSHOT_CHUNK_SIZE, propagate=False):
+        '''
+        Search the snapshot for an iterable of alias ids, optionally limited to one alias
+        source.  Generates (id, goa_symbol, go_terms) tuples like Store.searchByIds.  If
+        propagate is True, the go_terms include all ancestors of the annotated terms.
+        '''
+        chunk = []
+        for id in ids:
+            chunk.append(id)
+            if len(chunk) >= chunksize:
+                for result in self.searchIdChunk(chunk, source, propagate):
+                    yield result
+                chunk = []
+        if len(chunk) > 0:
+            for result in self.searchIdChunk(chunk, source, propagate):
+                yield result
+
+    def getAncestors(self, go_ids):
+        '''
+        Return a dict of go_id -> set of ancestor go_ids, including the go_id itself, for go_ids
+        '''
+        go_ids = list(go_ids)
+        ancestors = {}
+        for i in range(0, len(go_ids), SNAPSHOT_CHUNK_SIZE):
+            chunk = go_ids[i:i + SNAPSHOT_CHUNK_SIZE]
+            sql = 'select go_id, ancestor_id from go_term_ancestor where go_id in (%s)' % ', '.join(['?'] * len(chunk))
+            for go_id, ancestor_id in self.db.execute(sql, chunk):
+                ancestors.setdefault(go_id, set()).add(ancestor_id)
+        return ancestors
+
+    def searchIdChunk(self, ids, source=None, propagate=False):
+        '''
+        Look up one chunk of ids and return a list of (id, goa_symbol, go_terms) tuples
+        '''
+        ids = list(set(ids))
+        sql = 'select alias, symbol, go_ids from annotation where alias in (%s)' % ', '.join(['?'] * len(ids))
+        if source is not None:
+            sql += ' and source = ?'
+            ids.append(source)
+        sql += ' order by alias, symbol'
+
+        found = []
+        for (id, symbol), rows in groupby(self.db.execute(sql, ids), lambda row: (row[0], row[1])):
+            goids = set()
+            for row in rows:
+                goids.update(row[2].split(';'))
+            found.append((id, symbol, goids))
+
+        if propagate:
+            ancestors = self.getAncestors(set().union(*[result[2] for result in found]))
+        results = []
+        for id, symbol, goids in found:
+            if propagate:
+                goids = set().union(*[ancestors.get(termid, set()) for termid in goids])
+            terms = sorted(set([self.terms[goid] for goid in goids if goid in self.terms]))
+            if len(terms) > 0:
+                results.append((id, symbol, ';'.join(terms)))
+        return results
@@ -10,20 +10,105 @@ Created on  2017-04-25 12:39:14
 @license: GPL v2.0
 '''
 import os
+import re
+import sys
+import time
+import zlib
+import tempfile
+import threading
+from itertools import groupby
 from sqlalchemy.engine import create_engine
-from sqlalchemy import MetaData, Column, Table, types, UniqueConstraint
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine.url import make_url
+from sqlalchemy import MetaData, Column, Table, Index, ForeignKey, types, UniqueConstraint, select, and_, text, bindparam, inspect, literal_column, union_all, func
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
+from sqlalchemy import event
+from sqlalchemy.schema import AddConstraint, DropConstraint, CreateTable
 import logging
-from datetime import datetime
+from datetime import datetime, date
+
+from goa.gaf import parseDate, GOA_TSV_COLUMNS, GOA_KEY_COLUMNS
+from goa.bloom import BloomFilter, aliasKey, DEFAULT_ERROR_RATE
 
 GOALCHEMY_USER      = os.environ.get('GOALCHEMY_USER')
 GOALCHEMY_PASSWORD  = os.environ.get('GOALCHEMY_PASSWORD')
 GOALCHEMY_DATABASE  = os.environ.get('GOALCHEMY_DATABASE')
 GOALCHEMY_HOST      = os.environ.get('GOALCHEMY_HOST', 'localhost')
 GOALCHEMY_DRIVER    = os.environ.get('GOALCHEMY_DRIVER', 'mysql+mysqldb')
+GOALCHEMY_CACHE_DIR = os.environ.get('GOALCHEMY_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.goalchemy'))
 
 logger = logging.getLogger()
 
+# Loaded columns of the alias table and its uix_1 unique constraint
+ALIAS_COLUMNS = ['authority', 'accession', 'alias', 'source']
+ALIAS_KEY_COLUMNS = ['alias', 'source']
+
+# (source, prefix) rules for the aliases initBioSqlAliases creates from each bioentry accession
+BIOSQL_ALIAS_RULES = [
+    ('UniProtKB', ''),
+    ('UniRef90', 'UniRef90_'),
+    ('UniRef100', 'UniRef100_'),
+]
+
+# Maximum number of values in an IN list or multi-row statement
+IN_CHUNK_SIZE = 500
+
+# Low cardinality goa columns stored as integer ids into goa_<column> lookup tables in the compact schema
+GOA_ENCODED_COLUMNS = ['db', 'qualifier', 'evidence_code', 'aspect', 'db_object_type', 'taxon', 'assigned_by']
+
+# Per protein goa columns stored once in the db_object table of the compact schema
+DB_OBJECT_COLUMNS = ['db_id', 'db_object_id', 'db_object_symbol', 'db_object_name', 'db_object_synonym', 'db_object_type_id']
+DB_OBJECT_KEY_COLUMNS = ['db_id', 'db_object_id']
+
+# Columns of the goa_annotation fact table of the compact schema and its unique key
+GOA_ANNOTATION_COLUMNS = [
+    'object_id',
+    'qualifier_id',
+    'go_id',
+    'db_reference',
+    'evidence_code_id',
+    'with_or_from',
+    'aspect_id',
+    'taxon_id',
+    'date',
+    'assigned_by_id',
+]
+GOA_ANNOTATION_KEY_COLUMNS = ['object_id', 'go_id', 'db_reference']
+
+# Ways the goa table can be partitioned
+GOA_PARTITION_TYPES = ['taxon', 'hash']
+
+# Tables that are loaded and swapped together as a release by swapRelease
+RELEASE_TABLES = ['goa', 'alias']
+
+# Dialects with native partitioning.  Elsewhere each partition is a goa_<partition> table behind a goa view.
+NATIVE_PARTITION_DIALECTS = ['mysql', 'postgresql']
+
+
+def goaColumns():
+    '''
+    Return new Column objects for the columns of the goa table, or the goa view of the compact schema
+    '''
+    return [
+        Column('id',                            types.Integer, primary_key=True, autoincrement='auto'),
+        Column('db',                            types.String(50)),
+        Column('db_object_id',                  types.String(20)),
+        Column('db_object_symbol',              types.String(50)),
+        Column('qualifier',                     types.String(20)),
+        Column('go_id',                         types.String(20)),
+        Column('db_reference',                  types.String(50)),
+        Column('evidence_code',                 types.String(10)),
+        Column('with_or_from',                  types.String(100)),
+        Column('aspect',                        types.String(1)),
+        Column('db_object_name',                types.String(50)),
+        Column('db_object_synonym',             types.String(500)),
+        Column('db_object_type',                types.String(20)),
+        Column('taxon',                         types.String(20)),
+        Column('organism',                      types.String(50)),
+        Column('date',                          types.Date()),
+        Column('assigned_by',                   types.String(20)),
+    ]
+
 
 class Store(object):
     '''
@@ -32,52 +117,138 @@ class Store(object):
     Table goa
         with_or_from                Additional identifier(s) to support annotations using certain evidence codes
                                     (including IEA, IPI, IGI, IMP, IC and ISS evidences).
+
+    Compact schema
+        goa_<column>                Lookup tables (id, value) for the GOA_ENCODED_COLUMNS
+        db_object                   The per protein columns, once per (db, db_object_id)
+        goa_annotation              Annotations with integer ids into db_object and the lookup tables
+        goa                         View joining them back into the columns of the goa table
     '''
 
-    def __init__(self, connectstring=None):
+    def __init__(self, connectstring=None, cache=None, poolsize=None, maxoverflow=None, poolrecycle=None, poolpreping=False, compact=False,
+                 partition=None, partitions=None, stats=None, aliasfilterdir=None):
         '''
         Create the engine and connection.  Define the jobreport table
+
+        cache is an optional goa.cache.LookupCache used by searchByIds.  poolsize, maxoverflow,
+        poolrecycle (seconds) and poolpreping are passed to the engine connection pool as
+        pool_size, max_overflow, pool_recycle and pool_pre_ping when they are set.
+
+        A Store can be shared by threads: session and connection are per thread and other
+        queries check a connection out of the pool for their duration.
+
+        If compact is True, annotations are stored in the dictionary encoded compact schema
+        and goa is a read-only view over it.  The database must have been created with the
+        same setting.
+
+        partition is None, 'taxon' or 'hash'.  For 'taxon', partitions is a list of taxa that
+        get a partition each; other taxa, and rows with more than one taxon, share a pother
+        partition.  MySQL has no default list partition, so it only supports 'hash'.  For
+        'hash', partitions is the number of partitions by hash of db_object_id.  MySQL and PostgreSQL partition natively; on other databases each
+        partition is a goa_<partition> table and goa is a union view over them that the
+        Store routes writes around.  The database must have been created with the same settings.
+
+        stats is an optional goa.metrics.LoadStats.  If it is set, batch inserts, commits and
+        searchByIds queries are timed and counted in it.
+
+        The engine, and with it the database driver, is only created when the Store first
+        needs it (see engine), so constructing a Store does not touch the database.
+
+        aliasfilterdir is an optional directory (e.g. GOALCHEMY_CACHE_DIR) for the Bloom filter
+        over the alias table.  If it is set, the filter is rebuilt when aliases are loaded
+        and searchByIds / searchByIdListFile drop ids that are definitely not aliases before
+        querying.  Without a filter for the current data generation, all ids are queried.
         '''
+        self.cache = cache
+        self.stats = stats
+        self.aliasfilterdir = aliasfilterdir
+        self.aliasfilter = None
+        self.aliasfiltergeneration = None
+        self.compact = compact
+        self.encoders = {}
+        self.objectids = {}
+
+        if partition is not None and partition not in GOA_PARTITION_TYPES:
+            raise Exception('Unknown partition type %s.  Use one of %s' % (partition, ', '.join(GOA_PARTITION_TYPES)))
+        if partition is not None and compact:
+            raise Exception('Partitioning is not supported with the compact schema')
+        self.partition = partition
+        if partition == 'taxon':
+            self.partitiontaxa = ['taxon:%s' % str(taxon).replace('taxon:', '') for taxon in partitions or []]
+        elif partition == 'hash':
+            self.partitioncount = int(partitions or 16)
 
         if connectstring is None:
             connectstring = '%s://%s:%s@%s' % (GOALCHEMY_DRIVER, GOALCHEMY_USER, GOALCHEMY_PASSWORD, GOALCHEMY_HOST)
 
-        # configure Session class with desired options
-        self.engine = create_engine(connectstring)
-        Session = sessionmaker(bind=self.engine)
+        pooloptions = {}
+        if poolsize is not None:
+            pooloptions['pool_size'] = poolsize
+        if maxoverflow is not None:
+            pooloptions['max_overflow'] = maxoverflow
+        if poolrecycle is not None:
+            pooloptions['pool_recycle'] = poolrecycle
+        if poolpreping:
+            pooloptions['pool_pre_ping'] = True
+
+        self.connectstring = connectstring
+        self.pooloptions = pooloptions
+        self.dialectname = make_url(connectstring).get_backend_name()
+        # MySQL compares aliases case insensitively and ignoring trailing spaces
+        self.foldaliases = self.dialectname == 'mysql'
+        if partition == 'taxon' and self.dialectname == 'mysql':
+            raise Exception('MySQL list partitions have no default for other taxa, use hash partitions on MySQL')
+        self.lazyengine = None
+        self.enginelock = threading.Lock()
+
+        # configure Session class with desired options, bound to the engine when it is created
+        self.Session = scoped_session(sessionmaker())
+        self.local = threading.local()
+
+        self.poolcounts = {'connects': 0, 'checkouts': 0, 'checkins': 0, 'maxcheckedout': 0}
+        self.poolwait = {'count': 0, 'total': 0.0, 'max': 0.0}
+        self.poollock = threading.Lock()
 
-        self.session = Session()
         self.metadata = MetaData()
+        self.viewmetadata = None
 
         self.tables = {}
-        self.tables['goa'] = Table(
-            'goa',
-            self.metadata,
-            Column('id',                            types.Integer, primary_key=True, autoincrement='auto'),
-            Column('db',                            types.String(50)),
-            Column('db_object_id',                  types.String(20)),
-            Column('db_object_symbol',              types.String(50)),
-            Column('qualifier',                     types.String(20)),
-            Column('go_id',                         types.String(20)),
-            Column('db_reference',                  types.String(50)),
-            Column('evidence_code',                 types.String(10)),
-            Column('with_or_from',                  types.String(100)),
-            Column('aspect',                        types.String(1)),
-            Column('db_object_name',                types.String(50)),
-            Column('db_object_synonym',             types.String(500)),
-            Column('db_object_type',                types.String(20)),
-            Column('taxon',                         types.String(20)),
-            Column('organism',                      types.String(50)),
-            Column('date',                          types.Date()),
-            Column('assigned_by',                   types.String(20)),
-            UniqueConstraint('db', 'db_object_id', 'go_id', 'db_reference', name='uix_1'),
-        )
+        if compact:
+            self.defineCompactTables()
+        elif partition is not None:
+            self.definePartitionTables()
+        else:
+            self.tables['goa'] = Table(
+                'goa',
+                self.metadata,
+                *goaColumns() + [
+                    UniqueConstraint('db', 'db_object_id', 'go_id', 'db_reference', name='uix_1'),
+                    # Covers the alias join and go_term lookup of searchByIds / searchByIdListFile
+                    Index('ix_goa_object', 'db', 'db_object_id', 'go_id', 'db_object_symbol'),
+                ]
+            )
         self.tables['go_term'] = Table(
             'go_term',
             self.metadata,
             Column('go_id',                         types.String(20), primary_key=True),
             Column('term',                          types.String(200)),
         )
+        self.tables['go_term_edge'] = Table(
+            'go_term_edge',
+            self.metadata,
+            Column('go_id',                         types.String(20), primary_key=True),
+            Column('parent_id',                     types.String(20), primary_key=True),
+            Column('relationship',                  types.String(50), primary_key=True),
+        )
+        # Transitive closure of the go_term_edge relationships used for propagation,
+        # including a row for each term with itself
+        self.tables['go_term_ancestor'] = Table(
+            'go_term_ancestor',
+            self.metadata,
+            Column('go_id',                         types.String(20), primary_key=True),
+            Column('ancestor_id',                   types.String(20), primary_key=True),
+            Index('ix_go_term_ancestor_ancestor', 'ancestor_id'),
+        )
         self.tables['alias'] = Table(
             'alias',
             self.metadata,
@@ -87,22 +258,431 @@ class Store(object):
             Column('alias',                         types.String(100)),
             Column('source',                        types.String(100)),
             UniqueConstraint('alias', 'source', name='uix_1'),
+            # Covers the id lookup and goa join of searchByIds / searchByIdListFile
+            Index('ix_alias_lookup', 'alias', 'source', 'authority', 'accession'),
+            Index('ix_alias_accession', 'authority', 'accession'),
+        )
+        self.tables['load_checkpoint'] = Table(
+            'load_checkpoint',
+            self.metadata,
+            Column('filename',                      types.String(255), primary_key=True),
+            Column('file_size',                     types.BigInteger),
+            Column('file_mtime',                    types.BigInteger),
+            Column('byte_offset',                   types.BigInteger),
+            Column('saved_count',                   types.BigInteger),
+            Column('updated',                       types.DateTime()),
         )
+        self.tables['data_generation'] = Table(
+            'data_generation',
+            self.metadata,
+            Column('id',                            types.Integer, primary_key=True, autoincrement=False),
+            Column('generation',                    types.BigInteger),
+        )
+        # Releases of the goa and alias tables, see createRelease and swapRelease
+        self.tables['goa_release'] = Table(
+            'goa_release',
+            self.metadata,
+            Column('release',                       types.String(50), primary_key=True),
+            Column('status',                        types.String(20)),
+            Column('created',                       types.DateTime()),
+            Column('swapped',                       types.DateTime()),
+        )
+
+        self.livetables = dict([(tablename, self.tables[tablename]) for tablename in RELEASE_TABLES])
+
+    def defineCompactTables(self):
+        '''
+        Define the lookup, db_object and goa_annotation tables of the compact schema and
+        the goa view over them.  The view Table is kept out of self.metadata so that
+        create_all does not create it as a table.
+        '''
+        lengths = dict([(column.name, column.type.length) for column in goaColumns() if column.name in GOA_ENCODED_COLUMNS])
+        for column in GOA_ENCODED_COLUMNS:
+            self.tables['goa_%s' % column] = Table(
+                'goa_%s' % column,
+                self.metadata,
+                Column('id',                        types.Integer, primary_key=True, autoincrement='auto'),
+                Column('value',                     types.String(lengths[column])),
+                UniqueConstraint('value', name='uix_goa_%s' % column),
+            )
+        self.tables['db_object'] = Table(
+            'db_object',
+            self.metadata,
+            Column('id',                            types.Integer, primary_key=True, autoincrement='auto'),
+            Column('db_id',                         types.Integer, ForeignKey('goa_db.id')),
+            Column('db_object_id',                  types.String(20)),
+            Column('db_object_symbol',              types.String(50)),
+            Column('db_object_name',                types.String(50)),
+            Column('db_object_synonym',             types.String(500)),
+            Column('db_object_type_id',             types.Integer, ForeignKey('goa_db_object_type.id')),
+            UniqueConstraint('db_id', 'db_object_id', name='uix_db_object'),
+        )
+        self.tables['goa_annotation'] = Table(
+            'goa_annotation',
+            self.metadata,
+            Column('id',                            types.Integer, primary_key=True, autoincrement='auto'),
+            Column('object_id',                     types.Integer, ForeignKey('db_object.id'), nullable=False),
+            Column('qualifier_id',                  types.Integer, ForeignKey('goa_qualifier.id')),
+            Column('go_id',                         types.String(20)),
+            Column('db_reference',                  types.String(50)),
+            Column('evidence_code_id',              types.Integer, ForeignKey('goa_evidence_code.id')),
+            Column('with_or_from',                  types.String(100)),
+            Column('aspect_id',                     types.Integer, ForeignKey('goa_aspect.id')),
+            Column('taxon_id',                      types.Integer, ForeignKey('goa_taxon.id')),
+            Column('date',                          types.Date()),
+            Column('assigned_by_id',                types.Integer, ForeignKey('goa_assigned_by.id')),
+            UniqueConstraint('object_id', 'go_id', 'db_reference', name='uix_goa_annotation'),
+        )
+        self.viewmetadata = MetaData()
+        self.tables['goa'] = Table('goa', self.viewmetadata, *goaColumns())
+
+    def goaViewSelect(self):
+        '''
+        Return the select of the compact schema goa view with the columns of the goa table
+        '''
+        a = self.tables['goa_annotation']
+        o = self.tables['db_object']
+        lookups = dict([(column, self.tables['goa_%s' % column].alias('l_%s' % column)) for column in GOA_ENCODED_COLUMNS])
+
+        j = a.join(o, a.c.object_id == o.c.id).join(lookups['db'], o.c.db_id == lookups['db'].c.id)
+        j = j.outerjoin(lookups['db_object_type'], o.c.db_object_type_id == lookups['db_object_type'].c.id)
+        for column in ['qualifier', 'evidence_code', 'aspect', 'taxon', 'assigned_by']:
+            j = j.outerjoin(lookups[column], a.c['%s_id' % column] == lookups[column].c.id)
 
-        self.metadata.bind = self.engine
-        self.connection = self.engine.connect()
+        columns = []
+        for column in goaColumns():
+            name = column.name
+            if name in GOA_ENCODED_COLUMNS:
+                columns.append(lookups[name].c.value.label(name))
+            elif name in ('id', 'go_id', 'db_reference', 'with_or_from', 'date'):
+                columns.append(a.c[name])
+            elif name == 'organism':
+                columns.append(literal_column('NULL').label(name))
+            else:
+                columns.append(o.c[name])
+        return select(columns).select_from(j)
+
+    @property
+    def partitionTables(self):
+        '''
+        True if goa partitions are emulated with goa_<partition> tables
+        '''
+        return self.partition is not None and self.dialectname not in NATIVE_PARTITION_DIALECTS
+
+    def goaPartitionNames(self):
+        '''
+        Return the names of the goa partitions
+        '''
+        if self.partition == 'taxon':
+            return ['p%s' % taxon.replace('taxon:', '') for taxon in self.partitiontaxa] + ['pother']
+        if self.partition == 'hash':
+            return ['p%d' % i for i in range(self.partitioncount)]
+        return []
+
+    def goaPartitionName(self, taxon=None, db_object_id=None):
+        '''
+        Return the name of the partition a goa row with taxon and db_object_id belongs to.
+        Like the database's list partitioning, this matches the whole taxon value, so rows
+        with more than one taxon (interactions) go to pother.
+        '''
+        if self.partition == 'taxon':
+            if taxon in self.partitiontaxa:
+                return 'p%s' % taxon.replace('taxon:', '')
+            return 'pother'
+        return 'p%d' % ((zlib.crc32(db_object_id or '') & 0xffffffff) % self.partitioncount)
+
+    def definePartitionTables(self):
+        '''
+        Define the goa table of a partitioned Store.  With native partitioning the partition
+        columns have to be part of the primary key and the uix_1 constraint.  Otherwise there
+        is a goa_<partition> table per partition and goa is a view kept out of self.metadata.
+        '''
+        if self.dialectname in NATIVE_PARTITION_DIALECTS:
+            partitioncolumn = 'taxon' if self.partition == 'taxon' else 'db_object_id'
+            columns = goaColumns()
+            for column in columns:
+                if column.name == 'id':
+                    column.autoincrement = True
+                if column.name == partitioncolumn:
+                    column.primary_key = True
+                    column.nullable = False
+            keycolumns = GOA_KEY_COLUMNS + (['taxon'] if self.partition == 'taxon' else [])
+            self.tables['goa'] = Table(
+                'goa',
+                self.metadata,
+                *columns + [
+                    UniqueConstraint(*keycolumns, name='uix_1'),
+                    Index('ix_goa_object', 'db', 'db_object_id', 'go_id', 'db_object_symbol'),
+                ]
+            )
+            return
+
+        for name in self.goaPartitionNames():
+            self.tables['goa_%s' % name] = Table(
+                'goa_%s' % name,
+                self.metadata,
+                *goaColumns() + [
+                    UniqueConstraint('db', 'db_object_id', 'go_id', 'db_reference', name='uix_1_%s' % name),
+                    Index('ix_goa_object_%s' % name, 'db', 'db_object_id', 'go_id', 'db_object_symbol'),
+                ]
+            )
+        self.viewmetadata = MetaData()
+        self.tables['goa'] = Table('goa', self.viewmetadata, *goaColumns())
+
+    @property
+    def goaKeyColumns(self):
+        '''
+        Columns of the goa uix_1 unique constraint
+        '''
+        if self.partition == 'taxon' and not self.partitionTables:
+            return GOA_KEY_COLUMNS + ['taxon']
+        return GOA_KEY_COLUMNS
+
+    def createPartitionedGoa(self):
+        '''
+        Create the natively partitioned goa table and, on PostgreSQL, its partitions
+        '''
+        dialect = self.dialectname
+        goa = self.tables['goa']
+        names = self.goaPartitionNames()
+        sql = str(CreateTable(goa).compile(dialect=self.engine.dialect)).strip()
+        partitions = []
+        if dialect == 'mysql':
+            sql += ' partition by key (db_object_id) partitions %d' % self.partitioncount
+        elif self.partition == 'taxon':
+            sql += ' partition by list (taxon)'
+            partitions = ["create table goa_%s partition of goa for values in ('%s')" % (name, taxon) for name, taxon in zip(names, self.partitiontaxa)]
+            partitions.append('create table goa_pother partition of goa default')
+        else:
+            sql += ' partition by hash (db_object_id)'
+            partitions = [
+                'create table goa_%s partition of goa for values with (modulus %d, remainder %d)' % (name, self.partitioncount, i)
+                for i, name in enumerate(names)
+            ]
+
+        for statement in [sql] + partitions:
+            self.connection.execute(text(statement).execution_options(autocommit=True))
+        for index in goa.indexes:
+            index.create(bind=self.connection)
+
+    def routeGoaValues(self, values):
+        '''
+        Group goa column value dicts by the table they have to be written to: their
+        goa_<partition> table if partitions are emulated, goa otherwise
+        '''
+        if not self.partitionTables:
+            return {'goa': values}
+        routed = {}
+        for value in values:
+            routed.setdefault('goa_%s' % self.goaPartitionName(value['taxon'], value['db_object_id']), []).append(value)
+        return routed
+
+    def truncateGoaPartition(self, name):
+        '''
+        Remove all rows of one taxon partition, e.g. before reloading that species.  Inside
+        a transaction of self.connection, the truncate is part of it.
+        '''
+        if self.partition != 'taxon':
+            raise Exception('Only taxon partitions can be truncated')
+        if name not in self.goaPartitionNames():
+            raise Exception('Unknown partition %s' % name)
+        if self.dialectname == 'postgresql':
+            sql = 'truncate table goa_%s' % name
+        else:
+            sql = 'delete from goa_%s' % name
+        self.connection.execute(text(sql).execution_options(autocommit=True))
+        logger.info('Truncated goa partition %s' % name)
+
+    @property
+    def goaTableNames(self):
+        '''
+        Names of the tables that hold the goa annotations
+        '''
+        if self.compact:
+            return ['goa_annotation', 'db_object']
+        if self.partitionTables:
+            return ['goa_%s' % name for name in self.goaPartitionNames()]
+        return ['goa']
+
+    @property
+    def engine(self):
+        '''
+        The SQLAlchemy engine, created on first use.  The Session and the table metadata
+        are bound to it then.
+        '''
+        if self.lazyengine is None:
+            with self.enginelock:
+                if self.lazyengine is None:
+                    engine = create_engine(self.connectstring, **self.pooloptions)
+                    event.listen(engine, 'connect', self.onPoolConnect)
+                    event.listen(engine, 'checkout', self.onPoolCheckout)
+                    event.listen(engine, 'checkin', self.onPoolCheckin)
+                    self.Session.configure(bind=engine)
+                    self.metadata.bind = engine
+                    if self.viewmetadata is not None:
+                        self.viewmetadata.bind = engine
+                    self.lazyengine = engine
+        return self.lazyengine
+
+    @property
+    def session(self):
+        '''
+        The ORM session of the current thread
+        '''
+        self.engine
+        return self.Session()
+
+    @property
+    def connection(self):
+        '''
+        The connection of the current thread, checked out of the pool on first use
+        '''
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or connection.closed:
+            connection = self.connect()
+            self.local.connection = connection
+        return connection
+
+    def connect(self):
+        '''
+        Check a connection out of the engine pool.  If the pool is exhausted, the checkout
+        has to wait for a checkin, and it is counted as a wait with how long it took.
+        '''
+        if not self.poolExhausted():
+            return self.engine.connect()
+        start = time.time()
+        connection = self.engine.connect()
+        wait = time.time() - start
+        with self.poollock:
+            self.poolwait['count'] += 1
+            self.poolwait['total'] += wait
+            self.poolwait['max'] = max(self.poolwait['max'], wait)
+        return connection
+
+    def poolExhausted(self):
+        '''
+        True if the engine pool is a QueuePool with all the connections it may open checked out
+        '''
+        pool = self.engine.pool
+        if not isinstance(pool, QueuePool):
+            return False
+        maxoverflow = getattr(pool, '_max_overflow', -1)
+        return maxoverflow > -1 and pool.checkedout() >= pool.size() + maxoverflow
+
+    def onPoolConnect(self, dbapiconnection, record):
+        with self.poollock:
+            self.poolcounts['connects'] += 1
+
+    def onPoolCheckout(self, dbapiconnection, record, proxy):
+        with self.poollock:
+            self.poolcounts['checkouts'] += 1
+            checkedout = self.poolcounts['checkouts'] - self.poolcounts['checkins']
+            self.poolcounts['maxcheckedout'] = max(self.poolcounts['maxcheckedout'], checkedout)
+
+    def onPoolCheckin(self, dbapiconnection, record):
+        with self.poollock:
+            self.poolcounts['checkins'] += 1
+
+    def poolStats(self):
+        '''
+        Return a dict of connection pool metrics for sizing the pool: new database
+        connections, checkouts, currently and at most checked out connections, and the
+        count, total and maximum seconds of checkouts that waited for an exhausted pool.
+        '''
+        with self.poollock:
+            stats = dict(self.poolcounts)
+            stats['checkedout'] = stats['checkouts'] - stats['checkins']
+            stats['waits'] = self.poolwait['count']
+            stats['wait_total'] = self.poolwait['total']
+            stats['wait_max'] = self.poolwait['max']
+        stats['status'] = self.engine.pool.status()
+        return stats
+
+    @staticmethod
+    def openSnapshot(filename):
+        '''
+        Open a read-only snapshot written by goa.snapshot.exportSnapshot.  The returned
+        goa.snapshot.Snapshot has the same searchByIds method as the Store but needs no
+        database server.
+        '''
+        from goa.snapshot import Snapshot
+        return Snapshot(filename)
 
     def create(self):
         '''
         Actually creates the database tables.  Be careful
         '''
-        self.metadata.create_all(checkfirst=True)
+        if self.partition is not None and not self.partitionTables:
+            self.metadata.create_all(bind=self.engine, tables=[t for t in self.metadata.sorted_tables if t.name != 'goa'], checkfirst=True)
+            if not self.engine.has_table('goa'):
+                self.createPartitionedGoa()
+        else:
+            self.metadata.create_all(bind=self.engine, checkfirst=True)
+
+        if self.compact:
+            viewselect = self.goaViewSelect()
+        elif self.partitionTables:
+            viewselect = union_all(*[select(list(self.tables[name].c)) for name in self.goaTableNames])
+        else:
+            return
+        if 'goa' not in inspect(self.engine).get_view_names():
+            sql = str(viewselect.compile(dialect=self.engine.dialect, compile_kwargs={'literal_binds': True}))
+            self.connection.execute(text('create view goa as %s' % sql).execution_options(autocommit=True))
 
     def drop(self):
         '''
         Drop the database table
         '''
-        self.metadata.drop_all(checkfirst=True)
+        if self.compact or self.partitionTables:
+            self.connection.execute(text('drop view if exists goa').execution_options(autocommit=True))
+        self.metadata.drop_all(bind=self.engine, checkfirst=True)
+        self.encoders = {}
+        self.objectids = {}
+
+    def existingIndexes(self, tablename):
+        '''
+        Return a dict of column name tuple -> index name for the indexes that exist on the
+        table of self.tables[tablename] in the database.  Indexes are matched by columns
+        because release tables swapped in by swapRelease keep the index names they were
+        created with.
+        '''
+        indexes = inspect(self.engine).get_indexes(self.tables[tablename].name)
+        return dict([(tuple(index['column_names']), index['name']) for index in indexes])
+
+    def createIndexes(self, tablenames=None):
+        '''
+        Create the secondary indexes of the given tables, by default the goa and alias tables,
+        that do not exist yet, e.g. after a bulk load with the indexes dropped
+        '''
+        if tablenames is None:
+            tablenames = self.goaTableNames + ['alias']
+        for tablename in tablenames:
+            existing = self.existingIndexes(tablename)
+            for index in self.tables[tablename].indexes:
+                if tuple([column.name for column in index.columns]) not in existing:
+                    logger.info('Creating index %s' % index.name)
+                    index.create(bind=self.connection)
+
+    def dropIndexes(self, tablenames=None):
+        '''
+        Drop the secondary indexes of the given tables, by default the goa and alias tables,
+        e.g. before a bulk load.  Unique constraints are not dropped.
+        '''
+        if tablenames is None:
+            tablenames = self.goaTableNames + ['alias']
+        quote = self.engine.dialect.identifier_preparer.quote
+        for tablename in tablenames:
+            existing = self.existingIndexes(tablename)
+            for index in self.tables[tablename].indexes:
+                name = existing.get(tuple([column.name for column in index.columns]))
+                if name is None:
+                    continue
+                logger.info('Dropping index %s' % name)
+                if self.dialectname == 'mysql':
+                    sql = 'drop index %s on %s' % (quote(name), quote(self.tables[tablename].name))
+                else:
+                    sql = 'drop index %s' % quote(name)
+                self.connection.execute(text(sql).execution_options(autocommit=True))
 
     def commit(self):
         '''
@@ -110,20 +690,12 @@ class Store(object):
         '''
         self.session.commit()
 
-    def storeGoaRow(self, row):
+    @staticmethod
+    def goaRowValues(row):
         '''
-        Store a row from the goa file (GAF 2.1)
+        Convert a row from the goa file (GAF 2.1) into a dict of goa column values
         '''
-        logger.debug('Row is %s' % ' '.join(row))
-
-        # row[13] should be a date of the form YYYYMMDD
-        year = int(row[13][0:4])
-        month = int(row[13][4:6])
-        day = int(row[13][6:8])
-        date = datetime(year, month, day)
-
-        i = self.tables['goa'].insert()
-        i.execute(
+        return dict(
             db=row[0],
             db_object_id=row[1],
             db_object_symbol=row[2],
@@ -137,14 +709,629 @@ class Store(object):
             db_object_synonym=row[10],
             db_object_type=row[11],
             taxon=row[12],
-            date=date,
+            date=parseDate(row[13]),
             assigned_by=row[14],
         )
 
-    def searchByIdListFile(self, listfilename):
+    def storeGoaRow(self, row):
+        '''
+        Store a row from the goa file (GAF 2.1)
+        '''
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Row is %s' % ' '.join(row))
+
+        if self.compact:
+            self.connection.execute(self.tables['goa_annotation'].insert(), **self.encodeGoaValues([self.goaRowValues(row)])[0])
+        else:
+            for tablename, values in self.routeGoaValues([self.goaRowValues(row)]).items():
+                self.connection.execute(self.tables[tablename].insert(), **values[0])
+
+    def storeGoaRows(self, rows, checkpoint=None):
+        '''
+        Store a batch of rows from the goa file (GAF 2.1) using a single executemany
+        in one transaction.  If the batch fails, it is rolled back and the rows are
+        inserted one at a time so that the bad ones can be reported.
+
+        If checkpoint is a dict of load_checkpoint values, it is saved in the same
+        transaction as the batch (see saveCheckpoint) after adding the number of rows
+        saved to its saved_count.
+
+        Returns a tuple of (savedcount, errors) where errors is a list of error strings.
+        '''
+        errors = []
+        values = []
+        for row in rows:
+            try:
+                values.append(self.goaRowValues(row))
+            except Exception as e:
+                errors.append(str(e))
+                logger.debug('Error converting row: %s\n%s' % (str(e), '\t'.join(row)))
+
+        savedcount, inserterrors = self.storeGoaValues(values, checkpoint)
+        return (savedcount, errors + inserterrors)
+
+    def storeGoaValues(self, values, checkpoint=None):
+        '''
+        Store a batch of goa column value dicts (see goaRowValues) the same way as storeGoaRows.
+
+        Returns a tuple of (savedcount, errors) where errors is a list of error strings.
+        '''
+        if self.compact:
+            return self.executeValues(self.tables['goa_annotation'].insert(), self.encodeGoaValues(values), checkpoint)
+        return self.executeRoutedValues(lambda tablename: self.tables[tablename].insert(), values, checkpoint)
+
+    def executeRoutedValues(self, statement, values, checkpoint=None):
+        '''
+        executeValues for goa column value dicts split by routeGoaValues, with statement a
+        function of the table name.  The checkpoint is saved with the last table's batch,
+        with the rows saved in the other tables included.
+
+        Returns a tuple of (savedcount, errors) where errors is a list of error strings.
+        '''
+        routed = sorted(self.routeGoaValues(values).items())
+        savedcount = 0
+        errors = []
+        for i, (tablename, tablevalues) in enumerate(routed):
+            tablecheckpoint = None
+            if checkpoint is not None and i == len(routed) - 1:
+                tablecheckpoint = dict(checkpoint, saved_count=checkpoint['saved_count'] + savedcount)
+            saved, tableerrors = self.executeValues(statement(tablename), tablevalues, tablecheckpoint)
+            savedcount += saved
+            errors.extend(tableerrors)
+        return (savedcount, errors)
+
+    def encodeGoaValues(self, values, update=False):
+        '''
+        Convert goa column value dicts into goa_annotation column value dicts of the compact
+        schema.  Lookup values and db_objects that are not in the database yet are inserted
+        first.  Encodings are kept in self.encoders and self.objectids, so only new values
+        cost a round trip.  If update is True, the db_object columns of existing objects
+        are updated from values as well (see encodeObjects).
+        '''
+        for column in GOA_ENCODED_COLUMNS:
+            self.encodeLookupValues(column, set([value[column] for value in values]))
+
+        objects = {}
+        for value in values:
+            objects[(self.encoders['db'][value['db']], value['db_object_id'])] = value
+        self.encodeObjects(objects, update)
+
+        encoded = []
+        for value in values:
+            row = {
+                'object_id': self.objectids[(self.encoders['db'][value['db']], value['db_object_id'])],
+                'go_id': value['go_id'],
+                'db_reference': value['db_reference'],
+                'with_or_from': value['with_or_from'],
+                'date': value['date'],
+            }
+            for column in ['qualifier', 'evidence_code', 'aspect', 'taxon', 'assigned_by']:
+                row['%s_id' % column] = self.encoders[column].get(value[column])
+            encoded.append(row)
+        return encoded
+
+    def encodeLookupValues(self, column, values):
+        '''
+        Make sure self.encoders[column] has an id for every value, inserting missing values
+        into the goa_<column> lookup table.  The lookup tables are small, so they are read
+        completely the first time.
+        '''
+        table = self.tables['goa_%s' % column]
+        if column not in self.encoders:
+            self.encoders[column] = dict([(row[1], row[0]) for row in self.connection.execute(select([table.c.id, table.c.value]))])
+        encoder = self.encoders[column]
+
+        missing = [value for value in values if value is not None and value not in encoder]
+        if len(missing) == 0:
+            return
+        self.connection.execute(self.insertIgnoreStatement(table.name, ['value'], ['value']), [{'value': value} for value in missing])
+        for i in range(0, len(missing), IN_CHUNK_SIZE):
+            s = select([table.c.id, table.c.value]).where(table.c.value.in_(missing[i:i + IN_CHUNK_SIZE]))
+            for id, value in self.connection.execute(s):
+                encoder[value] = id
+
+    def encodeObjects(self, objects, update=False):
+        '''
+        Make sure self.objectids has a db_object id for every (db_id, db_object_id) key of the
+        objects dict, inserting the goa column values of missing ones into db_object.
+        Existing db_object rows are only updated, with an upsert of all objects, if update
+        is True.
+        '''
+        if update:
+            keys = list(objects)
+            statement = self.upsertStatement('db_object', DB_OBJECT_COLUMNS, DB_OBJECT_KEY_COLUMNS)
+        else:
+            keys = [key for key in objects if key not in self.objectids]
+            if len(keys) == 0:
+                return
+            self.lookupObjectIds(keys)
+            keys = [key for key in keys if key not in self.objectids]
+            statement = self.insertIgnoreStatement('db_object', DB_OBJECT_COLUMNS, DB_OBJECT_KEY_COLUMNS)
+        if len(keys) == 0:
+            return
+
+        self.encodeLookupValues('db_object_type', set([objects[key]['db_object_type'] for key in keys]))
+        values = []
+        for key in keys:
+            value = objects[key]
+            values.append({
+                'db_id': key[0],
+                'db_object_id': key[1],
+                'db_object_symbol': value['db_object_symbol'],
+                'db_object_name': value['db_object_name'],
+                'db_object_synonym': value['db_object_synonym'],
+                'db_object_type_id': self.encoders['db_object_type'].get(value['db_object_type']),
+            })
+        self.connection.execute(statement, values)
+        self.lookupObjectIds([key for key in keys if key not in self.objectids])
+
+    def lookupObjectIds(self, keys):
+        '''
+        Read the db_object ids of (db_id, db_object_id) keys into self.objectids
+        '''
+        o = self.tables['db_object']
+        bydb = {}
+        for db_id, db_object_id in keys:
+            bydb.setdefault(db_id, []).append(db_object_id)
+        for db_id, db_object_ids in bydb.items():
+            for i in range(0, len(db_object_ids), IN_CHUNK_SIZE):
+                s = select([o.c.id, o.c.db_object_id]).where(and_(o.c.db_id == db_id, o.c.db_object_id.in_(db_object_ids[i:i + IN_CHUNK_SIZE])))
+                for id, db_object_id in self.connection.execute(s):
+                    self.objectids[(db_id, db_object_id)] = id
+
+    def encodeObjectKeys(self, objects):
+        '''
+        Return a dict of (db, db_object_id) -> db_object id for the given pairs that exist
+        '''
+        self.encodeLookupValues('db', [])
+        keys = [(self.encoders['db'][db], db_object_id) for db, db_object_id in objects if db in self.encoders['db']]
+        self.lookupObjectIds([key for key in keys if key not in self.objectids])
+        dbs = dict([(id, db) for db, id in self.encoders['db'].items()])
+        return dict([((dbs[key[0]], key[1]), self.objectids[key]) for key in keys if key in self.objectids])
+
+    def upsertGoaValues(self, values):
+        '''
+        Insert a batch of goa column value dicts, updating the non-key columns of rows that
+        already exist with the same uix_1 key.  Uses on duplicate key update on MySQL and
+        on conflict do update elsewhere.  With the compact schema, the db_object columns
+        (symbol, name, synonym and type) of the proteins are updated too.
+
+        Returns a tuple of (savedcount, errors) where errors is a list of error strings.
+        '''
+        if self.compact:
+            statement = self.upsertStatement('goa_annotation', GOA_ANNOTATION_COLUMNS, GOA_ANNOTATION_KEY_COLUMNS)
+            return self.executeValues(statement, self.encodeGoaValues(values, update=True))
+        return self.executeRoutedValues(lambda tablename: self.upsertStatement(tablename, GOA_TSV_COLUMNS, self.goaKeyColumns), values)
+
+    def upsertAliasValues(self, values):
+        '''
+        Insert a batch of alias column value dicts, updating the authority and accession of
+        aliases that already exist with the same uix_1 (alias, source) key.
+
+        Returns a tuple of (savedcount, errors) where errors is a list of error strings.
+        '''
+        return self.executeValues(self.upsertStatement('alias', ALIAS_COLUMNS, ALIAS_KEY_COLUMNS), values)
+
+    def upsertStatement(self, tablename, columns, keycolumns):
+        '''
+        Return an insert statement for columns of tablename that updates the non-key columns
+        of an existing row with the same keycolumns.  Uses on duplicate key update on MySQL and
+        on conflict do update elsewhere.
+        '''
+        updates = [column for column in columns if column not in keycolumns]
+        sql = 'insert into %s (%s) values (%s)' % (
+            self.tables[tablename].name,
+            ', '.join(columns),
+            ', '.join([':%s' % column for column in columns]),
+        )
+        if self.dialectname == 'mysql':
+            sql += ' on duplicate key update %s' % ', '.join(['%s = values(%s)' % (c, c) for c in updates])
+        else:
+            sql += ' on conflict (%s) do update set %s' % (
+                ', '.join(keycolumns),
+                ', '.join(['%s = excluded.%s' % (c, c) for c in updates]),
+            )
+        return text(sql)
+
+    def insertIgnoreStatement(self, tablename, columns, keycolumns):
+        '''
+        Return an insert statement for columns of tablename that skips rows whose keycolumns
+        already exist.  Uses on duplicate key update of a key column to itself on MySQL (insert
+        ignore would hide other errors too) and on conflict do nothing elsewhere.
+        '''
+        sql = 'insert into %s (%s) values (%s)' % (
+            self.tables[tablename].name,
+            ', '.join(columns),
+            ', '.join([':%s' % column for column in columns]),
+        )
+        if self.dialectname == 'mysql':
+            sql += ' on duplicate key update %s = %s' % (keycolumns[0], keycolumns[0])
+        else:
+            sql += ' on conflict (%s) do nothing' % ', '.join(keycolumns)
+        return text(sql)
+
+    def executeValues(self, statement, values, checkpoint=None):
+        '''
+        Execute statement for a batch of column value dicts as a single executemany
+        in one transaction.  If the batch fails, it is rolled back and the values are
+        executed one at a time so that the bad ones can be reported.  A checkpoint dict
+        is saved, with the rows saved added to its saved_count, in the batch transaction
+        or after the row by row retry.
+
+        Returns a tuple of (savedcount, errors) where errors is a list of error strings.
+        '''
+        errors = []
+        if len(values) == 0:
+            if checkpoint is not None:
+                self.saveCheckpoint(checkpoint)
+            return (0, errors)
+
+        stats = self.stats
+        trans = self.connection.begin()
+        try:
+            start = time.time()
+            self.connection.execute(statement, values)
+            if checkpoint is not None:
+                self.saveCheckpoint(dict(checkpoint, saved_count=checkpoint['saved_count'] + len(values)))
+            if stats is not None:
+                stats.observe('insert_batch', time.time() - start)
+                start = time.time()
+            trans.commit()
+            if stats is not None:
+                stats.observe('commit', time.time() - start)
+                stats.count('rows_inserted', len(values))
+            return (len(values), errors)
+        except Exception as e:
+            trans.rollback()
+            logger.debug('Batch insert of %d rows failed, retrying row by row: %s' % (len(values), str(e)))
+
+        start = time.time()
+        savedcount = 0
+        for value in values:
+            try:
+                self.connection.execute(statement, **value)
+                savedcount += 1
+            except Exception as e:
+                errors.append(str(e))
+
+        if checkpoint is not None:
+            self.saveCheckpoint(dict(checkpoint, saved_count=checkpoint['saved_count'] + savedcount))
+
+        if stats is not None:
+            stats.observe('insert_retry', time.time() - start)
+            stats.count('batch_failures')
+            stats.count('rows_inserted', savedcount)
+            stats.count('insert_errors', len(errors))
+        return (savedcount, errors)
+
+    def createCheckpointTable(self):
+        '''
+        Create the load_checkpoint table if it does not exist, e.g. in a database created
+        before it was added
+        '''
+        self.tables['load_checkpoint'].create(bind=self.engine, checkfirst=True)
+
+    def getCheckpoint(self, filename):
+        '''
+        Return the load_checkpoint values for filename as a dict, or None
+        '''
+        cp = self.tables['load_checkpoint']
+        row = self.connection.execute(select([cp]).where(cp.c.filename == filename)).first()
+        if row is None:
+            return None
+        return dict(row.items())
+
+    def saveCheckpoint(self, checkpoint):
+        '''
+        Replace the load_checkpoint row of checkpoint['filename'] with the values in checkpoint.
+        Runs in the current transaction of self.connection, if there is one, and in its
+        own transaction otherwise, so the row is never missing between delete and insert.
+        '''
+        cp = self.tables['load_checkpoint']
+        values = dict(checkpoint)
+        values['updated'] = datetime.now()
+        trans = self.connection.begin()
+        try:
+            self.connection.execute(cp.delete().where(cp.c.filename == values['filename']))
+            self.connection.execute(cp.insert(), **values)
+            trans.commit()
+        except Exception:
+            trans.rollback()
+            raise
+
+    def deleteCheckpoint(self, filename):
+        '''
+        Remove the load_checkpoint row of filename once its load has finished
+        '''
+        cp = self.tables['load_checkpoint']
+        self.connection.execute(cp.delete().where(cp.c.filename == filename))
+
+    def fetchGoaRows(self, db, db_object_ids):
+        '''
+        Return the existing goa rows for the given db and db_object_ids as a dict of
+        uix_1 key tuple -> dict of GOA_TSV_COLUMNS values
+        '''
+        goa = self.tables['goa']
+        columns = [goa.c[column] for column in GOA_TSV_COLUMNS]
+        db_object_ids = list(db_object_ids)
+        rows = {}
+        for i in range(0, len(db_object_ids), IN_CHUNK_SIZE):
+            s = select(columns).where(and_(goa.c.db == db, goa.c.db_object_id.in_(db_object_ids[i:i + IN_CHUNK_SIZE])))
+            for row in self.connection.execute(s):
+                values = dict(zip(GOA_TSV_COLUMNS, row))
+                rows[tuple([values[column] for column in GOA_KEY_COLUMNS])] = values
+        return rows
+
+    def iterGoaObjects(self):
+        '''
+        Generate the distinct (db, db_object_id) pairs in the goa table
+        '''
+        goa = self.tables['goa']
+        s = select([goa.c.db, goa.c.db_object_id]).distinct()
+        for row in self.connection.execute(s):
+            yield (row[0], row[1])
+
+    def deleteGoaKeys(self, keys):
+        '''
+        Delete goa rows by uix_1 key tuple.  Returns the number of rows deleted.
+        '''
+        if len(keys) == 0:
+            return 0
+        if self.compact:
+            a = self.tables['goa_annotation']
+            objectids = self.encodeObjectKeys(set([key[0:2] for key in keys]))
+            keys = [(objectids[key[0:2]],) + tuple(key[2:]) for key in keys if key[0:2] in objectids]
+            deletes = [a.delete().where(and_(*[a.c[column] == bindparam('k_%s' % column) for column in GOA_ANNOTATION_KEY_COLUMNS]))]
+            params = [dict(zip(['k_%s' % c for c in GOA_ANNOTATION_KEY_COLUMNS], key)) for key in keys]
+        else:
+            # Every goa table, since the keys do not say which partition a row is in
+            deletes = [
+                table.delete().where(and_(*[table.c[column] == bindparam('k_%s' % column) for column in GOA_KEY_COLUMNS]))
+                for table in [self.tables[name] for name in self.goaTableNames]
+            ]
+            params = [dict(zip(['k_%s' % c for c in GOA_KEY_COLUMNS], key)) for key in keys]
+        trans = self.connection.begin()
+        try:
+            for statement in deletes:
+                self.connection.execute(statement, params)
+            trans.commit()
+        except Exception:
+            trans.rollback()
+            raise
+        return len(keys)
+
+    def deleteGoaObjects(self, objects):
+        '''
+        Delete all goa rows of the given (db, db_object_id) pairs.  Returns the number of rows deleted.
+        '''
+        if len(objects) == 0:
+            return 0
+        if self.compact:
+            a = self.tables['goa_annotation']
+            deletes = [a.delete().where(a.c.object_id == bindparam('k_object_id'))]
+            params = [{'k_object_id': id} for id in self.encodeObjectKeys(objects).values()]
+            if len(params) == 0:
+                return 0
+        else:
+            deletes = [
+                table.delete().where(and_(table.c.db == bindparam('k_db'), table.c.db_object_id == bindparam('k_db_object_id')))
+                for table in [self.tables[name] for name in self.goaTableNames]
+            ]
+            params = [{'k_db': db, 'k_db_object_id': db_object_id} for db, db_object_id in objects]
+        trans = self.connection.begin()
+        try:
+            rowcount = 0
+            for statement in deletes:
+                rowcount += self.connection.execute(statement, params).rowcount
+            trans.commit()
+        except Exception:
+            trans.rollback()
+            raise
+        return rowcount
+
+    def getGoaUniqueConstraint(self):
+        '''
+        Return the uix_1 UniqueConstraint of the goa table
+        '''
+        for constraint in self.tables['goa'].constraints:
+            if isinstance(constraint, UniqueConstraint) and constraint.name == 'uix_1':
+                return constraint
+
+    def dropGoaConstraints(self):
+        '''
+        Drop the goa uix_1 unique constraint so that a bulk load does not maintain it row by row.
+        SQLite cannot drop constraints, so this does nothing there or with partition tables.
+        '''
+        if self.dialectname == 'sqlite' or self.partitionTables:
+            return
+        self.connection.execute(DropConstraint(self.getGoaUniqueConstraint()))
+
+    def createGoaConstraints(self):
+        '''
+        Rebuild the goa uix_1 unique constraint after a bulk load
+        '''
+        if self.dialectname == 'sqlite' or self.partitionTables:
+            return
+        self.connection.execute(AddConstraint(self.getGoaUniqueConstraint()))
+
+    def loadGoaTsv(self, tsvfilename, chunksize=10000):
+        '''
+        Load a normalized goa TSV file (columns in GOA_TSV_COLUMNS order, date as YYYY-MM-DD,
+        backslashes escaped) with the native bulk loader of the database: load data local infile
+        on MySQL, copy on PostgreSQL and executemany in a single transaction elsewhere.
+        The uix_1 constraint and the secondary goa indexes are dropped during the load and
+        rebuilt afterwards, so duplicate rows will cause the rebuild to fail.  If the load
+        fails, they are rebuilt too and the load error is raised, not a rebuild error.
+
+        With the compact schema the rows have to be encoded and with partition tables they
+        have to be routed, so they are always loaded with executemany.
+
+        Returns the number of rows loaded.
+        '''
+        if self.compact or self.partitionTables:
+            return self.loadGoaTsvExecutemany(tsvfilename, chunksize)
+
+        dialect = self.dialectname
+        self.dropIndexes(self.goaTableNames)
+        self.dropGoaConstraints()
+        try:
+            if dialect == 'mysql':
+                sql = "load data local infile '%s' into table %s fields terminated by '\\t' (%s)" % (
+                    tsvfilename.replace("'", "\\'"),
+                    self.tables['goa'].name,
+                    ', '.join(GOA_TSV_COLUMNS),
+                )
+                trans = self.connection.begin()
+                try:
+                    rowcount = self.connection.execute(sql).rowcount
+                    trans.commit()
+                except Exception:
+                    trans.rollback()
+                    raise
+            elif dialect == 'postgresql':
+                sql = 'copy %s (%s) from stdin' % (self.tables['goa'].name, ', '.join(GOA_TSV_COLUMNS))
+                raw = self.engine.raw_connection()
+                try:
+                    cursor = raw.cursor()
+                    with open(tsvfilename, 'r') as f:
+                        cursor.copy_expert(sql, f)
+                    rowcount = cursor.rowcount
+                    raw.commit()
+                finally:
+                    raw.close()
+            else:
+                rowcount = self.loadGoaTsvExecutemany(tsvfilename, chunksize)
+        except Exception as e:
+            error = sys.exc_info()
+            logger.error('Bulk load of %s failed: %s' % (tsvfilename, str(e)))
+            try:
+                self.createGoaConstraints()
+                self.createIndexes(self.goaTableNames)
+            except Exception as rebuilderror:
+                logger.error('Could not rebuild the goa constraints and indexes: %s' % str(rebuilderror))
+            raise error[0], error[1], error[2]
+
+        self.createGoaConstraints()
+        self.createIndexes(self.goaTableNames)
+        return rowcount
+
+    def loadGoaTsvExecutemany(self, tsvfilename, chunksize=10000, tablename=None, truncate=None):
+        '''
+        Load a normalized goa TSV file with chunked executemany calls inside a single transaction.
+        Rows go to tablename if it is given, e.g. one goa partition table, and to the goa
+        tables otherwise.  If truncate is a taxon partition name, that partition is truncated
+        in the same transaction first, so a failed load leaves it as it was.
+        '''
+        rowcount = 0
+        values = []
+        trans = self.connection.begin()
+        try:
+            if truncate is not None:
+                self.truncateGoaPartition(truncate)
+            with open(tsvfilename, 'r') as f:
+                for line in f:
+                    fields = [field.replace('\\\\', '\\') for field in line.rstrip('\n').split('\t')]
+                    value = dict(zip(GOA_TSV_COLUMNS, fields))
+                    value['date'] = date(int(value['date'][0:4]), int(value['date'][5:7]), int(value['date'][8:10]))
+                    values.append(value)
+                    if len(values) >= chunksize:
+                        self.insertGoaValues(values, tablename)
+                        rowcount += len(values)
+                        values = []
+            if len(values) > 0:
+                self.insertGoaValues(values, tablename)
+                rowcount += len(values)
+            trans.commit()
+        except Exception:
+            trans.rollback()
+            # Encodings of values inserted in the transaction are gone
+            self.encoders = {}
+            self.objectids = {}
+            raise
+
+        return rowcount
+
+    def insertGoaValues(self, values, tablename=None):
+        '''
+        Insert goa column value dicts with one executemany per table in the current
+        transaction, into tablename or else the goa tables of the schema
+        '''
+        if tablename is not None:
+            self.connection.execute(self.tables[tablename].insert(), values)
+        elif self.compact:
+            self.connection.execute(self.tables['goa_annotation'].insert(), self.encodeGoaValues(values))
+        else:
+            for name, tablevalues in self.routeGoaValues(values).items():
+                self.connection.execute(self.tables[name].insert(), tablevalues)
+
+    def goaPartitionTableName(self, name):
+        '''
+        Return the name of the table rows of partition name are inserted into: the
+        goa_<partition> table if partitions are emulated, goa otherwise
+        '''
+        if self.partitionTables:
+            return 'goa_%s' % name
+        return 'goa'
+
+    def iterAnnotations(self, taxon=None, aspect=None, evidence_code=None, assigned_by=None, batchsize=10000):
+        '''
+        Generate goa rows as tuples of GOA_TSV_COLUMNS values, optionally filtered by taxon,
+        aspect, evidence_code and assigned_by.  Each filter is a value or a list of values.
+        Taxa may be given with or without the taxon: prefix.
+
+        Rows are read with a server side cursor (stream_results) batchsize rows at a time,
+        so memory use does not depend on the size of the table.
+        '''
+        if taxon is not None:
+            if not isinstance(taxon, (list, tuple)):
+                taxon = [taxon]
+            taxon = [t if str(t).startswith('taxon:') else 'taxon:%s' % t for t in taxon]
+
+        # Only read the partition tables of the taxa.  Native partitioning prunes by itself.
+        tables = [self.tables['goa']]
+        if self.partitionTables and self.partition == 'taxon' and taxon is not None:
+            names = sorted(set([self.goaPartitionName(t) for t in taxon]))
+            if 'pother' not in names:
+                tables = [self.tables['goa_%s' % name] for name in names]
+
+        with self.connect() as connection:
+            for goa in tables:
+                s = select([goa.c[column] for column in GOA_TSV_COLUMNS])
+                for column, values in (('taxon', taxon), ('aspect', aspect), ('evidence_code', evidence_code), ('assigned_by', assigned_by)):
+                    if values is None:
+                        continue
+                    if not isinstance(values, (list, tuple)):
+                        values = [values]
+                    s = s.where(goa.c[column].in_(values))
+
+                result = connection.execution_options(stream_results=True).execute(s)
+                while True:
+                    rows = result.fetchmany(batchsize)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield tuple(row)
+
+    def searchByIdListFile(self, listfilename, propagate=False):
         '''
         Searches by ID list provided by a file.   Very MySQL specific
+
+        If propagate is True, the go_terms include all ancestors of the annotated terms
+        from go_term_ancestor.
+
+        If the Store has an alias filter, the (source, id) lines that are definitely not
+        aliases are dropped before the file is loaded.
         '''
+        bloom = self.getAliasFilter()
+        filteredfile = None
+        if bloom is not None:
+            filteredfile = tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False)
+            with open(listfilename, 'r') as f:
+                for line in f:
+                    fields = line.rstrip('\r\n').split('\t')
+                    if len(fields) == 2 and aliasKey(fields[1], fields[0], self.foldaliases) in bloom:
+                        filteredfile.write(line)
+            filteredfile.close()
 
         # Create an in-memory temp table using a hash of the filename
         import hashlib
@@ -156,11 +1343,19 @@ class Store(object):
         self.session.commit()
 
         # Load from the local data file
-        sql = "load data local infile '%s' into table %s" % (listfilename, tablename)
-        self.session.execute(sql)
-        self.session.commit()
+        sql = "load data local infile '%s' into table %s" % (filteredfile.name if filteredfile else listfilename, tablename)
+        try:
+            self.session.execute(sql)
+            self.session.commit()
+        finally:
+            if filteredfile is not None:
+                os.remove(filteredfile.name)
 
         results = []
+        if propagate:
+            termjoin = 'inner join go_term_ancestor ga on g.go_id = ga.go_id inner join go_term gt on ga.ancestor_id = gt.go_id'
+        else:
+            termjoin = 'inner join go_term gt on g.go_id = gt.go_id'
 
         try:
             # Join against the GOA table
@@ -171,9 +1366,9 @@ class Store(object):
                     {tmptable} t
                         inner join alias a on (t.id = a.alias and t.source = a.source)
                         inner join goa g on (g.db = a.authority and g.db_object_id = a.accession)
-                        inner join go_term gt on g.go_id = gt.go_id
+                        {termjoin}
                 group by t.id, goa_symbol
-            """.format(tmptable=tablename).translate(None, "\n")
+            """.format(tmptable=tablename, termjoin=termjoin).translate(None, "\n")
 
             print "SQL is:\n%s\n" % sql
             self.session.execute('SET SESSION group_concat_max_len = 10000000')
@@ -184,35 +1379,509 @@ class Store(object):
 
         return results
 
-    def initBioSqlAliases(self, biodatabase_id=1):
+    def replaceOntology(self, terms, edges, ancestors, batchsize=10000):
+        '''
+        Replace the contents of go_term, go_term_edge and go_term_ancestor in one transaction.
+        terms is a list of (go_id, term), edges of (go_id, parent_id, relationship) and
+        ancestors of (go_id, ancestor_id) tuples.  Missing ontology tables are created.
+        '''
+        tablerows = [('go_term', ('go_id', 'term'), terms), ('go_term_edge', ('go_id', 'parent_id', 'relationship'), edges), ('go_term_ancestor', ('go_id', 'ancestor_id'), ancestors)]
+        for tablename, columns, rows in tablerows:
+            self.tables[tablename].create(bind=self.connection, checkfirst=True)
+
+        trans = self.connection.begin()
+        try:
+            for tablename, columns, rows in tablerows:
+                table = self.tables[tablename]
+                self.connection.execute(table.delete())
+                for i in range(0, len(rows), batchsize):
+                    self.connection.execute(table.insert(), [dict(zip(columns, row)) for row in rows[i:i + batchsize]])
+                logger.info('Saved %d %s rows' % (len(rows), tablename))
+            trans.commit()
+        except Exception:
+            trans.rollback()
+            raise
+
+    def getAncestors(self, go_ids=None):
+        '''
+        Return a dict of go_id -> set of ancestor go_ids, including the go_id itself, from
+        go_term_ancestor for the given go_ids, or for every term if go_ids is None
+        '''
+        ga = self.tables['go_term_ancestor']
+        ancestors = {}
+        with self.connect() as connection:
+            if go_ids is None:
+                chunks = [None]
+            else:
+                go_ids = list(go_ids)
+                chunks = [go_ids[i:i + IN_CHUNK_SIZE] for i in range(0, len(go_ids), IN_CHUNK_SIZE)]
+            for chunk in chunks:
+                s = select([ga.c.go_id, ga.c.ancestor_id])
+                if chunk is not None:
+                    s = s.where(ga.c.go_id.in_(chunk))
+                for go_id, ancestor_id in connection.execute(s):
+                    ancestors.setdefault(go_id, set()).add(ancestor_id)
+        return ancestors
+
+    def getDataGeneration(self):
+        '''
+        Return the data generation counter, which is bumped whenever a load changes the
+        goa or alias tables.  Returns 0 if it has never been bumped or the table is missing.
+        '''
+        dg = self.tables['data_generation']
+        try:
+            with self.connect() as connection:
+                row = connection.execute(select([dg.c.generation]).where(dg.c.id == 1)).first()
+        except Exception:
+            return 0
+        if row is None:
+            return 0
+        return row[0]
+
+    def bumpDataGeneration(self, aliases=True):
+        '''
+        Increment the data generation counter so that lookup caches, in this and other
+        processes, are invalidated.  Returns the new generation.
+
+        aliases is False for loads that do not change the alias table.  The alias filter of
+        the previous generation, if there is one, then stays valid for the new generation.
+        '''
+        dg = self.tables['data_generation']
+        dg.create(bind=self.connection, checkfirst=True)
+        previous = self.getDataGeneration() if self.aliasfilterdir is not None and not aliases else None
+        trans = self.connection.begin()
+        try:
+            result = self.connection.execute(dg.update().where(dg.c.id == 1).values(generation=dg.c.generation + 1))
+            if result.rowcount == 0:
+                self.connection.execute(dg.insert(), id=1, generation=1)
+            trans.commit()
+        except Exception:
+            trans.rollback()
+            raise
+
+        generation = self.getDataGeneration()
+        if self.cache is not None:
+            self.cache.clear(generation)
+        if previous is not None and os.path.exists(self.aliasFilterFilename(previous)):
+            os.rename(self.aliasFilterFilename(previous), self.aliasFilterFilename(generation))
+        return generation
+
+    @property
+    def databaseKey(self):
+        '''
+        Hex crc32 of the connect string without the password, which tells databases apart
+        in the names of files cached per data generation
+        '''
+        url = make_url(self.connectstring)
+        url.password = None
+        return '%08x' % (zlib.crc32(str(url)) & 0xffffffff)
+
+    def aliasFilterFilename(self, generation):
+        '''
+        File of the alias filter of this database at data generation generation
+        '''
+        return os.path.join(self.aliasfilterdir, 'alias_filter_%s_%d.bloom' % (self.databaseKey, generation))
+
+    def buildAliasFilter(self, errorrate=DEFAULT_ERROR_RATE, batchsize=10000):
+        '''
+        Build the Bloom filter over the (alias, source) pairs and aliases of the alias table
+        and save it in aliasfilterdir for the current data generation.  Older filter files
+        of the database are removed.  Returns the number of aliases.
+        '''
+        if self.aliasfilterdir is None:
+            raise Exception('The Store has no alias filter directory')
+        alias = self.tables['alias']
+        generation = self.getDataGeneration()
+        with self.connect() as connection:
+            aliascount = connection.execute(select([func.count()]).select_from(alias)).scalar()
+            bloom = BloomFilter.forCapacity(2 * aliascount, errorrate)
+            result = connection.execution_options(stream_results=True).execute(select([alias.c.alias, alias.c.source]))
+            while True:
+                rows = result.fetchmany(batchsize)
+                if not rows:
+                    break
+                for row in rows:
+                    bloom.add(aliasKey(row[0], row[1], self.foldaliases))
+                    bloom.add(aliasKey(row[0], fold=self.foldaliases))
+
+        if not os.path.exists(self.aliasfilterdir):
+            os.makedirs(self.aliasfilterdir)
+        filename = self.aliasFilterFilename(generation)
+        prefix = os.path.basename(filename).rsplit('_', 1)[0] + '_'
+        for name in os.listdir(self.aliasfilterdir):
+            if name.startswith(prefix) and name.endswith('.bloom'):
+                os.remove(os.path.join(self.aliasfilterdir, name))
+        bloom.save(filename)
+        self.aliasfilter = bloom
+        self.aliasfiltergeneration = generation
+        logger.info('Built alias filter of %d aliases, %d bits, for data generation %d' % (aliascount, bloom.bitcount, generation))
+        return aliascount
+
+    def aliasesChanged(self):
+        '''
+        Rebuild the alias filter after a change to the alias table, if the Store has one
+        '''
+        if self.aliasfilterdir is not None:
+            self.buildAliasFilter()
+
+    def getAliasFilter(self, generation=None):
+        '''
+        Return the alias filter for the current data generation, loading it from
+        aliasfilterdir if needed, or None if there is none
+        '''
+        if self.aliasfilterdir is None:
+            return None
+        if generation is None:
+            generation = self.getDataGeneration()
+        if generation != self.aliasfiltergeneration:
+            filename = self.aliasFilterFilename(generation)
+            self.aliasfilter = BloomFilter.load(filename) if os.path.exists(filename) else None
+            self.aliasfiltergeneration = generation
+        return self.aliasfilter
+
+    def filterIds(self, ids, source, bloom):
+        '''
+        Generate the ids that may be aliases of source according to the alias filter bloom
+        '''
+        dropped = 0
+        for id in ids:
+            if aliasKey(id, source, self.foldaliases) in bloom:
+                yield id
+            else:
+                dropped += 1
+        if self.stats is not None:
+            self.stats.count('search_ids_filtered', dropped)
+
+    def searchByIds(self, ids, source=None, chunksize=IN_CHUNK_SIZE, propagate=False):
+        '''
+        Search for the GO annotations of an iterable of alias ids, optionally limited to one
+        alias source.  Works on any database and runs the alias / goa / go_term join for
+        chunks of chunksize ids at a time on its own connection, so memory use is bounded
+        and searches can run concurrently.
+
+        Returns a generator of (id, goa_symbol, go_terms) tuples like searchByIdListFile, with
+        the go_terms separated by ';'.  Ids repeated in different chunks are reported again.
+
+        If propagate is True, the go_terms include all ancestors of the annotated terms,
+        read from the precomputed go_term_ancestor closure.
+
+        If the Store has a cache, only ids that are not cached are searched.  The cache is
+        cleared first if the data generation has changed since it was filled.
+
+        If the Store has an alias filter for the current data generation, ids that are
+        definitely not aliases of source are dropped first.
+        '''
+        generation = None
+        if self.aliasfilterdir is not None:
+            generation = self.getDataGeneration()
+            bloom = self.getAliasFilter(generation)
+            if bloom is not None:
+                ids = self.filterIds(ids, source, bloom)
+
+        if self.cache is None:
+            return self.iterSearchByIds(ids, source, chunksize, propagate)
+
+        if generation is None:
+            generation = self.getDataGeneration()
+        if generation != self.cache.generation:
+            self.cache.clear(generation)
+        return self.iterCachedSearchByIds(ids, source, chunksize, propagate)
+
+    def iterCachedSearchByIds(self, ids, source=None, chunksize=IN_CHUNK_SIZE, propagate=False):
+        '''
+        Generator for searchByIds that answers from self.cache and searches the misses
+        '''
+        chunk = []
+        with self.connect() as connection:
+            for id in ids:
+                results = self.cache.get((source, id, propagate))
+                if results is not None:
+                    for symbol, terms in results:
+                        yield (id, symbol, terms)
+                    continue
+
+                chunk.append(id)
+                if len(chunk) >= chunksize:
+                    for result in self.searchCacheMisses(connection, chunk, source, propagate):
+                        yield result
+                    chunk = []
+            if len(chunk) > 0:
+                for result in self.searchCacheMisses(connection, chunk, source, propagate):
+                    yield result
+
+    def aliasMatchKey(self, id):
+        '''
+        The form of id under which the alias column matches it: with foldaliases, ids
+        that differ only in case or trailing spaces match the same stored alias
+        '''
+        return id.upper().rstrip() if self.foldaliases else id
+
+    def searchCacheMisses(self, connection, ids, source=None, propagate=False):
+        '''
+        Search a chunk of ids that missed the cache and cache their results, including
+        empty results for ids without annotations.  Results carry the stored alias, so
+        they are matched to the searched ids by aliasMatchKey.
+        '''
+        found = {}
+        results = self.searchIdChunk(connection, ids, source, propagate)
+        for id, symbol, terms in results:
+            found.setdefault(self.aliasMatchKey(id), []).append((symbol, terms))
+        for id in ids:
+            self.cache.put((source, id, propagate), found.get(self.aliasMatchKey(id), []))
+        return results
+
+    def iterSearchByIds(self, ids, source=None, chunksize=IN_CHUNK_SIZE, propagate=False):
+        '''
+        Generator for searchByIds without a cache
+        '''
+        chunk = []
+        with self.connect() as connection:
+            for id in ids:
+                chunk.append(id)
+                if len(chunk) >= chunksize:
+                    for result in self.searchIdChunk(connection, chunk, source, propagate):
+                        yield result
+                    chunk = []
+            if len(chunk) > 0:
+                for result in self.searchIdChunk(connection, chunk, source, propagate):
+                    yield result
+
+    def searchIdChunk(self, connection, ids, source=None, propagate=False):
+        '''
+        Run the searchByIds join for one chunk of ids and return a list of
+        (id, goa_symbol, go_terms) tuples
+        '''
+        alias = self.tables['alias']
+        goa = self.tables['goa']
+        go_term = self.tables['go_term']
+
+        j = alias.join(goa, and_(goa.c.db == alias.c.authority, goa.c.db_object_id == alias.c.accession))
+        if propagate:
+            ga = self.tables['go_term_ancestor']
+            j = j.join(ga, goa.c.go_id == ga.c.go_id).join(go_term, ga.c.ancestor_id == go_term.c.go_id)
+        else:
+            j = j.join(go_term, goa.c.go_id == go_term.c.go_id)
+        s = select([alias.c.alias, goa.c.db_object_symbol, go_term.c.term]).select_from(j)
+        s = s.where(alias.c.alias.in_(set(ids)))
+        if source is not None:
+            s = s.where(alias.c.source == source)
+        s = s.distinct().order_by(alias.c.alias, goa.c.db_object_symbol, go_term.c.term)
+
+        start = time.time()
+        results = []
+        for (id, symbol), rows in groupby(connection.execute(s), lambda row: (row[0], row[1])):
+            results.append((id, symbol, ';'.join([row[2] for row in rows])))
+        if self.stats is not None:
+            self.stats.observe('search_chunk', time.time() - start)
+            self.stats.count('search_ids', len(ids))
+            self.stats.count('search_results', len(results))
+        return results
+
+    def initBioSqlAliases(self, biodatabase_id=1, rules=BIOSQL_ALIAS_RULES, batchsize=10000):
         """
         Initialize the alias table using the BioSql table (I know.  It is supposed to be there.)
+
+        rules is a list of (source, prefix) tuples.  Each bioentry accession gets an alias of
+        prefix + accession for every rule, all generated in a single pass over bioentry.
+        bioentry is read in bioentry_id order batchsize rows at a time and each batch of
+        aliases is committed separately.  Aliases that already exist are skipped, so an
+        interrupted run can simply be repeated.
+
+        Returns the number of bioentries processed.
         """
-        sql = """
-            insert into alias (authority, accession, alias, source)
-            select 'UniProtKB', be.accession, be.accession, 'UniProtKB'
+        sql = text("""
+            select be.bioentry_id, be.accession
             from bioentry be
-            where be.biodatabase_id = :dbid
-        """.translate(None, "\n")
-        self.session.execute(sql, {"dbid": biodatabase_id})
-        self.session.commit()
+            where be.biodatabase_id = :dbid and be.bioentry_id > :lastid
+            order by be.bioentry_id
+            limit :batchsize
+        """)
+        insert = self.insertIgnoreStatement('alias', ALIAS_COLUMNS, ALIAS_KEY_COLUMNS)
 
-        sql = """
-            insert into alias (authority, accession, alias, source)
-            select 'UniProtKB', be.accession, concat('UniRef90_',be.accession), 'UniRef90'
-            from bioentry be
-            where be.biodatabase_id = :dbid
-        """.translate(None, "\n")
-        self.session.execute(sql, {"dbid": biodatabase_id})
-        self.session.commit()
+        lastid = 0
+        entrycount = 0
+        while True:
+            rows = self.connection.execute(sql, dbid=biodatabase_id, lastid=lastid, batchsize=batchsize).fetchall()
+            if len(rows) == 0:
+                break
 
-        sql = """
-            insert into alias (authority, accession, alias, source)
-            select 'UniProtKB', be.accession, concat('UniRef100_',be.accession), 'UniRef100'
-            from bioentry be
-            where be.biodatabase_id = :dbid
-        """.translate(None, "\n")
-        self.session.execute(sql, {"dbid": biodatabase_id})
-        self.session.commit()
+            values = []
+            for bioentry_id, accession in rows:
+                for source, prefix in rules:
+                    values.append({'authority': 'UniProtKB', 'accession': accession, 'alias': prefix + accession, 'source': source})
+            savedcount, errors = self.executeValues(insert, values)
+            if len(errors) > 0:
+                raise Exception('Error creating aliases after bioentry_id %d: %s' % (lastid, errors[0]))
+
+            lastid = rows[-1][0]
+            entrycount += len(rows)
+            logger.info('Created aliases for %d bioentries, up to bioentry_id %d' % (entrycount, lastid))
+
+        self.bumpDataGeneration()
+        self.aliasesChanged()
+        return entrycount
+
+    def releaseTables(self, release):
+        '''
+        Return a dict of tablename -> Table for the RELEASE_TABLES of release, named
+        <tablename>__<release>.  Index and constraint names get the same suffix except on
+        MySQL, where they only have to be unique per table.
+        '''
+        if re.match(r'^[A-Za-z0-9_]+$', release or '') is None:
+            raise Exception('Invalid release name %s.  Use letters, digits and _' % release)
+        if self.compact or self.partition is not None:
+            raise Exception('Releases are not supported with the compact schema or partitioning')
+
+        metadata = MetaData(bind=self.engine)
+        tables = {}
+        for tablename in RELEASE_TABLES:
+            table = self.livetables[tablename].tometadata(metadata, name='%s__%s' % (tablename, release))
+            if self.dialectname != 'mysql':
+                for item in list(table.indexes) + [c for c in table.constraints if isinstance(c, UniqueConstraint)]:
+                    item.name = '%s__%s' % (item.name, release)
+            tables[tablename] = table
+        return tables
 
+    def useRelease(self, release):
+        '''
+        Point the goa and alias tables of the Store at the tables of release, or back at the
+        live tables if release is None.  Loads then write to the release without touching
+        the live tables.
+        '''
+        if release is None:
+            self.tables.update(self.livetables)
+        else:
+            self.tables.update(self.releaseTables(release))
 
+    def createRelease(self, release):
+        '''
+        Create the empty shadow tables of a new release and record it as loading
+        '''
+        gr = self.tables['goa_release']
+        gr.create(bind=self.connection, checkfirst=True)
+        tables = self.releaseTables(release)
+        if self.connection.execute(select([gr.c.release]).where(gr.c.release == release)).first() is not None:
+            raise Exception('Release %s already exists' % release)
+        for table in tables.values():
+            if self.engine.has_table(table.name):
+                raise Exception('Table %s already exists' % table.name)
+            table.create(bind=self.connection)
+        self.connection.execute(gr.insert(), release=release, status='loading', created=datetime.now())
+
+    def copyLiveTable(self, tablename, release):
+        '''
+        Copy the rows of a live table into the table of release with insert ... select,
+        e.g. to carry the aliases over into a release that only reloads goa
+        '''
+        live = self.livetables[tablename]
+        target = self.releaseTables(release)[tablename]
+        columns = [column.name for column in live.columns if column.name != 'id']
+        sql = 'insert into %s (%s) select %s from %s' % (target.name, ', '.join(columns), ', '.join(columns), live.name)
+        trans = self.connection.begin()
+        try:
+            rowcount = self.connection.execute(text(sql)).rowcount
+            trans.commit()
+        except Exception:
+            trans.rollback()
+            raise
+        return rowcount
+
+    def getReleases(self):
+        '''
+        Return the recorded releases as a list of dicts, most recently created first
+        '''
+        gr = self.tables['goa_release']
+        if not self.engine.has_table(gr.name):
+            return []
+        s = select([gr]).order_by(gr.c.created.desc())
+        return [dict(row.items()) for row in self.connection.execute(s)]
+
+    def swapRelease(self, release, keep=2):
+        '''
+        Make release the live goa and alias tables.  The live tables are renamed to the
+        tables of their own release (pre_<release> if they were never loaded as one) and
+        the release tables to goa and alias, in a single rename table on MySQL and in one
+        transaction on PostgreSQL, so readers never see missing or half loaded tables.
+        Other databases rename table by table.
+
+        Only the keep most recent previous releases are kept for rollbackRelease; older
+        ones are dropped.  keep=None keeps all of them.
+        '''
+        releases = dict([(r['release'], r) for r in self.getReleases()])
+        if release not in releases:
+            raise Exception('Unknown release %s' % release)
+        if releases[release]['status'] == 'live':
+            raise Exception('Release %s is already live' % release)
+        live = [r['release'] for r in releases.values() if r['status'] == 'live']
+        liverelease = live[0] if live else 'pre_%s' % release
+
+        renames = []
+        indexrenames = []
+        oldtables = self.releaseTables(liverelease)
+        newtables = self.releaseTables(release)
+        for tablename in RELEASE_TABLES:
+            renames.append((tablename, oldtables[tablename].name))
+            renames.append((newtables[tablename].name, tablename))
+            if self.dialectname == 'postgresql':
+                for index in self.livetables[tablename].indexes:
+                    indexrenames.append('alter index %s rename to %s__%s' % (index.name, index.name, liverelease))
+                    indexrenames.append('alter index %s__%s rename to %s' % (index.name, release, index.name))
+                for constraint in self.livetables[tablename].constraints:
+                    if isinstance(constraint, UniqueConstraint):
+                        indexrenames.append('alter table %s rename constraint %s to %s__%s' % (oldtables[tablename].name, constraint.name, constraint.name, liverelease))
+                        indexrenames.append('alter table %s rename constraint %s__%s to %s' % (tablename, constraint.name, release, constraint.name))
+
+        if self.dialectname == 'mysql':
+            statements = ['rename table %s' % ', '.join(['%s to %s' % rename for rename in renames])]
+        else:
+            # Each live table is renamed out of the way before the release table takes its name
+            statements = ['alter table %s rename to %s' % rename for rename in renames] + indexrenames
+
+        gr = self.tables['goa_release']
+        trans = self.connection.begin()
+        try:
+            for statement in statements:
+                self.connection.execute(text(statement))
+            if live:
+                self.connection.execute(gr.update().where(gr.c.release == liverelease).values(status='previous'))
+            else:
+                self.connection.execute(gr.insert(), release=liverelease, status='previous', created=datetime.now())
+            self.connection.execute(gr.update().where(gr.c.release == release).values(status='live', swapped=datetime.now()))
+            trans.commit()
+        except Exception:
+            trans.rollback()
+            raise
+        logger.info('Release %s is live, the previous tables are release %s' % (release, liverelease))
+
+        if keep is not None:
+            previous = [r for r in self.getReleases() if r['status'] == 'previous']
+            previous.sort(key=lambda r: r['swapped'] or r['created'], reverse=True)
+            for r in previous[keep:]:
+                self.dropRelease(r['release'])
+
+        self.bumpDataGeneration()
+        self.aliasesChanged()
+
+    def rollbackRelease(self):
+        '''
+        Swap the most recent previous release back in.  Returns its name.
+        '''
+        previous = [r for r in self.getReleases() if r['status'] == 'previous']
+        if len(previous) == 0:
+            raise Exception('There is no previous release to roll back to')
+        previous.sort(key=lambda r: r['swapped'] or r['created'], reverse=True)
+        self.swapRelease(previous[0]['release'], keep=None)
+        return previous[0]['release']
+
+    def dropRelease(self, release):
+        '''
+        Drop the tables of a release that is not live and forget it
+        '''
+        gr = self.tables['goa_release']
+        row = self.connection.execute(select([gr.c.status]).where(gr.c.release == release)).first()
+        if row is not None and row[0] == 'live':
+            raise Exception('Release %s is live and cannot be dropped' % release)
+        for table in self.releaseTables(release).values():
+            table.drop(bind=self.connection, checkfirst=True)
+        self.connection.execute(gr.delete().where(gr.c.release == release))
+        logger.info('Dropped release %s' % release)
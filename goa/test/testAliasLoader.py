@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test loading UniProt id mapping files into the alias table
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os
+import shutil
+import tempfile
+from sqlalchemy import select
+
+from goa import Store
+from goa.loader import loadAliasFile
+
+SELECTED = [
+    ['P31946', '1433B_HUMAN', '7529', 'NP_003395.1; NP_647539.1', '', '', '', 'UniRef100_P31946', 'UniRef90_P31946', 'UniRef50_P31946', 'UPI000013C4D6', '', '9606', '', '', '', '', '', '', '', '', ''],
+    ['P62258', '1433E_HUMAN', '7531', 'NP_006752.1', '', '', '', 'UniRef100_P62258', 'UniRef90_P62258', 'UniRef50_P62258', 'UPI000003B7B2', '', '9606', '', '', '', '', '', '', '', '', ''],
+]
+DAT = [
+    ['P31946', 'UniProtKB-ID', '1433B_HUMAN'],
+    ['P31946', 'UniRef90', 'UniRef90_P31946'],
+    ['P31946', 'RefSeq', 'NP_003395.1'],
+    ['Q04917', 'UniProtKB-ID', '1433F_HUMAN'],
+    ['Q04917', 'UniRef90', 'UniRef90_Q04917'],
+]
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://')
+        self.store.create()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+        shutil.rmtree(self.tmpdir)
+
+    def writeFile(self, name, rows):
+        filename = os.path.join(self.tmpdir, name)
+        with open(filename, 'w') as f:
+            for row in rows:
+                f.write('\t'.join(row) + '\n')
+        return filename
+
+    def aliases(self):
+        alias = self.store.tables['alias']
+        return sorted([tuple(row) for row in self.store.connection.execute(select([alias.c.accession, alias.c.alias, alias.c.source]))])
+
+    def testLoadSelected(self):
+        '''
+        Selected sources are loaded from idmapping_selected.tab, including multi-valued columns
+        '''
+        filename = self.writeFile('idmapping_selected.tab', SELECTED)
+        loadAliasFile(self.store, filename, 2, sources=['UniProtKB', 'UniRef90', 'RefSeq'])
+        aliases = self.aliases()
+        self.assertTrue(len(aliases) == 7, 'Incorrect alias count %d' % len(aliases))
+        self.assertTrue(('P31946', 'NP_647539.1', 'RefSeq') in aliases, 'Multi-valued column not split')
+
+    def testLoadDatParallelDedupe(self):
+        '''
+        idmapping.dat loads in parallel and existing aliases are updated instead of failing
+        '''
+        loadAliasFile(self.store, self.writeFile('idmapping_selected.tab', SELECTED), 100)
+        loadAliasFile(self.store, self.writeFile('idmapping.dat', DAT), 2, workers=2, chunkbytes=40)
+        aliases = self.aliases()
+        self.assertTrue(len(aliases) == 8, 'Incorrect alias count %d: %s' % (len(aliases), str(aliases)))
+        self.assertTrue(('Q04917', 'Q04917', 'UniProtKB') in aliases, 'UniProtKB alias missing')
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test concurrent lookups with AsyncStore
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os
+import shutil
+import tempfile
+import threading
+import time
+from sqlalchemy.pool import QueuePool
+
+from goa import Store, LookupCache
+from goa.asyncstore import AsyncStore
+from goa.test.testSearchByIds import initAnnotations
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = Store('sqlite:///%s' % os.path.join(self.tmpdir, 'goa.db'), cache=LookupCache())
+        self.store.create()
+        initAnnotations(self.store)
+        self.asyncstore = AsyncStore(self.store, workers=3)
+
+    def tearDown(self):
+        self.asyncstore.close()
+        self.store.engine.dispose()
+        del self.store
+        shutil.rmtree(self.tmpdir)
+
+    def testConcurrentSearches(self):
+        '''
+        Many concurrent searches give the same results as a synchronous one
+        '''
+        ids = ['A0A003', 'A0A009', 'UniRef90_A0A003', 'missing']
+        expected = sorted(self.store.searchByIds(ids))
+        results = [self.asyncstore.searchByIds(ids) for i in range(20)]
+        for result in results:
+            self.assertTrue(sorted(result.get(10)) == expected, 'Concurrent search results differ')
+
+        result = sorted(self.asyncstore.iterSearchByIds(ids * 10, chunksize=3))
+        self.assertTrue(sorted(set(result)) == expected, 'Chunked search results differ')
+
+    def testIterAnnotations(self):
+        '''
+        Annotations fetched on a thread in batches match the synchronous ones, and an early stop ends the fetch
+        '''
+        expected = list(self.store.iterAnnotations(taxon='35758'))
+        rows = list(self.asyncstore.iterAnnotations(taxon='35758', batchsize=5))
+        self.assertTrue(len(rows) == 41 and rows == expected, 'Incorrect rows %d' % len(rows))
+
+        rows = self.asyncstore.iterAnnotations(batchsize=2)
+        first = [next(rows) for i in range(3)]
+        rows.close()
+        self.assertTrue(len(first) == 3, 'Incorrect rows %s' % str(first))
+        result = self.asyncstore.pool.apply_async(len, ([1],))
+        self.assertTrue(result.get(10) == 1, 'Pool blocked after an early stop')
+
+    def testThreadConnections(self):
+        '''
+        Each thread gets its own connection and pool checkouts are counted
+        '''
+        connections = [self.asyncstore.pool.apply_async(lambda: id(self.store.connection)) for i in range(10)]
+        connections = set([result.get(10) for result in connections])
+        self.assertTrue(id(self.store.connection) not in connections, 'Threads share the main thread connection')
+        self.assertTrue(len(connections) <= 3, 'More connections than threads')
+
+        stats = self.store.poolStats()
+        self.assertTrue(stats['checkouts'] > 0 and stats['waits'] == 0, 'Bad pool stats %s' % str(stats))
+
+    def testPoolWaits(self):
+        '''
+        Only checkouts that wait for an exhausted pool are counted as waits
+        '''
+        store = Store('sqlite:///%s' % os.path.join(self.tmpdir, 'goa.db'))
+        store.pooloptions = {'poolclass': QueuePool, 'pool_size': 1, 'max_overflow': 0, 'connect_args': {'check_same_thread': False}}
+        connection = store.connect()
+        self.assertTrue(store.poolStats()['waits'] == 0, 'Checkout from a free pool counted as a wait')
+
+        waiter = threading.Thread(target=lambda: store.connect().close())
+        waiter.start()
+        time.sleep(0.2)
+        connection.close()
+        waiter.join(10)
+        stats = store.poolStats()
+        self.assertTrue(stats['waits'] == 1 and stats['wait_max'] >= 0.1, 'Bad pool stats %s' % str(stats))
+        store.engine.dispose()
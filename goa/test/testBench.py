@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test the synthetic data generators of goa.bench
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os, shutil, tempfile
+from collections import Counter
+
+from goa.gaf import GafParser
+from goa.loader import parseAliasLines
+from goa.bench.generate import writeGafFile, writeIdMappingFile, searchIds
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testGafFile(self):
+        '''
+        The same seed gives the same file, every row is valid and terms are skewed
+        '''
+        first = os.path.join(self.tmpdir, 'first.gaf')
+        second = os.path.join(self.tmpdir, 'second.gaf')
+        proteincount = writeGafFile(first, 2000, seed=3)
+        writeGafFile(second, 2000, seed=3)
+        with open(first) as f:
+            data = f.read()
+        with open(second) as f:
+            self.assertTrue(f.read() == data, 'Files of the same seed differ')
+
+        parser = GafParser()
+        rows = list(parser.tuples(data.splitlines()))
+        self.assertTrue(len(rows) == 2000, 'Incorrect row count %d' % len(rows))
+        self.assertTrue(parser.rejectcount == 0, 'Rejected rows %s' % parser.errors)
+        self.assertTrue(len(set(row[1] for row in rows)) == proteincount, 'Incorrect protein count %d' % proteincount)
+        self.assertTrue(len(set((row[1], row[4], row[5]) for row in rows)) == 2000, 'Duplicate goa keys')
+        terms = Counter(row[4] for row in rows).most_common()
+        self.assertTrue(terms[0][1] > 10 * terms[-1][1], 'Terms are not skewed %s %s' % (terms[0], terms[-1]))
+
+    def testIdMappingFile(self):
+        '''
+        Id mapping lines parse into aliases that the search ids come from
+        '''
+        filename = os.path.join(self.tmpdir, 'idmapping.tab')
+        writeIdMappingFile(filename, 100)
+        with open(filename) as f:
+            values, errors = parseAliasLines(f.read().splitlines(), ['UniProtKB', 'UniRef90'])
+        self.assertTrue(len(errors) == 0, 'Errors %s' % errors)
+        self.assertTrue(len(values) == 200, 'Incorrect alias count %d' % len(values))
+        aliases = set(value['alias'] for value in values)
+        for source in ('UniProtKB', 'UniRef90'):
+            ids = searchIds(100, 50, source=source)
+            self.assertTrue(set(ids) <= aliases, 'Search ids of %s are not aliases' % source)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test alias creation from a BioSQL bioentry table
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest
+from sqlalchemy import select, func
+
+from goa import Store
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://')
+        self.store.create()
+        self.store.connection.execute('create table bioentry (bioentry_id integer primary key, biodatabase_id integer, accession varchar(100))')
+        self.store.connection.execute(
+            'insert into bioentry (bioentry_id, biodatabase_id, accession) values (?, ?, ?)',
+            [(i, 1 if i != 3 else 2, 'A%05d' % i) for i in range(1, 8)],
+        )
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+
+    def countAlias(self):
+        s = select([func.count(self.store.tables['alias'].c.id)])
+        return s.execute().first()[0]
+
+    def testInitBioSqlAliases(self):
+        '''
+        Every rule creates an alias per bioentry, and a repeated run skips the existing aliases
+        '''
+        entrycount = self.store.initBioSqlAliases(batchsize=2)
+        self.assertTrue(entrycount == 6, 'Incorrect bioentry count %d' % entrycount)
+        self.assertTrue(self.countAlias() == 18, 'Incorrect alias count %d' % self.countAlias())
+
+        self.store.initBioSqlAliases(batchsize=4, rules=[('UniRef90', 'UniRef90_'), ('UniRef50', 'UniRef50_')])
+        self.assertTrue(self.countAlias() == 24, 'Incorrect alias count %d' % self.countAlias())
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test the alias Bloom filter and the Store searches that use it
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os, shutil, tempfile
+
+from goa import Store
+from goa.bloom import BloomFilter, aliasKey
+from goa.loader import loadGoaFile
+from goa.metrics import LoadStats
+from goa.test.testSearchByIds import initAnnotations, DATA_FILE
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = Store('sqlite://', stats=LoadStats(), aliasfilterdir=self.tmpdir)
+        self.store.create()
+        initAnnotations(self.store)
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+        shutil.rmtree(self.tmpdir)
+
+    def testFilter(self):
+        '''
+        No added key is missed and the false positive rate is near the error rate
+        '''
+        bloom = BloomFilter.forCapacity(10000, 0.01)
+        keys = ['P%05d' % i for i in range(10000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all([key in bloom for key in keys]), 'Added key not found')
+        falsepositives = len([i for i in range(10000) if 'Q%05d' % i in bloom])
+        self.assertTrue(falsepositives < 200, 'Too many false positives %d' % falsepositives)
+
+        filename = os.path.join(self.tmpdir, 'test.bloom')
+        bloom.save(filename)
+        loaded = BloomFilter.load(filename)
+        self.assertTrue(loaded.bits == bloom.bits and loaded.hashcount == bloom.hashcount, 'Loaded filter differs')
+
+    def testFilteredSearch(self):
+        '''
+        Ids that are not aliases are dropped before the query and results are unchanged
+        '''
+        unfiltered = sorted(self.store.searchByIds(['A0A003', 'UniRef90_A0A003', 'missing'], source='UniRef90'))
+        self.assertTrue(self.store.buildAliasFilter() == 3, 'Incorrect alias count')
+        bloom = self.store.getAliasFilter()
+        self.assertTrue(aliasKey('UniRef90_A0A003', 'UniRef90') in bloom and aliasKey('A0A009') in bloom, 'Alias missing from filter')
+
+        filtered = sorted(self.store.searchByIds(['A0A003', 'UniRef90_A0A003', 'missing'], source='UniRef90'))
+        self.assertTrue(filtered == unfiltered, 'Filtered results differ: %s %s' % (str(filtered), str(unfiltered)))
+        dropped = self.store.stats.counters['search_ids_filtered']
+        self.assertTrue(dropped >= 1, 'No ids were filtered')
+
+        result = sorted(self.store.searchByIds(['A0A003', 'A0A009', 'missing']))
+        self.assertTrue([r[0] for r in result] == ['A0A003', 'A0A009'], 'Bad data: %s' % str(result))
+
+    def testFoldedKeys(self):
+        '''
+        With a case insensitive collation, ids that differ in case or trailing spaces are kept
+        '''
+        self.store.buildAliasFilter()
+        bloom = self.store.getAliasFilter()
+        self.assertTrue(list(self.store.filterIds(['a0a003'], None, bloom)) == [], 'Case sensitive filter kept a differing id')
+
+        self.store.foldaliases = True
+        self.store.buildAliasFilter()
+        bloom = self.store.getAliasFilter()
+        kept = list(self.store.filterIds(['a0a003', 'A0A003 ', 'uniref90_a0a003', 'missing'], 'uniref90', bloom))
+        self.assertTrue(kept == ['uniref90_a0a003'], 'Incorrect ids kept %s' % str(kept))
+        kept = list(self.store.filterIds(['a0a003', 'A0A003 ', 'missing'], None, bloom))
+        self.assertTrue(kept == ['a0a003', 'A0A003 '], 'Incorrect ids kept %s' % str(kept))
+
+    def testGenerations(self):
+        '''
+        The filter carries over loads that do not change aliases and is replaced by alias changes
+        '''
+        self.store.buildAliasFilter()
+        loadGoaFile(self.store, DATA_FILE, 100)
+        generation = self.store.getDataGeneration()
+        self.assertTrue(os.listdir(self.tmpdir) == [os.path.basename(self.store.aliasFilterFilename(generation))], 'Filter was not carried over')
+
+        self.store.connection.execute(self.store.tables['alias'].insert(), [
+            {'authority': 'UniProtKB', 'accession': 'A0A009', 'alias': 'NEW_A0A009', 'source': 'UniProtKB'},
+        ])
+        self.store.bumpDataGeneration()
+        self.assertTrue(self.store.getAliasFilter() is None, 'Stale filter used after an alias change')
+        self.assertTrue(len(list(self.store.searchByIds(['NEW_A0A009']))) == 1, 'New alias not found without a filter')
+
+        self.store.aliasesChanged()
+        self.assertTrue(len(os.listdir(self.tmpdir)) == 1, 'Old filter files were not removed')
+        self.assertTrue(len(list(self.store.searchByIds(['NEW_A0A009']))) == 1, 'New alias not found with the rebuilt filter')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test the native bulk load path
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os, shutil, tempfile
+from StringIO import StringIO
+from sqlalchemy import select, func
+
+from goa import Store
+from goa.gaf import GafParser
+from goa.loader import bulkLoadGoaFile, writeGoaTsv
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'goa_uniprot_all.gaf.sample')
+
+
+class RebuildFailingStore(Store):
+    '''
+    A Store whose index rebuild fails, e.g. because of duplicate rows
+    '''
+
+    def createIndexes(self, tablenames=None):
+        raise Exception('Index rebuild failed')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://')
+        self.store.create()
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+
+    def testWriteGoaTsv(self):
+        '''
+        Header lines are dropped, dates are converted and bad rows are reported
+        '''
+        gaf = StringIO(
+            '!gaf-version: 2.1\n'
+            'UniProtKB\tA0A000\tmoeA5\t\tGO:0003824\tGO_REF:0000002\tIEA\t\tF\tMoeA5\t\tprotein\ttaxon:35758\t20170408\tInterPro\t\t\n'
+            'UniProtKB\tA0A000\tmoeA5\t\tGO:0003870\tGO_REF:0000002\tIEA\t\tF\tMoeA5\t\tprotein\ttaxon:35758\t2017040\tInterPro\t\t\n'
+        )
+        tsv = StringIO()
+        rowcount, errors = writeGoaTsv(gaf, tsv)
+        self.assertTrue(rowcount == 1, 'Incorrect row count %d' % rowcount)
+        self.assertTrue(len(errors) == 1, 'Incorrect error count %d' % len(errors))
+        fields = tsv.getvalue().rstrip('\n').split('\t')
+        self.assertTrue(len(fields) == 15, 'Incorrect field count %d' % len(fields))
+        self.assertTrue(fields[13] == '2017-04-08', 'Bad date %s' % fields[13])
+
+    def testRejectFile(self):
+        '''
+        Lines are validated as in the batched load and invalid lines go to the reject file
+        '''
+        tmpdir = tempfile.mkdtemp()
+        try:
+            gaffile = os.path.join(tmpdir, 'test.gaf')
+            rejectfile = os.path.join(tmpdir, 'rejects.gaf')
+            with open(gaffile, 'w') as f:
+                f.write(
+                    '!gaf-version: 2.2\n'
+                    'UniProtKB\tA0A000\tmoeA5\tenables\tGO:0003824\tGO_REF:0000002\tIEA\t\tF\tMoeA5\t\tprotein\ttaxon:35758\t20170408\tInterPro\t\t\n'
+                    'UniProtKB\tA0A000\tmoeA5\t\tGO:0003870\tGO_REF:0000002\tIEA\t\tF\tMoeA5\t\tprotein\ttaxon:35758\t20170408\tInterPro\t\t\n'
+                    'UniProtKB\tA0A000\tmoeA5\tenables\tGO:0003870\tGO_REF:0000002\tIEA\t\tX\tMoeA5\t\tprotein\ttaxon:35758\t20170408\tInterPro\t\t\n'
+                )
+            bulkLoadGoaFile(self.store, gaffile, rejectfile=rejectfile, maxrejects=1)
+            rowcount = select([func.count(self.store.tables['goa'].c.id)]).execute().first()[0]
+            self.assertTrue(rowcount == 1, 'Incorrect row count %d' % rowcount)
+            with open(rejectfile) as f:
+                rejects = f.read().splitlines()
+            self.assertTrue(len(rejects) == 1 and '\tGO:0003870\t' in rejects[0], 'Incorrect rejects %s' % str(rejects))
+
+            parser = GafParser()
+            with open(gaffile) as f:
+                rowcount, errors = writeGoaTsv(f, StringIO(), parser)
+            self.assertTrue(rowcount == 1 and parser.rejectcount == 2 and errors is parser.errors, 'Incorrect parse counts')
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def testBulkLoad(self):
+        '''
+        Bulk load saves every row in the sample file
+        '''
+        bulkLoadGoaFile(self.store, DATA_FILE)
+        s = select([func.count(self.store.tables['goa'].c.id)])
+        rowcount = s.execute().first()[0]
+        self.assertTrue(42 == rowcount, 'Incorrect row count %d' % rowcount)
+
+    def testLoadErrorNotMasked(self):
+        '''
+        A failed rebuild after a failed load does not hide the load error
+        '''
+        store = RebuildFailingStore('sqlite://')
+        store.create()
+        self.assertRaises(IOError, store.loadGoaTsv, DATA_FILE + '.missing')
+        store.engine.dispose()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test the load-goa option checks of the goa command
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, sys, os
+
+from goa.cli import initArgs
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.argv = sys.argv
+        self.stderr = sys.stderr
+        sys.stderr = open(os.devnull, 'w')
+
+    def tearDown(self):
+        sys.stderr.close()
+        sys.argv = self.argv
+        sys.stderr = self.stderr
+
+    def parse(self, *arguments):
+        sys.argv = ['goa', 'load-goa', 'goa.gaf'] + list(arguments)
+        return initArgs()
+
+    def testLoadGoaOptions(self):
+        '''
+        Options that the selected load would ignore are usage errors
+        '''
+        for arguments in [
+            ['--bulk', '--incremental'],
+            ['--bulk', '--workers', '4'],
+            ['--incremental', '--workers', '4'],
+            ['--shadow', '--workers', '4'],
+            ['--delete'],
+            ['--bulk', '--delete'],
+            ['--bulk', '--resume'],
+            ['--workers', '4', '--resume'],
+            ['--replace-partitions'],
+            ['--release', 'r1'],
+            ['--incremental', '--reject-file', 'rejects.gaf'],
+            ['--workers', '4', '--reject-file', 'rejects.gaf'],
+        ]:
+            self.assertRaises(SystemExit, self.parse, *arguments)
+
+        for arguments in [
+            [],
+            ['--workers', '4'],
+            ['--by-partition', '--workers', '4', '--replace-partitions', '--reject-file', 'rejects.gaf'],
+            ['--incremental', '--delete'],
+            ['--bulk', '--reject-file', 'rejects.gaf'],
+            ['--shadow', '--release', 'r1', '--alias-file', 'idmapping.dat'],
+            ['--resume', '--reject-file', 'rejects.gaf'],
+        ]:
+            args = self.parse(*arguments)
+            self.assertTrue(args.command == 'load-goa', 'Options rejected: %s' % ' '.join(arguments))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test the dictionary encoded compact schema
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os, shutil, tempfile
+from sqlalchemy import select, func
+
+from goa import Store
+from goa.loader import loadGoaFile, bulkLoadGoaFile, incrementalLoadGoaFile
+from goa.test.testSearchByIds import initAnnotations
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'goa_uniprot_all.gaf.sample')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://', compact=True)
+        self.store.create()
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+
+    def count(self, tablename):
+        return self.store.connection.execute(select([func.count()]).select_from(self.store.tables[tablename])).first()[0]
+
+    def testLoad(self):
+        '''
+        The goa view returns the same rows as the flat goa table
+        '''
+        loadGoaFile(self.store, DATA_FILE, 10)
+        flat = Store('sqlite://')
+        flat.create()
+        loadGoaFile(flat, DATA_FILE, 100)
+
+        rows = sorted(self.store.iterAnnotations())
+        self.assertTrue(len(rows) == 42, 'Incorrect row count %d' % len(rows))
+        self.assertTrue(rows == sorted(flat.iterAnnotations()), 'View rows differ from the flat table')
+        self.assertTrue(self.count('goa_aspect') == 3, 'Incorrect aspect count %d' % self.count('goa_aspect'))
+        self.assertTrue(self.count('db_object') == 8, 'Incorrect db_object count %d' % self.count('db_object'))
+
+    def testBulkLoad(self):
+        '''
+        Bulk loads are encoded too
+        '''
+        bulkLoadGoaFile(self.store, DATA_FILE)
+        self.assertTrue(self.count('goa_annotation') == 42, 'Incorrect row count %d' % self.count('goa_annotation'))
+
+    def testIncrementalLoad(self):
+        '''
+        Reloading the same file changes nothing and deleted proteins are removed
+        '''
+        loadGoaFile(self.store, DATA_FILE, 100)
+        self.store.deleteGoaObjects([('UniProtKB', 'A0A001')])
+        self.assertTrue(self.count('goa_annotation') == 42 - 12, 'Incorrect row count %d' % self.count('goa_annotation'))
+
+        # A new Store starts with empty encoding dictionaries
+        self.store.encoders = {}
+        self.store.objectids = {}
+        counts = incrementalLoadGoaFile(self.store, DATA_FILE, 100)
+        self.assertTrue(counts['inserted'] == 12, 'Incorrect counts %s' % str(counts))
+        self.assertTrue(self.count('goa_annotation') == 42, 'Incorrect row count %d' % self.count('goa_annotation'))
+
+    def testIncrementalObjectUpdate(self):
+        '''
+        A changed protein symbol is written to db_object and then counts as unchanged
+        '''
+        loadGoaFile(self.store, DATA_FILE, 100)
+        with open(DATA_FILE, 'r') as f:
+            lines = []
+            for line in f:
+                row = line.split('\t')
+                if not line.startswith('!') and row[1] == 'A0A003':
+                    row[2] = 'moeE5X'
+                lines.append('\t'.join(row))
+        tmpdir = tempfile.mkdtemp()
+        try:
+            release = os.path.join(tmpdir, 'release.gaf')
+            with open(release, 'w') as f:
+                f.write(''.join(lines))
+
+            counts = incrementalLoadGoaFile(self.store, release, 100)
+            self.assertTrue(counts['updated'] == 4, 'Incorrect counts %s' % str(counts))
+            goa = self.store.tables['goa']
+            symbols = set([r[0] for r in self.store.connection.execute(select([goa.c.db_object_symbol]).where(goa.c.db_object_id == 'A0A003'))])
+            self.assertTrue(symbols == set(['moeE5X']), 'Symbol not updated: %s' % str(symbols))
+
+            counts = incrementalLoadGoaFile(self.store, release, 100)
+            self.assertTrue(counts['updated'] == 0 and counts['unchanged'] == 42, 'Incorrect counts on reload %s' % str(counts))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def testSearch(self):
+        '''
+        Searches work through the goa view
+        '''
+        initAnnotations(self.store)
+        result = sorted(self.store.searchByIds(['A0A003', 'A0A009']))
+        self.assertTrue([r[0:2] for r in result] == [('A0A003', 'moeE5'), ('A0A009', 'moeM5')], 'Bad data: %s' % str(result))
+        self.store.drop()
+        self.assertTrue('goa_annotation' not in self.store.engine.table_names(), 'Tables not dropped')
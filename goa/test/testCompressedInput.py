@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test loading gzip and bgzip compressed GAF files
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os
+import gzip
+import shutil
+import struct
+import tempfile
+import zlib
+from sqlalchemy import select, func
+
+from goa import Store
+from goa.loader import loadGoaFile, parallelLoadGoaFile, isBgzf
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'goa_uniprot_all.gaf.sample')
+
+
+def writeBgzf(filename, data, blocksize):
+    '''
+    Write data as a bgzip file with members of at most blocksize uncompressed bytes
+    '''
+    with open(filename, 'wb') as f:
+        for i in range(0, len(data), blocksize) + [len(data)]:
+            block = data[i:i + blocksize]
+            c = zlib.compressobj(6, zlib.DEFLATED, -15)
+            cdata = c.compress(block) + c.flush()
+            f.write(b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff')
+            f.write(struct.pack('<HccHH', 6, b'B', b'C', 2, 26 + len(cdata) - 1))
+            f.write(cdata)
+            f.write(struct.pack('<II', zlib.crc32(block) & 0xffffffff, len(block)))
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://')
+        self.store.create()
+        self.tmpdir = tempfile.mkdtemp()
+        with open(DATA_FILE, 'rb') as f:
+            self.data = f.read()
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+        shutil.rmtree(self.tmpdir)
+
+    def countGoa(self):
+        s = select([func.count(self.store.tables['goa'].c.id)])
+        return s.execute().first()[0]
+
+    def testGzipLoad(self):
+        '''
+        A gzip file is decompressed as it is loaded
+        '''
+        gzfile = os.path.join(self.tmpdir, 'sample.gaf.gz')
+        with gzip.open(gzfile, 'wb') as f:
+            f.write(self.data)
+        self.assertFalse(isBgzf(gzfile), 'Plain gzip detected as bgzip')
+
+        loadGoaFile(self.store, gzfile, 10)
+        rowcount = self.countGoa()
+        self.assertTrue(42 == rowcount, 'Incorrect row count %d' % rowcount)
+
+    def testBgzfParallelLoad(self):
+        '''
+        A bgzip file with lines split across members is decompressed block parallel
+        '''
+        bgzfile = os.path.join(self.tmpdir, 'sample.gaf.bgz')
+        writeBgzf(bgzfile, self.data, 333)
+        self.assertTrue(isBgzf(bgzfile), 'bgzip file not detected')
+
+        parallelLoadGoaFile(self.store, bgzfile, 10, 2, chunkbytes=200)
+        rowcount = self.countGoa()
+        self.assertTrue(42 == rowcount, 'Incorrect row count %d' % rowcount)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test GO term enrichment
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os
+import shutil
+import tempfile
+
+from goa import Store
+from goa.loader import loadGoaFile, loadOboFile
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'goa_uniprot_all.gaf.sample')
+OBO_FILE = os.path.join(os.path.dirname(__file__), 'go-basic.obo.sample')
+
+try:
+    import numpy, scipy.stats
+    from goa.enrich import AnnotationMatrix, enrichIds, benjaminiHochberg
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, 'numpy and scipy are not installed')
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://')
+        self.store.create()
+        loadGoaFile(self.store, DATA_FILE, 100)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+        shutil.rmtree(self.tmpdir)
+
+    def testMatrix(self):
+        '''
+        Matrix has one row per gene and one column per term of the taxon
+        '''
+        matrix = AnnotationMatrix.build(self.store, '35758')
+        self.assertTrue(len(matrix.genes) == 7, 'Incorrect gene count %d' % len(matrix.genes))
+        self.assertTrue(matrix.matrix.nnz == 33, 'Incorrect annotation count %d' % matrix.matrix.nnz)
+
+        filename = os.path.join(self.tmpdir, 'matrix.npz')
+        matrix.save(filename)
+        loaded = AnnotationMatrix.load(filename)
+        self.assertTrue(loaded.genes == matrix.genes and loaded.terms == matrix.terms, 'Loaded matrix labels differ')
+        self.assertTrue((loaded.matrix != matrix.matrix).nnz == 0, 'Loaded matrix differs')
+
+    def testEnrich(self):
+        '''
+        p-values match the scalar hypergeometric test and the matrix is cached per data generation
+        '''
+        results = enrichIds(self.store, ['A0A001', 'A0A002'], '35758', cachedir=self.tmpdir)
+        top = results[0]
+        self.assertTrue(top[2:6] == (2, 2, 2, 7), 'Incorrect top result %s' % str(top))
+        self.assertTrue(abs(top[6] - 1.0 / 21) < 1e-9, 'Incorrect p-value %f' % top[6])
+        for result in results:
+            expected = scipy.stats.hypergeom.sf(result[2] - 1, result[5], result[4], result[3])
+            self.assertTrue(abs(result[6] - expected) < 1e-9, 'Incorrect p-value for %s' % result[0])
+        self.assertTrue(os.listdir(self.tmpdir) == ['goa_matrix_%s_35758_%d.npz' % (self.store.databaseKey, self.store.getDataGeneration())], 'Matrix not cached')
+
+    def testSharedCacheDir(self):
+        '''
+        Databases at the same data generation do not share cached matrices
+        '''
+        stores = []
+        for name in ('a', 'b'):
+            store = Store('sqlite:///%s' % os.path.join(self.tmpdir, '%s.db' % name))
+            store.create()
+            stores.append(store)
+        loadGoaFile(stores[0], DATA_FILE, 100)
+        stores[1].bumpDataGeneration()
+        self.assertTrue(stores[0].getDataGeneration() == stores[1].getDataGeneration(), 'Generations differ')
+
+        cachedir = os.path.join(self.tmpdir, 'cache')
+        first = AnnotationMatrix.cached(stores[0], '35758', cachedir=cachedir)
+        second = AnnotationMatrix.cached(stores[1], '35758', cachedir=cachedir)
+        self.assertTrue(len(first.terms) > 0 and len(second.terms) == 0, 'Matrix shared between databases: %d %d' % (len(first.terms), len(second.terms)))
+        for store in stores:
+            store.engine.dispose()
+
+    def testPropagate(self):
+        '''
+        Propagated matrices count genes annotated to descendants of a term
+        '''
+        loadOboFile(self.store, OBO_FILE)
+        matrix = AnnotationMatrix.cached(self.store, '35758', self.tmpdir, propagate=True)
+        column = matrix.terms.index('GO:0016787')
+        genes = set([matrix.genes[i] for i in matrix.matrix[:, column].nonzero()[0]])
+        self.assertTrue(genes == set(['A0A001', 'A0A002']), 'Incorrect propagated genes %s' % str(genes))
+
+    def testBenjaminiHochberg(self):
+        '''
+        FDR matches a hand computed example
+        '''
+        fdr = benjaminiHochberg([0.01, 0.04, 0.03, 0.5])
+        self.assertTrue(numpy.allclose(fdr, [0.04, 0.05333333, 0.05333333, 0.5]), 'Incorrect FDR %s' % str(fdr))
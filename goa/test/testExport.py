@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test streaming annotation export
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os
+import shutil
+import tempfile
+
+from goa import Store
+from goa.loader import loadGoaFile
+from goa.export import exportAnnotations
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'goa_uniprot_all.gaf.sample')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://')
+        self.store.create()
+        loadGoaFile(self.store, DATA_FILE, 100)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+        shutil.rmtree(self.tmpdir)
+
+    def testGafRoundTrip(self):
+        '''
+        Exported GAF has the same annotation lines as the loaded file
+        '''
+        filename = os.path.join(self.tmpdir, 'export.gaf')
+        rowcount = exportAnnotations(self.store, filename, 'gaf')
+        self.assertTrue(rowcount == 42, 'Incorrect row count %d' % rowcount)
+
+        def annotations(name):
+            with open(name, 'r') as f:
+                return sorted([line.rstrip('\n').split('\t')[:15] for line in f if not line.startswith('!')])
+        self.assertTrue(annotations(filename) == annotations(DATA_FILE), 'Exported GAF differs from the loaded file')
+
+    def testFilteredAnnotations(self):
+        '''
+        Filters limit the exported rows
+        '''
+        rows = list(self.store.iterAnnotations(taxon='35758', aspect=['F'], batchsize=5))
+        self.assertTrue(len(rows) > 0, 'No rows exported')
+        self.assertTrue(all([row[12] == 'taxon:35758' and row[8] == 'F' for row in rows]), 'Filters not applied')
+        self.assertTrue(len(list(self.store.iterAnnotations(evidence_code='XXX'))) == 0, 'Unknown evidence code matched')
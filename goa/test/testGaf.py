@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test the GAF parser
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os, shutil, tempfile
+from datetime import date
+from sqlalchemy import select, func
+
+from goa import Store
+from goa.gaf import GafParser, parseDate
+from goa.loader import loadGoaFile, parallelLoadGoaFile, parseGoaLines
+from goa.metrics import LoadStats
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'goa_uniprot_all.gaf.sample')
+
+ROW = 'UniProtKB\tA0A000\tmoeA5\tenables\tGO:0003824\tGO_REF:0000002\tIEA\t\tF\tMoeA5\t\tprotein\ttaxon:35758\t20170408\tInterPro'
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testParseDate(self):
+        '''
+        Dates are converted once and invalid dates raise
+        '''
+        d = parseDate('20170408')
+        self.assertTrue(d == date(2017, 4, 8), 'Incorrect date %s' % d)
+        self.assertTrue(parseDate('20170408') is d, 'Date was not cached')
+        for value in ('2017040', '20171301', '2017O408'):
+            self.assertRaises(Exception, parseDate, value)
+
+    def testTuples(self):
+        '''
+        Rows of 15 to 17 columns are parsed into the goa columns, headers and blank lines are skipped
+        '''
+        parser = GafParser()
+        rows = list(parser.tuples(['!gaf-version: 2.1', '', ROW, ROW + '\t\t', ROW + '\tpart_of(X)\tUniProtKB:A0A000-1\n']))
+        self.assertTrue(len(rows) == 3, 'Incorrect row count %d' % len(rows))
+        self.assertTrue(all(len(row) == 15 for row in rows), 'Rows do not have 15 values')
+        self.assertTrue(rows[0][13] == date(2017, 4, 8), 'Incorrect date %s' % rows[0][13])
+        self.assertTrue(parser.version == '2.1', 'Incorrect version %s' % parser.version)
+        self.assertTrue(parser.rejectcount == 0, 'Incorrect reject count %d' % parser.rejectcount)
+
+    def testRecords(self):
+        '''
+        Records have all 17 GAF columns
+        '''
+        records = list(GafParser().records([ROW, ROW + '\tpart_of(X)\tUniProtKB:A0A000-1']))
+        self.assertTrue(records[0].annotation_extension == '', 'Incorrect extension %s' % records[0].annotation_extension)
+        self.assertTrue(records[1].gene_product_form_id == 'UniProtKB:A0A000-1', 'Incorrect form id %s' % records[1].gene_product_form_id)
+        self.assertTrue(records[1].go_id == 'GO:0003824', 'Incorrect go_id %s' % records[1].go_id)
+
+    def testRejects(self):
+        '''
+        Invalid rows are rejected, written to the reject file up to maxrejects and their errors are capped
+        '''
+        fields = ROW.split('\t')
+        bad = []
+        for i, value in ((4, '0003824'), (8, 'X'), (13, '2017040'), (1, '')):
+            row = list(fields)
+            row[i] = value
+            bad.append('\t'.join(row))
+        bad.append('\t'.join(fields[:10]))
+
+        rejectfile = os.path.join(self.tmpdir, 'rejects.gaf')
+        with GafParser(rejectfile, maxrejects=3, maxerrors=2) as parser:
+            rows = list(parser.tuples([ROW] + bad))
+        self.assertTrue(len(rows) == 1, 'Incorrect row count %d' % len(rows))
+        self.assertTrue(parser.rejectcount == 5, 'Incorrect reject count %d' % parser.rejectcount)
+        self.assertTrue(len(parser.errors) == 2, 'Incorrect error count %d' % len(parser.errors))
+        self.assertTrue(parser.errors[0].startswith('Line 2:'), 'Incorrect error %s' % parser.errors[0])
+        with open(rejectfile) as f:
+            rejected = f.read().splitlines()
+        self.assertTrue(rejected == bad[:3], 'Incorrect rejected lines %s' % rejected)
+
+    def testVersion(self):
+        '''
+        GAF 2.2 rows need a qualifier and unknown versions raise
+        '''
+        parser = GafParser()
+        rows = list(parser.tuples(['!gaf-version: 2.2', ROW, ROW.replace('enables', '')]))
+        self.assertTrue(len(rows) == 1, 'Incorrect row count %d' % len(rows))
+        self.assertTrue(parser.rejectcount == 1, 'Incorrect reject count %d' % parser.rejectcount)
+        self.assertRaises(Exception, list, GafParser().tuples(['!gaf-version: 1.0']))
+
+    def testLoadRejects(self):
+        '''
+        loadGoaFile loads the valid rows and writes the invalid ones to the reject file
+        '''
+        gaffile = os.path.join(self.tmpdir, 'load.gaf')
+        rejectfile = os.path.join(self.tmpdir, 'rejects.gaf')
+        with open(DATA_FILE) as f:
+            data = f.read()
+        with open(gaffile, 'w') as f:
+            f.write(data)
+            f.write(ROW.replace('20170408', '20170231') + '\n')
+
+        store = Store('sqlite://')
+        store.create()
+        loadGoaFile(store, gaffile, 10, rejectfile=rejectfile)
+        rowcount = select([func.count(store.tables['goa'].c.id)]).execute().first()[0]
+        store.engine.dispose()
+        self.assertTrue(rowcount == 42, 'Incorrect row count %d' % rowcount)
+        with open(rejectfile) as f:
+            rejected = f.read().splitlines()
+        self.assertTrue(len(rejected) == 1 and '20170231' in rejected[0], 'Incorrect rejected lines %s' % rejected)
+
+    def testParallelErrorCount(self):
+        '''
+        Errors beyond the kept ones are still counted by the parallel load
+        '''
+        values, errors, errorcount = parseGoaLines(['bad line %d' % i for i in range(150)])
+        self.assertTrue(len(errors) == 100 and errorcount == 150, 'Incorrect errors %d %d' % (len(errors), errorcount))
+
+        filename = os.path.join(self.tmpdir, 'errors.gaf')
+        with open(DATA_FILE, 'r') as f, open(filename, 'w') as out:
+            out.write(f.read())
+            out.writelines(['bad line %d\n' % i for i in range(150)])
+        store = Store('sqlite://')
+        store.create()
+        stats = LoadStats()
+        parallelLoadGoaFile(store, filename, 100, 2, stats=stats)
+        self.assertTrue(stats.counters['errors'] == 150, 'Incorrect error count %d' % stats.counters['errors'])
+        self.assertTrue(stats.counters['rows_saved'] == 42, 'Incorrect saved count %d' % stats.counters['rows_saved'])
+        store.engine.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test incremental goa loads
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os
+import shutil
+import tempfile
+from sqlalchemy import select, func
+
+from goa import Store
+from goa.loader import loadGoaFile, incrementalLoadGoaFile
+from goa.metrics import LoadStats
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'goa_uniprot_all.gaf.sample')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://')
+        self.store.create()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+        shutil.rmtree(self.tmpdir)
+
+    def countGoa(self):
+        s = select([func.count(self.store.tables['goa'].c.id)])
+        return s.execute().first()[0]
+
+    def testIncrementalLoad(self):
+        '''
+        Only changed rows are upserted and vanished rows are deleted
+        '''
+        loadGoaFile(self.store, DATA_FILE, 100)
+
+        with open(DATA_FILE, 'r') as f:
+            lines = [line for line in f if not line.startswith('!')]
+
+        # Change the evidence code of the first row, drop the second and add a new one
+        row = lines[0].split('\t')
+        row[6] = 'IDA'
+        lines[0] = '\t'.join(row)
+        del lines[1]
+        row[4] = 'GO:9999999'
+        lines.insert(1, '\t'.join(row))
+
+        release = os.path.join(self.tmpdir, 'release.gaf')
+        with open(release, 'w') as f:
+            f.write(''.join(lines))
+
+        counts = incrementalLoadGoaFile(self.store, release, 5, delete=True)
+        self.assertTrue(counts['inserted'] == 1, 'Incorrect insert count %d' % counts['inserted'])
+        self.assertTrue(counts['updated'] == 1, 'Incorrect update count %d' % counts['updated'])
+        self.assertTrue(counts['unchanged'] == 40, 'Incorrect unchanged count %d' % counts['unchanged'])
+        self.assertTrue(counts['deleted'] == 1, 'Incorrect delete count %d' % counts['deleted'])
+        self.assertTrue(self.countGoa() == 42, 'Incorrect row count %d' % self.countGoa())
+
+        goa = self.store.tables['goa']
+        s = select([goa.c.evidence_code]).where(goa.c.go_id == 'GO:9999999')
+        self.assertTrue(s.execute().first()[0] == 'IDA', 'New row not inserted')
+
+        counts = incrementalLoadGoaFile(self.store, release, 5, delete=True)
+        self.assertTrue(counts['unchanged'] == 42, 'Incorrect unchanged count %d' % counts['unchanged'])
+
+    def testNotContiguous(self):
+        '''
+        A file that is not grouped by db_object_id fails with delete before its batch is written
+        '''
+        loadGoaFile(self.store, DATA_FILE, 100)
+        with open(DATA_FILE, 'r') as f:
+            lines = [line for line in f if not line.startswith('!')]
+
+        # Move the first row, with a changed evidence code, behind the other rows of other proteins
+        row = lines.pop(0).split('\t')
+        row[6] = 'IDA'
+        lines.append('\t'.join(row))
+        release = os.path.join(self.tmpdir, 'release.gaf')
+        with open(release, 'w') as f:
+            f.write(''.join(lines))
+
+        self.assertRaises(Exception, incrementalLoadGoaFile, self.store, release, 5, delete=True)
+        goa = self.store.tables['goa']
+        s = select([func.count(goa.c.id)]).where(goa.c.evidence_code == 'IDA')
+        self.assertTrue(s.execute().first()[0] == 0, 'Row of the failed batch was written')
+
+    def testGafVersion(self):
+        '''
+        The version header applies to all lines, so GAF 2.2 rows without a qualifier are rejected
+        '''
+        with open(DATA_FILE, 'r') as f:
+            lines = [line for line in f if not line.startswith('!')]
+        rows = [line.split('\t') for line in lines]
+        for row in rows[1:]:
+            row[3] = 'enables'
+        release = os.path.join(self.tmpdir, 'release.gaf')
+        with open(release, 'w') as f:
+            f.write('!gaf-version: 2.2\n')
+            f.write(''.join(['\t'.join(row) for row in rows]))
+
+        stats = LoadStats()
+        counts = incrementalLoadGoaFile(self.store, release, 5, stats=stats)
+        self.assertTrue(counts['inserted'] == 41, 'Incorrect counts %s' % str(counts))
+        self.assertTrue(stats.counters['lines_rejected'] == 1 and stats.counters['errors'] == 1, 'Incorrect stats %s' % str(stats.counters))
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test dropping and recreating the secondary goa and alias indexes
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, logging
+from sqlalchemy import inspect
+
+from goa import Store
+
+
+class MessageCounter(logging.Handler):
+    '''
+    Counts the log messages that start with prefix
+    '''
+
+    def __init__(self, prefix):
+        logging.Handler.__init__(self)
+        self.prefix = prefix
+        self.count = 0
+
+    def emit(self, record):
+        if record.getMessage().startswith(self.prefix):
+            self.count += 1
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://')
+        self.store.create()
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+
+    def indexNames(self, tablename):
+        return set([index['name'] for index in inspect(self.store.engine).get_indexes(tablename)])
+
+    def testDropCreate(self):
+        '''
+        Dropped indexes are gone, are recreated, and a second createIndexes does nothing
+        '''
+        expected = set(['ix_goa_object', 'ix_alias_lookup', 'ix_alias_accession'])
+        created = self.indexNames('goa') | self.indexNames('alias')
+        self.assertTrue(expected <= created, 'Indexes missing after create: %s' % str(created))
+
+        self.store.dropIndexes()
+        remaining = self.indexNames('goa') | self.indexNames('alias')
+        self.assertTrue(len(expected & remaining) == 0, 'Indexes not dropped: %s' % str(remaining))
+
+        self.store.createIndexes()
+        recreated = self.indexNames('goa') | self.indexNames('alias')
+        self.assertTrue(recreated == created, 'Indexes not recreated: %s' % str(recreated))
+
+        counter = MessageCounter('Creating index')
+        logger = logging.getLogger()
+        level = logger.level
+        logger.addHandler(counter)
+        logger.setLevel(logging.INFO)
+        try:
+            self.store.createIndexes()
+        finally:
+            logger.removeHandler(counter)
+            logger.setLevel(level)
+        self.assertTrue(counter.count == 0, 'Existing indexes created again: %d' % counter.count)
+        self.assertTrue(self.indexNames('goa') | self.indexNames('alias') == created, 'Indexes changed by a second createIndexes')
+
+
+if __name__ == '__main__':
+    unittest.main()
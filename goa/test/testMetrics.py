@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test the load stats, progress line and metrics files
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os, json, shutil, tempfile
+from StringIO import StringIO
+
+from goa import Store
+from goa.loader import loadGoaFile, parallelLoadGoaFile
+from goa.metrics import LoadStats, ProgressLine, LATENCY_BUCKETS
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'goa_uniprot_all.gaf.sample')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testStats(self):
+        '''
+        Counters add up, observations land in the right histogram buckets and the ETA follows read_bytes
+        '''
+        stats = LoadStats(totalbytes=1000)
+        stats.count('rows_saved', 10)
+        stats.count('rows_saved')
+        stats.observe('insert_batch', 0.003)
+        stats.observe('insert_batch', 1000)
+        with stats.timer('commit'):
+            pass
+        self.assertTrue(stats.counters['rows_saved'] == 11, 'Incorrect count %d' % stats.counters['rows_saved'])
+        self.assertTrue(stats.timers['insert_batch'][1] == 2, 'Incorrect observation count %d' % stats.timers['insert_batch'][1])
+        histogram = stats.histograms['insert_batch']
+        self.assertTrue(histogram[LATENCY_BUCKETS.index(0.005)] == 1 and histogram[-1] == 1, 'Incorrect histogram %s' % histogram)
+        self.assertTrue(stats.eta() is None, 'ETA before any bytes were read')
+        stats.progress(500)
+        self.assertTrue(stats.eta() is not None and stats.eta() >= 0, 'No ETA with read_bytes')
+
+    def testMetricsFiles(self):
+        '''
+        Stats are written as JSON and as a Prometheus textfile
+        '''
+        stats = LoadStats()
+        stats.count('rows_saved', 5)
+        stats.observe('insert_batch', 0.02)
+        stats.finish()
+
+        jsonfile = os.path.join(self.tmpdir, 'metrics.json')
+        stats.write(jsonfile)
+        with open(jsonfile) as f:
+            metrics = json.load(f)
+        self.assertTrue(metrics['counters']['rows_saved'] == 5, 'Incorrect JSON counter %s' % metrics['counters'])
+        self.assertTrue(metrics['timers']['insert_batch']['count'] == 1, 'Incorrect JSON timer %s' % metrics['timers'])
+
+        promfile = os.path.join(self.tmpdir, 'metrics.prom')
+        stats.write(promfile)
+        with open(promfile) as f:
+            lines = f.read().splitlines()
+        self.assertTrue('goalchemy_rows_saved_total 5' in lines, 'No rows_saved counter in %s' % lines)
+        self.assertTrue('goalchemy_insert_batch_seconds_bucket{le="0.025"} 1' in lines, 'Incorrect bucket in %s' % lines)
+        self.assertTrue('goalchemy_insert_batch_seconds_count 1' in lines, 'No histogram count in %s' % lines)
+
+    def testLoadStats(self):
+        '''
+        loadGoaFile and the Store record stages and counters and report progress to the callbacks
+        '''
+        stats = LoadStats()
+        updates = []
+        stats.addCallback(lambda stats: updates.append(stats.counters.get('read_bytes')))
+        output = StringIO()
+        stats.addCallback(ProgressLine(output))
+
+        store = Store('sqlite://', stats=stats)
+        store.create()
+        loadGoaFile(store, DATA_FILE, 10)
+        store.engine.dispose()
+
+        self.assertTrue(stats.counters['rows_saved'] == 42, 'Incorrect rows_saved %d' % stats.counters['rows_saved'])
+        self.assertTrue(stats.counters['rows_inserted'] == 42, 'Incorrect rows_inserted %d' % stats.counters['rows_inserted'])
+        for name in ('read_parse', 'store_batch', 'insert_batch', 'commit'):
+            self.assertTrue(stats.timers[name][1] == 5, 'Incorrect %s count %d' % (name, stats.timers[name][1]))
+        self.assertTrue(updates[-2] == os.path.getsize(DATA_FILE), 'Incorrect final read_bytes %s' % updates[-2])
+        self.assertTrue(stats.end is not None, 'Stats were not finished')
+        self.assertTrue(output.getvalue().endswith('\n') and '100.0%' in output.getvalue(), 'Incorrect progress line %s' % output.getvalue())
+
+
+    def testParallelLoadStats(self):
+        '''
+        parallelLoadGoaFile reports the file position of every parsed chunk
+        '''
+        stats = LoadStats()
+        updates = []
+        stats.addCallback(lambda stats: updates.append(stats.counters.get('read_bytes')))
+
+        store = Store('sqlite://', stats=stats)
+        store.create()
+        parallelLoadGoaFile(store, DATA_FILE, 10, 2, chunkbytes=2000)
+        store.engine.dispose()
+
+        positions = [update for update in updates if update is not None]
+        self.assertTrue(stats.counters['rows_saved'] == 42, 'Incorrect rows_saved %d' % stats.counters['rows_saved'])
+        self.assertTrue(len(set(positions)) > 1 and positions == sorted(positions), 'Incorrect positions %s' % positions)
+        self.assertTrue(positions[-1] == os.path.getsize(DATA_FILE) == stats.totalbytes, 'Incorrect final read_bytes %s' % positions[-1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test the GO ontology loader and ancestor propagation
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os
+
+from goa import Store, LookupCache
+from goa.loader import loadGoaFile, loadOboFile, parseOboLines, ancestorClosure
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'goa_uniprot_all.gaf.sample')
+OBO_FILE = os.path.join(os.path.dirname(__file__), 'go-basic.obo.sample')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://', cache=LookupCache())
+        self.store.create()
+        loadGoaFile(self.store, DATA_FILE, 100)
+        self.store.connection.execute(self.store.tables['alias'].insert(), [
+            {'authority': 'UniProtKB', 'accession': 'A0A001', 'alias': 'A0A001', 'source': 'UniProtKB'},
+        ])
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+
+    def testClosure(self):
+        '''
+        Ancestors follow is_a and part_of edges and include the term itself
+        '''
+        with open(OBO_FILE, 'r') as f:
+            terms, edges, altids = parseOboLines(f)
+        self.assertTrue(len(terms) == 8, 'Incorrect term count %d' % len(terms))
+        self.assertTrue(altids == {'GO:0004002': 'GO:0016887'}, 'Incorrect alt_ids %s' % str(altids))
+
+        closure = ancestorClosure(edges)
+        expected = set(['GO:0016887', 'GO:0016787', 'GO:0003824', 'GO:0003674'])
+        self.assertTrue(closure['GO:0016887'] == expected, 'Incorrect ancestors %s' % str(closure['GO:0016887']))
+        self.assertTrue('GO:0016020' in closure['GO:0016021'], 'part_of not followed')
+        self.assertTrue('GO:0016020' not in ancestorClosure(edges, ['is_a'])['GO:0016021'], 'part_of followed')
+
+    def testCycle(self):
+        '''
+        A cycle in the ontology is an error
+        '''
+        edges = [('GO:1', 'GO:2', 'is_a'), ('GO:2', 'GO:3', 'is_a'), ('GO:3', 'GO:1', 'part_of')]
+        self.assertRaises(Exception, ancestorClosure, edges)
+
+    def testPropagate(self):
+        '''
+        Searches with propagate return the ancestor terms of the annotations
+        '''
+        termcount = loadOboFile(self.store, OBO_FILE)
+        self.assertTrue(termcount == 9, 'Incorrect term count %d' % termcount)
+        ancestors = self.store.getAncestors(['GO:0004002'])
+        self.assertTrue('GO:0003674' in ancestors['GO:0004002'], 'alt_id not propagated')
+
+        direct = list(self.store.searchByIds(['A0A001']))
+        propagated = list(self.store.searchByIds(['A0A001'], propagate=True))
+        self.assertTrue(direct[0][2] == 'ATPase activity;integral component of membrane;membrane', 'Bad data: %s' % str(direct))
+        terms = propagated[0][2].split(';')
+        for term in ['catalytic activity', 'hydrolase activity', 'molecular_function', 'cellular_component']:
+            self.assertTrue(term in terms, '%s not propagated: %s' % (term, str(propagated)))
+
+        # Reloading the ontology replaces it
+        loadOboFile(self.store, OBO_FILE)
+        self.assertTrue(self.store.getAncestors(['GO:0016887'])['GO:0016887'] == set(['GO:0016887', 'GO:0016787', 'GO:0003824', 'GO:0003674']), 'Ontology not replaced')
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test goa partitioning with partition tables on SQLite
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os
+import shutil
+import tempfile
+from sqlalchemy import select, func
+
+from goa import Store
+from goa.loader import loadGoaFile, loadGoaPartitions, incrementalLoadGoaFile
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'goa_uniprot_all.gaf.sample')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        # A file, since the partitions are loaded from several threads
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = Store('sqlite:///%s' % os.path.join(self.tmpdir, 'goa.db'), partition='taxon', partitions=['35758'])
+        self.store.create()
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+        shutil.rmtree(self.tmpdir)
+
+    def count(self, tablename):
+        return self.store.connection.execute(select([func.count()]).select_from(self.store.tables[tablename])).first()[0]
+
+    def testRouting(self):
+        '''
+        Rows are routed to the partition of their taxon and the goa view has all of them
+        '''
+        loadGoaFile(self.store, DATA_FILE, 10)
+        self.assertTrue(self.count('goa') == 42, 'Incorrect row count %d' % self.count('goa'))
+        self.assertTrue(self.count('goa_p35758') == 41, 'Incorrect partition row count %d' % self.count('goa_p35758'))
+        rows = list(self.store.iterAnnotations(taxon='35758'))
+        self.assertTrue(len(rows) == 41 and all([row[12] == 'taxon:35758' for row in rows]), 'Incorrect taxon rows')
+
+        counts = incrementalLoadGoaFile(self.store, DATA_FILE, 100)
+        self.assertTrue(counts['unchanged'] == 42, 'Incorrect counts %s' % str(counts))
+
+    def testRejectFile(self):
+        '''
+        Invalid lines are not routed to a partition and go to the reject file
+        '''
+        gaffile = os.path.join(self.tmpdir, 'test.gaf')
+        rejectfile = os.path.join(self.tmpdir, 'rejects.gaf')
+        with open(DATA_FILE) as f, open(gaffile, 'w') as out:
+            out.write(f.read())
+            out.write('UniProtKB\tA0A999\tmoeA5\t\tGO:0003870\tGO_REF:0000002\tIEA\t\tF\tMoeA5\t\tprotein\ttaxon:35758\t2017040\tInterPro\t\t\n')
+        savedcounts = loadGoaPartitions(self.store, gaffile, rejectfile=rejectfile)
+        self.assertTrue(sum(savedcounts.values()) == 42, 'Incorrect saved counts %s' % str(savedcounts))
+        with open(rejectfile) as f:
+            rejects = f.read().splitlines()
+        self.assertTrue(len(rejects) == 1 and rejects[0].startswith('UniProtKB\tA0A999\t'), 'Incorrect rejects %s' % str(rejects))
+
+    def testHashPartitions(self):
+        '''
+        Hash partitions split the rows by db_object_id
+        '''
+        store = Store('sqlite://', partition='hash', partitions=3)
+        store.create()
+        loadGoaFile(store, DATA_FILE, 100)
+        counts = [store.connection.execute(select([func.count()]).select_from(store.tables['goa_%s' % name])).first()[0] for name in store.goaPartitionNames()]
+        self.assertTrue(sum(counts) == 42 and len([c for c in counts if c > 0]) > 1, 'Incorrect partition counts %s' % str(counts))
+        self.assertRaises(Exception, store.truncateGoaPartition, 'p0')
+
+    def testParallelPartitionLoad(self):
+        '''
+        Partitions load concurrently and a species can be replaced without touching the others
+        '''
+        savedcounts = loadGoaPartitions(self.store, DATA_FILE, workers=2)
+        self.assertTrue(savedcounts == {'p35758': 41, 'pother': 1}, 'Incorrect counts %s' % str(savedcounts))
+
+        goa = self.store.tables['goa_p35758']
+        self.store.connection.execute(goa.delete().where(goa.c.db_object_id == 'A0A000'))
+        species = os.path.join(self.tmpdir, 'species.gaf')
+        with open(DATA_FILE, 'r') as f, open(species, 'w') as out:
+            out.writelines([line for line in f if 'taxon:35758' in line])
+
+        savedcounts = loadGoaPartitions(self.store, species, workers=2, replace=True)
+        self.assertTrue(savedcounts == {'p35758': 41}, 'Incorrect counts %s' % str(savedcounts))
+        self.assertTrue(self.count('goa') == 42, 'Incorrect row count %d' % self.count('goa'))
+        self.assertRaises(Exception, loadGoaPartitions, self.store, DATA_FILE, replace=True)
+
+    def testMultiTaxonRouting(self):
+        '''
+        Rows with more than one taxon go to pother, as the database's list partitioning routes them
+        '''
+        self.assertTrue(self.store.goaPartitionName('taxon:35758') == 'p35758', 'Incorrect partition')
+        self.assertTrue(self.store.goaPartitionName('taxon:35758|taxon:1310605') == 'pother', 'Multi-taxon row not in pother')
+
+    def testFailedReplace(self):
+        '''
+        A replace load that fails leaves the partition as it was
+        '''
+        loadGoaPartitions(self.store, DATA_FILE)
+        species = os.path.join(self.tmpdir, 'species.gaf')
+        with open(DATA_FILE, 'r') as f, open(species, 'w') as out:
+            lines = [line for line in f if 'taxon:35758' in line]
+            out.writelines(lines + lines[:1])
+
+        self.assertRaises(Exception, loadGoaPartitions, self.store, species, replace=True)
+        self.assertTrue(self.count('goa_p35758') == 41, 'Partition changed by a failed load: %d' % self.count('goa_p35758'))
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test shadow release loads and swaps
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os, shutil, tempfile
+
+from goa import Store, LookupCache
+from goa.loader import shadowLoadGoaFile
+from goa.test.testSearchByIds import initAnnotations
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'goa_uniprot_all.gaf.sample')
+
+
+class DropError(Exception):
+    pass
+
+
+class DropFailingStore(Store):
+    '''
+    A Store whose releases cannot be dropped
+    '''
+
+    def dropRelease(self, release):
+        raise DropError('Drop failed')
+
+
+class SwapCheckingStore(Store):
+    '''
+    A Store that records what live readers see when swapRelease is called
+    '''
+
+    def swapRelease(self, release, keep=2):
+        self.beforeswap = {
+            'generation': self.getDataGeneration(),
+            'A0A003': len(list(self.searchByIds(['A0A003']))),
+            'A0A001': len(list(self.searchByIds(['A0A001']))),
+        }
+        return Store.swapRelease(self, release, keep)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://')
+        self.store.create()
+        initAnnotations(self.store)
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+
+    def count(self, tablename):
+        return self.store.connection.execute('select count(*) from %s' % tablename).first()[0]
+
+    def testShadowLoad(self):
+        '''
+        A shadow load replaces the live tables and keeps the previous ones for rollback
+        '''
+        goa = self.store.tables['goa']
+        self.store.connection.execute(goa.delete().where(goa.c.db_object_id == 'A0A001'))
+        before = self.count('goa')
+
+        release = shadowLoadGoaFile(self.store, DATA_FILE, release='r1')
+        self.assertTrue(release == 'r1', 'Incorrect release %s' % release)
+        self.assertTrue(self.count('goa') == 42, 'Incorrect live row count %d' % self.count('goa'))
+        self.assertTrue(self.count('goa__pre_r1') == before, 'Previous tables not kept')
+        self.assertTrue(self.count('alias') == 3, 'Aliases not copied')
+        result = list(self.store.searchByIds(['A0A003']))
+        self.assertTrue(len(result) == 1, 'Search after swap failed: %s' % str(result))
+
+        statuses = dict([(r['release'], r['status']) for r in self.store.getReleases()])
+        self.assertTrue(statuses == {'r1': 'live', 'pre_r1': 'previous'}, 'Incorrect releases %s' % str(statuses))
+
+        # Indexes are matched by columns, so the swapped in table is not indexed twice
+        self.store.createIndexes()
+        self.assertTrue(len(self.store.existingIndexes('goa')) == 1, 'Index created again')
+
+        self.assertTrue(self.store.rollbackRelease() == 'pre_r1', 'Incorrect rollback')
+        self.assertTrue(self.count('goa') == before, 'Rollback did not restore the previous tables')
+
+    def testKeep(self):
+        '''
+        Only keep previous releases are kept
+        '''
+        for release in ['r1', 'r2', 'r3']:
+            shadowLoadGoaFile(self.store, DATA_FILE, release=release, keep=1)
+        releases = sorted([(r['release'], r['status']) for r in self.store.getReleases()])
+        self.assertTrue(releases == [('r2', 'previous'), ('r3', 'live')], 'Incorrect releases %s' % str(releases))
+        self.assertTrue(not self.store.engine.has_table('goa__r1'), 'Old release not dropped')
+        self.assertRaises(Exception, self.store.dropRelease, 'r3')
+        self.assertRaises(Exception, self.store.createRelease, 'bad-name')
+
+    def testFailedLoad(self):
+        '''
+        A failed shadow load drops the tables and record of its release
+        '''
+        self.assertRaises(Exception, shadowLoadGoaFile, self.store, DATA_FILE + '.missing', release='r1')
+        self.assertTrue(not self.store.engine.has_table('goa__r1') and not self.store.engine.has_table('alias__r1'), 'Release tables left behind')
+        self.assertTrue(self.store.getReleases() == [], 'Release record left behind')
+        self.assertTrue(self.count('goa') == 42, 'Live table changed')
+
+    def testFailedDropAfterFailedLoad(self):
+        '''
+        The load error is raised even if dropping the release fails too
+        '''
+        store = DropFailingStore('sqlite://')
+        store.create()
+        try:
+            shadowLoadGoaFile(store, DATA_FILE + '.missing', release='r1')
+            self.fail('Failed load did not raise')
+        except DropError:
+            self.fail('Drop error masked the load error')
+        except Exception:
+            pass
+        store.engine.dispose()
+
+    def testAliasFileIsolation(self):
+        '''
+        A shadow load with an alias file does not change live lookups before the swap
+        '''
+        tmpdir = tempfile.mkdtemp()
+        try:
+            store = SwapCheckingStore('sqlite://', aliasfilterdir=tmpdir, cache=LookupCache())
+            store.create()
+            initAnnotations(store)
+            store.buildAliasFilter()
+            generation = store.getDataGeneration()
+            aliasfilename = os.path.join(tmpdir, 'idmapping.dat')
+            with open(aliasfilename, 'w') as f:
+                f.write('A0A001\tUniProtKB-ID\tA0A001_STRMO\n')
+
+            shadowLoadGoaFile(store, DATA_FILE, release='r1', aliasfilename=aliasfilename)
+            self.assertTrue(store.beforeswap == {'generation': generation, 'A0A003': 1, 'A0A001': 0}, 'Live readers changed before the swap: %s' % str(store.beforeswap))
+            self.assertTrue(store.getDataGeneration() > generation, 'Generation not bumped by the swap')
+            self.assertTrue(len(list(store.searchByIds(['A0A001']))) == 1, 'Release alias not found after the swap')
+            self.assertTrue(len(list(store.searchByIds(['A0A003']))) == 0, 'Old alias found after the swap')
+            store.engine.dispose()
+        finally:
+            shutil.rmtree(tmpdir)
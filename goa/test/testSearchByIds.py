@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test the dialect independent id search
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os
+
+from goa import Store, LookupCache
+from goa.loader import loadGoaFile
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'goa_uniprot_all.gaf.sample')
+
+
+class CaseInsensitiveStore(Store):
+    '''
+    A Store that matches aliases ignoring case and trailing spaces, as MySQL's default
+    collations do, and returns the stored aliases
+    '''
+
+    def searchIdChunk(self, connection, ids, source=None, propagate=False):
+        return Store.searchIdChunk(self, connection, [id.upper().rstrip() for id in ids], source, propagate)
+
+
+def initAnnotations(store):
+    '''
+    Load the sample GAF file, a go_term for each go_id and aliases for two proteins
+    '''
+    loadGoaFile(store, DATA_FILE, 100)
+    goa = store.tables['goa']
+    goids = sorted(set([row[0] for row in store.connection.execute(goa.select().with_only_columns([goa.c.go_id]))]))
+    store.connection.execute(store.tables['go_term'].insert(), [{'go_id': goid, 'term': 'term %s' % goid} for goid in goids])
+    store.connection.execute(store.tables['alias'].insert(), [
+        {'authority': 'UniProtKB', 'accession': 'A0A003', 'alias': 'A0A003', 'source': 'UniProtKB'},
+        {'authority': 'UniProtKB', 'accession': 'A0A003', 'alias': 'UniRef90_A0A003', 'source': 'UniRef90'},
+        {'authority': 'UniProtKB', 'accession': 'A0A009', 'alias': 'A0A009', 'source': 'UniProtKB'},
+    ])
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://')
+        self.store.create()
+        initAnnotations(self.store)
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+
+    def testSearchByIds(self):
+        '''
+        Search a list of ids in small chunks and get the gene symbols back
+        '''
+        result = sorted(self.store.searchByIds(iter(['A0A003', 'A0A009', 'UniRef90_A0A003', 'missing']), chunksize=2))
+        self.assertTrue(len(result) == 3, 'Incorrect result count %d' % len(result))
+        self.assertTrue(result[0][0:2] == ('A0A003', 'moeE5'), 'Bad data: %s' % str(result[0]))
+        self.assertTrue(result[1][0:2] == ('A0A009', 'moeM5'), 'Bad data: %s' % str(result[1]))
+        self.assertTrue(result[0][2] == result[2][2], 'Aliases of the same protein have different terms')
+
+    def testSearchByIdsSource(self):
+        '''
+        Only aliases from the requested source are matched
+        '''
+        result = list(self.store.searchByIds(['A0A003', 'UniRef90_A0A003'], source='UniRef90'))
+        self.assertTrue(len(result) == 1 and result[0][0] == 'UniRef90_A0A003', 'Bad data: %s' % str(result))
+
+    def testCachedSearch(self):
+        '''
+        Repeated searches are answered from the cache until the data generation changes
+        '''
+        self.store.cache = LookupCache(maxentries=10)
+        first = sorted(self.store.searchByIds(['A0A003', 'missing']))
+        second = sorted(self.store.searchByIds(['A0A003', 'missing', 'A0A009']))
+        self.assertTrue(first == second[0:1], 'Cached results differ: %s %s' % (str(first), str(second)))
+        stats = self.store.cache.stats()
+        self.assertTrue(stats['hits'] == 2 and stats['misses'] == 3, 'Bad stats %s' % str(stats))
+
+        self.store.bumpDataGeneration()
+        self.assertTrue(self.store.cache.stats()['entries'] == 0, 'Cache not invalidated')
+        list(self.store.searchByIds(['A0A003']))
+        self.assertTrue(self.store.cache.stats()['misses'] == 4, 'Search after invalidation was not a miss')
+
+    def testCachedFoldedSearch(self):
+        '''
+        Ids that the database matches to an alias of different case are cached with its results
+        '''
+        store = CaseInsensitiveStore('sqlite://', cache=LookupCache())
+        store.create()
+        initAnnotations(store)
+        store.foldaliases = True
+        first = list(store.searchByIds(['a0a003 ']))
+        second = list(store.searchByIds(['a0a003 ']))
+        self.assertTrue(len(first) == 1 and [r[1:] for r in second] == [first[0][1:]], 'Cached results differ: %s %s' % (str(first), str(second)))
+        store.engine.dispose()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test read-only snapshot export and lookup
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os
+import shutil
+import tempfile
+
+from goa import Store
+from goa.snapshot import exportSnapshot
+from goa.loader import loadOboFile
+from goa.test.testSearchByIds import initAnnotations
+from goa.test.testOntology import OBO_FILE
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://')
+        self.store.create()
+        initAnnotations(self.store)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+        shutil.rmtree(self.tmpdir)
+
+    def testSnapshotSearch(self):
+        '''
+        Snapshot lookups return the same results as the database
+        '''
+        filename = os.path.join(self.tmpdir, 'goa.snapshot')
+        rowcount = exportSnapshot(self.store, filename)
+        self.assertTrue(rowcount == 3, 'Incorrect annotation row count %d' % rowcount)
+
+        snapshot = Store.openSnapshot(filename)
+        ids = ['A0A003', 'A0A009', 'UniRef90_A0A003', 'missing']
+        for source in (None, 'UniRef90'):
+            expected = sorted(self.store.searchByIds(ids, source=source))
+            result = sorted(snapshot.searchByIds(ids, source=source))
+            self.assertTrue(result == expected, 'Snapshot results differ: %s %s' % (str(result), str(expected)))
+        self.assertRaises(Exception, snapshot.db.execute, 'delete from go_term')
+        snapshot.close()
+
+    def testPropagateAndNullSymbol(self):
+        '''
+        Propagated searches and NULL symbols match the database
+        '''
+        loadOboFile(self.store, OBO_FILE)
+        goa = self.store.tables['goa']
+        self.store.connection.execute(goa.update().where(goa.c.db_object_id == 'A0A009').values(db_object_symbol=None))
+        filename = os.path.join(self.tmpdir, 'goa.snapshot')
+        exportSnapshot(self.store, filename)
+
+        snapshot = Store.openSnapshot(filename)
+        ids = ['A0A003', 'A0A009', 'UniRef90_A0A003', 'missing']
+        for propagate in (False, True):
+            expected = sorted(self.store.searchByIds(ids, propagate=propagate))
+            result = sorted(snapshot.searchByIds(ids, propagate=propagate))
+            self.assertTrue(result == expected, 'Snapshot results differ: %s %s' % (str(result), str(expected)))
+        self.assertTrue([r[1] for r in result if r[0] == 'A0A009'] == [None], 'Incorrect NULL symbol %s' % str(result))
+        snapshot.close()
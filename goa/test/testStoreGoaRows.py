@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+'''
+Test batched goa row inserts
+
+@copyright: 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license: GPL v2.0
+'''
+
+import unittest, os
+from sqlalchemy import select, func
+
+from goa import Store
+from goa.loader import loadGoaFile, parallelLoadGoaFile, fileChunks, fileFingerprint
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'goa_uniprot_all.gaf.sample')
+
+
+def readRows(filename):
+    rows = []
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line == '' or line.startswith('!'):
+                continue
+            rows.append(line.split('\t'))
+    return rows
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store('sqlite://')
+        self.store.create()
+
+    def tearDown(self):
+        self.store.engine.dispose()
+        del self.store
+
+    def countGoa(self):
+        s = select([func.count(self.store.tables['goa'].c.id)])
+        return s.execute().first()[0]
+
+    def testBatchLoad(self):
+        '''
+        Batched load saves the same rows as the row by row load
+        '''
+        loadGoaFile(self.store, DATA_FILE, 10)
+        rowcount = self.countGoa()
+        self.assertTrue(42 == rowcount, 'Incorrect row count %d' % rowcount)
+
+    def testBatchFallback(self):
+        '''
+        A failing batch is retried row by row and the bad rows are reported
+        '''
+        rows = readRows(DATA_FILE)
+        baddate = list(rows[1])
+        baddate[13] = 'notadate'
+        batch = rows[:5] + [rows[0], baddate]
+
+        savedcount, errors = self.store.storeGoaRows(batch)
+        self.assertTrue(savedcount == 5, 'Incorrect saved count %d' % savedcount)
+        self.assertTrue(len(errors) == 2, 'Incorrect error count %d' % len(errors))
+        self.assertTrue(self.countGoa() == 5, 'Incorrect row count %d' % self.countGoa())
+
+    def testParallelLoad(self):
+        '''
+        Parallel load over small chunks saves every row
+        '''
+        chunks = list(fileChunks(DATA_FILE, 500))
+        self.assertTrue(chunks[0][0] == 0 and chunks[-1][1] == os.path.getsize(DATA_FILE), 'Chunks do not cover the file')
+        parallelLoadGoaFile(self.store, DATA_FILE, 10, 2, chunkbytes=500)
+        rowcount = self.countGoa()
+        self.assertTrue(42 == rowcount, 'Incorrect row count %d' % rowcount)
+
+    def testResume(self):
+        '''
+        A load resumed from a checkpoint saves the remaining rows only once
+        '''
+        self.store.createCheckpointTable()
+        checkpoint = fileFingerprint(DATA_FILE)
+        with open(DATA_FILE, 'r') as f:
+            data = f.read()
+        offset = data.index('A0A003')
+        checkpoint['byte_offset'] = data.rindex('\n', 0, offset) + 1
+        checkpoint['saved_count'] = 0
+        self.store.saveCheckpoint(checkpoint)
+
+        loadGoaFile(self.store, DATA_FILE, 10, checkpoint=True, resume=True)
+        goa = self.store.tables['goa']
+        s = select([func.count(goa.c.id)]).where(goa.c.db_object_id < 'A0A003')
+        self.assertTrue(s.execute().first()[0] == 0, 'Rows before the checkpoint were loaded')
+        self.assertTrue(self.countGoa() > 0, 'Rows after the checkpoint were not loaded')
+        self.assertTrue(self.store.getCheckpoint(checkpoint['filename']) is None, 'Checkpoint not removed')
+
+    def testCheckpointAtomic(self):
+        '''
+        A checkpoint save that fails outside a batch transaction keeps the previous checkpoint
+        '''
+        self.store.createCheckpointTable()
+        checkpoint = fileFingerprint(DATA_FILE)
+        checkpoint['byte_offset'] = 100
+        checkpoint['saved_count'] = 1
+        self.store.saveCheckpoint(checkpoint)
+
+        self.assertRaises(Exception, self.store.saveCheckpoint, dict(checkpoint, byte_offset=200, saved_count=object()))
+        saved = self.store.getCheckpoint(checkpoint['filename'])
+        self.assertTrue(saved is not None and saved['byte_offset'] == 100, 'Checkpoint lost: %s' % str(saved))
@@ -47,4 +47,8 @@ setup(
     install_requires=[
         'MySQL-python>=1.2.5',
     ],
+    extras_require={
+        'parquet': ['pyarrow'],
+        'enrich': ['numpy', 'scipy'],
+    },
 )